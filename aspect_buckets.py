@@ -0,0 +1,70 @@
+### Aspect Buckets
+# Aspect-ratio bucketing for the training images. Instead of forcing every image to 512x512, which squashes wide and tall artwork, each image goes to the bucket whose aspect ratio is closest to its own, and is resized to cover that bucket and center-cropped to it. Every bucket has about the same number of pixels (the pixel budget, 512x512 by default) with sides that are multiples of 64, so the trainer can build batches of one shape from each bucket without padding.
+#
+# The bucket of an image is worked out from its width and height, which Pillow reads from the file header when the image is opened; the pixels are only decoded later, by the worker that resizes it.
+#
+# The manifest (bucket_manifest.csv) lists every saved image with its bucket, its size and the size of the original.
+
+import csv
+import math
+import os
+from collections import namedtuple
+from io import BytesIO
+
+from PIL import Image
+
+DEFAULT_PIXEL_BUDGET = 512 * 512
+BUCKET_STEP = 64
+DEFAULT_MIN_SIDE = 256
+DEFAULT_MAX_SIDE = 1024
+# images of one bucket resized together by a worker process
+DEFAULT_BATCH_SIZE = 8
+DEFAULT_MANIFEST = 'bucket_manifest.csv'
+MANIFEST_COLUMNS = ['file_name', 'bucket', 'width', 'height', 'source_width', 'source_height']
+
+Bucket = namedtuple('Bucket', ['width', 'height'])
+
+def bucket_name(bucket):
+    return f'{bucket.width}x{bucket.height}'
+
+def parse_bucket(text):
+    width, height = text.lower().split('x')
+    return Bucket(int(width), int(height))
+
+# Every width from min_side to max_side in steps of step, with the largest height (also a multiple of step) that keeps the bucket within the pixel budget
+def make_buckets(pixel_budget=DEFAULT_PIXEL_BUDGET, min_side=DEFAULT_MIN_SIDE, max_side=DEFAULT_MAX_SIDE, step=BUCKET_STEP):
+    buckets = set()
+    for width in range(min_side, max_side + 1, step):
+        height = min(max_side, pixel_budget // width // step * step)
+        if height >= min_side:
+            buckets.add(Bucket(width, height))
+            buckets.add(Bucket(height, width))
+    return sorted(buckets, key=lambda bucket: bucket.width / bucket.height)
+
+# The bucket whose aspect ratio is closest to width / height, compared on a log scale so 2:1 and 1:2 are as far from 1:1
+def nearest_bucket(width, height, buckets):
+    ratio = math.log(width / height)
+    return min(buckets, key=lambda bucket: abs(math.log(bucket.width / bucket.height) - ratio))
+
+# The width and height of an image from its header, without decoding it
+def header_size(content):
+    with Image.open(BytesIO(content)) as img:
+        return img.size
+
+def write_manifest(rows, path):
+    partial_path = path + '.partial'
+    if os.path.dirname(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(partial_path, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=MANIFEST_COLUMNS)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(partial_path, path)
+
+def print_bucket_counts(rows):
+    counts = {}
+    for row in rows:
+        counts[row['bucket']] = counts.get(row['bucket'], 0) + 1
+    print(f"{'bucket':<12}{'images':>8}")
+    for name, count in sorted(counts.items(), key=lambda item: -item[1]):
+        print(f"{name:<12}{count:>8}")
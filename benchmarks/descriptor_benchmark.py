@@ -0,0 +1,91 @@
+### Descriptor Benchmark
+# Times the vectorized descriptor functions in prompt_generator_functions against the original iterrows versions, read from the git history by benchmarks/iterrows_reference.py, and checks that both write exactly the same text.
+#
+# Run from the repository root:
+#   python -m benchmarks.descriptor_benchmark --training-data training_data_prompts.csv --exoplanet-data exoplanet_data_prompts.csv --rows 5000
+
+import argparse
+import time
+
+import prompt_generator_functions as pgf
+from benchmarks import iterrows_reference
+
+# (function name, column it writes) in the order main() needs them
+DESCRIPTORS = [
+    ('planet_mass_description', 'planet_mass_description'),
+    ('get_planet_description', 'planet_color'),
+    ('get_planet_description_short', 'planet_color_short'),
+    ('get_planet_spin', 'planet_spin'),
+    ('get_planet_spin_short', 'planet_spin_short'),
+    ('tidal_locking', 'tidal_locked'),
+    ('get_stellar_color', 'stellar_color'),
+    ('stellar_mass_description', 'stellar_mass_description'),
+]
+
+def setup_argparse():
+    parser = argparse.ArgumentParser(description="Benchmark the vectorized descriptors against the iterrows versions")
+    parser.add_argument("--training-data", default="training_data_prompts.csv", help="Path to the training data CSV file")
+    parser.add_argument("--exoplanet-data", default="exoplanet_data_prompts.csv", help="Path to the exoplanet data CSV file")
+    parser.add_argument("--rows", type=int, default=5000, help="Number of exoplanet rows to benchmark (0 for all of them)")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs of the vectorized functions, the best one is reported")
+    parser.add_argument("--reference-revision", default=None, help="Git revision to take the iterrows functions from (default: the parent of the commit that added descriptor_rules.py)")
+    return parser
+
+def prepare(dataset):
+    # the columns the descriptors read but do not write themselves
+    dataset = pgf.get_planet_category(dataset)
+    dataset = pgf.get_orbital_period(dataset)
+    dataset['roche_limit'] = pgf.calculate_roche_limit(dataset)
+    return dataset
+
+def time_call(function, dataset):
+    start = time.perf_counter()
+    dataset = function(dataset)
+    return dataset, time.perf_counter() - start
+
+def benchmark(name, dataset, repeat, reference):
+    reference_data = dataset.copy()
+    vectorized_data = dataset.copy()
+
+    print(f"{name}: {len(dataset)} rows")
+    print(f"{'descriptor':<32}{'iterrows (s)':>14}{'vectorized (s)':>16}{'speedup':>10}  identical")
+
+    total_reference = total_vectorized = 0.0
+    all_identical = True
+    for function_name, column in DESCRIPTORS:
+        reference_data, reference_time = time_call(getattr(reference, function_name), reference_data)
+
+        vectorized_time = float('inf')
+        for _ in range(repeat):
+            result, elapsed = time_call(getattr(pgf, function_name), vectorized_data.copy())
+            vectorized_time = min(vectorized_time, elapsed)
+        vectorized_data = result
+
+        identical = reference_data[column].equals(vectorized_data[column])
+        all_identical = all_identical and identical
+        total_reference += reference_time
+        total_vectorized += vectorized_time
+        print(f"{function_name:<32}{reference_time:>14.4f}{vectorized_time:>16.4f}{reference_time / vectorized_time:>9.1f}x  {identical}")
+
+    print(f"{'total':<32}{total_reference:>14.4f}{total_vectorized:>16.4f}{total_reference / total_vectorized:>9.1f}x  {all_identical}")
+    print()
+    return all_identical
+
+def main():
+    parser = setup_argparse()
+    args = parser.parse_args()
+
+    reference = iterrows_reference.load(args.reference_revision)
+    print(f"iterrows reference: {reference.__file__}")
+    training_data, exoplanet_data = pgf.preprocess_data(args.training_data, args.exoplanet_data)
+    if args.rows:
+        exoplanet_data = exoplanet_data.head(args.rows)
+
+    identical = benchmark('training data', prepare(training_data), args.repeat, reference)
+    identical = benchmark('exoplanet data', prepare(exoplanet_data), args.repeat, reference) and identical
+
+    if not identical:
+        raise SystemExit("The vectorized descriptors do not match the iterrows versions")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+### Download Benchmark
+# Downloads a few hundred images from the local stand-in server, first one after another with a bare requests.get like getting_training_datasets used to, then with the concurrent downloader at each worker count. Some of the URLs answer 503 once (the downloader retries them) and some are missing (they are reported, the bare loop would have crashed on them, so it only gets the good URLs).
+#
+# Run from the repository root:
+#   python -m benchmarks.download_benchmark --urls 300 --latency-ms 50 --workers 1 4 8 16 32
+
+import argparse
+import time
+
+import requests
+
+import image_downloader
+from benchmarks import stand_in_server
+
+def setup_argparse():
+    parser = argparse.ArgumentParser(description="Benchmark the concurrent image downloader against a sequential loop")
+    parser.add_argument("--urls", type=int, default=300, help="Number of URLs to download")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Delay of the stand-in server before every answer, in milliseconds")
+    parser.add_argument("--flaky", type=float, default=0.05, help="Share of the URLs that answer 503 once")
+    parser.add_argument("--missing", type=float, default=0.02, help="Share of the URLs that answer 404")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8, 16, 32], help="Worker counts to run the downloader with")
+    parser.add_argument("--per-host", type=int, default=None, help="Most downloads from the server at the same time (default: the worker count)")
+    return parser
+
+def make_urls(base_url, count, flaky, missing, run):
+    urls = []
+    for i in range(count):
+        # spread the flaky and missing URLs evenly through the list
+        if int((i + 1) * missing) > int(i * missing):
+            kind = 'missing'
+        elif int((i + 1) * flaky) > int(i * flaky):
+            kind = 'flaky'
+        else:
+            kind = 'image'
+        # the run is part of the name so the flaky URLs fail again in every run
+        urls.append(f'{base_url}/{kind}/{run}_{i}.jpg')
+    return urls
+
+def main():
+    parser = setup_argparse()
+    args = parser.parse_args()
+
+    with stand_in_server.serve(args.latency_ms / 1000) as base_url:
+        urls = make_urls(base_url, args.urls, args.flaky, args.missing, 'sequential')
+        good_urls = [url for url in urls if '/missing/' not in url]
+        start = time.perf_counter()
+        downloaded = 0
+        for url in good_urls:
+            response = requests.get(url)
+            downloaded += response.ok
+        sequential = time.perf_counter() - start
+
+        print(f"{args.urls} URLs, {args.latency_ms:.0f} ms latency")
+        print(f"{'downloader':<22}{'time (s)':>10}{'images/s':>10}{'speedup':>10}{'ok':>6}{'failed':>8}{'retried':>9}")
+        print(f"{'sequential requests':<22}{sequential:>10.2f}{downloaded / sequential:>10.1f}{1:>9.1f}x{downloaded:>6}{len(urls) - len(good_urls):>8}{'-':>9}")
+
+        for workers in args.workers:
+            urls = make_urls(base_url, args.urls, args.flaky, args.missing, f'workers_{workers}')
+            start = time.perf_counter()
+            results = [result for _, result in image_downloader.download_all(urls, workers=workers, per_host=args.per_host or workers, backoff=0.05)]
+            elapsed = time.perf_counter() - start
+            ok = sum(result.error is None for result in results)
+            retried = sum(result.attempts > 1 for result in results)
+            print(f"{f'{workers} workers':<22}{elapsed:>10.2f}{ok / elapsed:>10.1f}{sequential / elapsed:>9.1f}x{ok:>6}{len(results) - ok:>8}{retried:>9}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+### Ingest Benchmark
+# Times loading and preprocessing both datasets the original way (every column, types guessed by pandas) against the typed ingest path with the C parser and with pyarrow, and checks that the typed paths give exactly the same values and dtypes for the columns they read.
+#
+# Run from the repository root (the pyarrow engine needs pyarrow):
+#   python -m benchmarks.ingest_benchmark --training-data training_data_prompts.csv --exoplanet-data exoplanet_data_prompts.csv.zip
+
+import argparse
+import time
+
+import prompt_generator_functions as pgf
+
+def setup_argparse():
+    parser = argparse.ArgumentParser(description="Benchmark the typed ingest path against the original one")
+    parser.add_argument("--training-data", default="training_data_prompts.csv", help="Path to the training data CSV file")
+    parser.add_argument("--exoplanet-data", default="exoplanet_data_prompts.csv.zip", help="Path to the exoplanet data CSV file (or the .zip it ships in)")
+    parser.add_argument("--engines", nargs="+", choices=pgf.CSV_ENGINES, default=pgf.CSV_ENGINES, help="Parsers to time the typed path with")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs of each path, the best one is reported")
+    return parser
+
+def time_load(repeat, **options):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        datasets = pgf.preprocess_data(**options)
+        best = min(best, time.perf_counter() - start)
+    return best, datasets
+
+def same_values(original, typed):
+    columns = list(typed.columns)
+    return original[columns].equals(typed) and (original[columns].dtypes == typed.dtypes).all()
+
+def main():
+    parser = setup_argparse()
+    args = parser.parse_args()
+    paths = dict(training_data_path=args.training_data, exoplanet_data_path=args.exoplanet_data)
+
+    original_time, original = time_load(args.repeat, **paths)
+    print(f"{'path':<16}{'time (s)':>10}{'speedup':>10}{'columns':>10}{'memory (MB)':>14}{'same values':>14}")
+    print(f"{'original':<16}{original_time:>10.2f}{1:>10.1f}{len(original[1].columns):>10}{original[1].memory_usage(deep=True).sum() / 1e6:>14.1f}{'-':>14}")
+    for engine in args.engines:
+        typed_time, typed = time_load(args.repeat, typed=True, engine=engine, **paths)
+        same = all(same_values(a, b) for a, b in zip(original, typed))
+        print(f"{'typed ' + engine:<16}{typed_time:>10.2f}{original_time / typed_time:>10.1f}{len(typed[1].columns):>10}"
+              f"{typed[1].memory_usage(deep=True).sum() / 1e6:>14.1f}{str(same):>14}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+### Iterrows Reference
+# The row-by-row descriptor functions as they were written before the rule tables in descriptor_rules.py, so the benchmark can time the vectorized functions against them and check that both produce the same text. They are not copied into the tree: load() reads prompt_generator_functions.py from the git history, as it was in the parent of the commit that added descriptor_rules.py (or at another revision), and runs it as a module of its own.
+
+import os
+import subprocess
+import types
+
+REPOSITORY = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_FILE = 'prompt_generator_functions.py'
+
+def git(*args):
+    try:
+        return subprocess.run(['git', *args], cwd=REPOSITORY, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError) as error:
+        details = getattr(error, 'stderr', None) or str(error)
+        raise SystemExit(f"Could not read the iterrows reference from the git history (git {' '.join(args)}: {details.strip()}). "
+                         "It needs a git clone with the history back to the baseline, or a revision that has the iterrows functions given with --reference-revision.")
+
+# The last revision before the rule tables: the parent of the commit that added descriptor_rules.py
+def baseline_revision():
+    added = git('log', '--diff-filter=A', '--format=%H', '--', 'descriptor_rules.py').split()
+    if not added:
+        raise SystemExit("No commit in the git history adds descriptor_rules.py, pass --reference-revision to pick the revision of the iterrows functions")
+    return added[-1] + '^'
+
+# prompt_generator_functions.py at revision (the baseline by default) as a module; its functions are the reference
+def load(revision=None):
+    revision = revision or baseline_revision()
+    source = git('show', f'{revision}:{SOURCE_FILE}')
+    module = types.ModuleType('iterrows_reference', f'{SOURCE_FILE} at {revision}')
+    module.__file__ = f'{revision}:{SOURCE_FILE}'
+    exec(compile(source, module.__file__, 'exec'), module.__dict__)
+    return module
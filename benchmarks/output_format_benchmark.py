@@ -0,0 +1,61 @@
+### Output Format Benchmark
+# Writes the finished exoplanet dataset as CSV and as Parquet and compares write time, file size and cold read time, both for the whole file and for only the prompt columns. Before each read the file is dropped from the page cache so it comes from disk again.
+#
+# Run from the repository root (needs pyarrow):
+#   python -m benchmarks.output_format_benchmark --exoplanet-data exoplanet_data_prompts.csv.zip --rows 50000
+
+import argparse
+import os
+import tempfile
+import time
+
+import prompt_generator_functions as pgf
+
+def setup_argparse():
+    parser = argparse.ArgumentParser(description="Benchmark the CSV and Parquet outputs of save_datasets")
+    parser.add_argument("--exoplanet-data", default="exoplanet_data_prompts.csv.zip", help="Path to the exoplanet data CSV file (or the .zip it ships in)")
+    parser.add_argument("--rows", type=int, default=50000, help="Number of exoplanet rows to benchmark (0 for all of them)")
+    parser.add_argument("--repeat", type=int, default=3, help="Number of timed runs of each read, the best one is reported")
+    return parser
+
+def drop_from_page_cache(path):
+    # only evicts pages that are already written back, so sync first
+    os.sync()
+    with open(path, 'rb') as file:
+        os.posix_fadvise(file.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+
+def time_write(dataset, path):
+    start = time.perf_counter()
+    pgf.write_dataset(dataset, path)
+    return time.perf_counter() - start
+
+def time_cold_read(path, columns, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        drop_from_page_cache(path)
+        start = time.perf_counter()
+        pgf.read_prompts(path, columns=columns)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = setup_argparse()
+    args = parser.parse_args()
+
+    exoplanet_data = pgf.read_catalog(args.exoplanet_data, nrows=args.rows or None)
+    exoplanet_data = pgf.generate_prompts(pgf.preprocess_exoplanet_data(exoplanet_data), unique_prompts=True)
+    prompt_columns = ['pl_name'] + list(pgf.PROMPT_TEMPLATES)
+
+    print(f"{len(exoplanet_data)} rows, {len(exoplanet_data.columns)} columns")
+    print(f"{'format':<10}{'write (s)':>12}{'size (MB)':>12}{'read all (s)':>15}{'read prompts (s)':>19}")
+    with tempfile.TemporaryDirectory() as folder:
+        for output_format in ['csv', 'parquet']:
+            path = os.path.join(folder, f'exoplanet_data_prompts.{output_format}')
+            write_time = time_write(exoplanet_data, path)
+            size = os.path.getsize(path) / 1e6
+            read_all_time = time_cold_read(path, None, args.repeat)
+            read_prompts_time = time_cold_read(path, prompt_columns, args.repeat)
+            print(f"{output_format:<10}{write_time:>12.2f}{size:>12.1f}{read_all_time:>15.2f}{read_prompts_time:>19.2f}")
+
+if __name__ == "__main__":
+    main()
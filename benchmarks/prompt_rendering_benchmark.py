@@ -0,0 +1,67 @@
+### Prompt Rendering Benchmark
+# Times get_prompts (one format call per planet) against get_unique_prompts (one format call per combination of descriptions) and checks that both write the same prompts.
+#
+# Run from the repository root:
+#   python -m benchmarks.prompt_rendering_benchmark --exoplanet-data exoplanet_data_prompts.csv.zip --rows 50000
+
+import argparse
+import time
+
+import prompt_generator_functions as pgf
+
+def setup_argparse():
+    parser = argparse.ArgumentParser(description="Benchmark rendering prompts per planet against per combination of descriptions")
+    parser.add_argument("--training-data", default="training_data_prompts.csv", help="Path to the training data CSV file")
+    parser.add_argument("--exoplanet-data", default="exoplanet_data_prompts.csv.zip", help="Path to the exoplanet data CSV file (or the .zip it ships in)")
+    parser.add_argument("--rows", type=int, default=50000, help="Number of exoplanet rows to benchmark (0 for all of them)")
+    return parser
+
+def describe(dataset):
+    # everything generate_prompts does before the prompts themselves
+    dataset = pgf.get_planet_category(dataset)
+    dataset = pgf.planet_mass_description(dataset)
+    dataset = pgf.get_planet_description(dataset)
+    dataset = pgf.get_planet_description_short(dataset)
+    dataset = pgf.get_orbital_period(dataset)
+    dataset = pgf.get_planet_spin(dataset)
+    dataset = pgf.get_planet_spin_short(dataset)
+    dataset['roche_limit'] = pgf.calculate_roche_limit(dataset)
+    dataset = pgf.tidal_locking(dataset)
+    dataset = pgf.calculate_stellar_planet_ratio(dataset)
+    dataset = pgf.get_stellar_color(dataset)
+    dataset = pgf.stellar_mass_description(dataset)
+    return dataset
+
+def benchmark(name, dataset):
+    combinations = len(dataset[pgf.PROMPT_KEY_COLUMNS].drop_duplicates())
+
+    start = time.perf_counter()
+    per_row = pgf.get_prompts(dataset.copy())
+    per_row_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    per_combination = pgf.get_unique_prompts(dataset.copy())
+    per_combination_time = time.perf_counter() - start
+
+    identical = all(per_row[column].equals(per_combination[column]) for column in pgf.PROMPT_TEMPLATES)
+    print(f"{name}: {len(dataset)} rows, {combinations} combinations of descriptions")
+    print(f"  get_prompts        {per_row_time:10.4f} s")
+    print(f"  get_unique_prompts {per_combination_time:10.4f} s  ({per_row_time / per_combination_time:.1f}x faster, identical: {identical})")
+    return identical
+
+def main():
+    parser = setup_argparse()
+    args = parser.parse_args()
+
+    training_data, exoplanet_data = pgf.preprocess_data(args.training_data, args.exoplanet_data)
+    if args.rows:
+        exoplanet_data = exoplanet_data.head(args.rows)
+
+    identical = benchmark('training data', describe(training_data))
+    identical = benchmark('exoplanet data', describe(exoplanet_data)) and identical
+
+    if not identical:
+        raise SystemExit("get_unique_prompts does not match get_prompts")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+### Scaling Benchmark
+# Runs preprocessing, every stage of the pipeline and the whole pipeline on synthetic catalogs of growing size (10k, 100k, 1M and 10M planets by default) and prints the time and memory of each step per size. This is the benchmark to quote for any performance change: run it before and after, with the same sizes and options, and compare the tables (or the JSON written with --output).
+#
+# Every size runs in its own Python process, so the peak RSS of one size is not carried into the next and a size that runs out of memory is reported as failed instead of ending the run. The catalog is generated in memory before the timing starts, so reading and writing files is not part of the numbers (output_format_benchmark covers those).
+#
+# Run from the repository root:
+#   python -m benchmarks.scaling_benchmark --rows 10000 100000 1000000 --output scaling.json
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import instrumentation
+import prompt_generator_functions as pgf
+from benchmarks.synthetic_catalog import synthetic_catalog
+
+DEFAULT_ROWS = [10000, 100000, 1000000, 10000000]
+
+# the steps printed first in the tables, the stages follow in pipeline order and then the helpers they call
+SUMMARY_STEPS = ['synthetic_catalog', 'preprocess_exoplanet_data', 'generate_prompts']
+
+def setup_argparse():
+    parser = argparse.ArgumentParser(description="Time every stage of the prompt pipeline on synthetic catalogs of growing size")
+    parser.add_argument("--rows", type=int, nargs='+', default=DEFAULT_ROWS, help="Catalog sizes to run, in planets")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed of the synthetic catalogs")
+    parser.add_argument("--threads", type=int, default=1, help="Threads used to run independent stages side by side (memory numbers overlap above 1)")
+    parser.add_argument("--per-row-prompts", action="store_true", help="Format every prompt once per planet instead of once per unique combination (--unique-prompts)")
+    parser.add_argument("--trace-allocations", action="store_true", help="Also record the bytes allocated by each step (much slower)")
+    parser.add_argument("--output", help="Write the reports of every size to this JSON file")
+    parser.add_argument("--report", help=argparse.SUPPRESS)
+    return parser
+
+# Runs one size in this process and writes its profiler report to report_path
+def run_size(rows, seed, threads, unique_prompts, trace_allocations, report_path):
+    profiler = instrumentation.Profiler(trace_allocations)
+    with profiler.stage('synthetic_catalog', rows):
+        catalog = synthetic_catalog(rows, seed)
+
+    instrumentation.instrument_module(pgf, profiler)
+    dataset = pgf.preprocess_exoplanet_data(catalog)
+    del catalog
+    pgf.generate_prompts(dataset, unique_prompts=unique_prompts, threads=threads)
+
+    return profiler.write_report(report_path)
+
+def run_size_in_subprocess(rows, args):
+    with tempfile.TemporaryDirectory() as folder:
+        report_path = os.path.join(folder, 'report.json')
+        command = [sys.executable, '-m', 'benchmarks.scaling_benchmark', '--rows', str(rows), '--seed', str(args.seed),
+                   '--threads', str(args.threads), '--report', report_path]
+        if args.per_row_prompts:
+            command.append('--per-row-prompts')
+        if args.trace_allocations:
+            command.append('--trace-allocations')
+
+        start = time.perf_counter()
+        completed = subprocess.run(command)
+        if completed.returncode != 0:
+            # a negative return code is the signal that ended it, -9 is usually the out-of-memory killer
+            print(f"{rows} rows failed after {time.perf_counter() - start:.1f} s (exit code {completed.returncode})")
+            return {'rows': rows, 'failed': True, 'returncode': completed.returncode}
+
+        with open(report_path) as file:
+            report = json.load(file)
+        print(f"{rows} rows: {report['total_seconds']:.2f} s, peak RSS {report['peak_rss_bytes'] / 1e6:.1f} MB")
+        return {'rows': rows, 'failed': False, **report}
+
+def step_order(results):
+    # a stage's function is recorded under its own name (get_planet_category for the planet_category stage)
+    names = [getattr(stage.function, 'func', stage.function).__name__ for stage in pgf.pipeline_stages()]
+    found = {stage['name'] for result in results if not result['failed'] for stage in result['stages']}
+    steps = [name for name in SUMMARY_STEPS + names if name in found]
+    return steps + sorted(found - set(steps))
+
+def print_table(title, results, steps, value):
+    print()
+    print(title)
+    print(f"{'step':<34}" + ''.join(f"{result['rows']:>14}" for result in results))
+    for step in steps:
+        cells = []
+        for result in results:
+            stage = None if result['failed'] else next((stage for stage in result['stages'] if stage['name'] == step), None)
+            cells.append('failed' if result['failed'] else value(stage) if stage else '-')
+        print(f"{step:<34}" + ''.join(f"{cell:>14}" for cell in cells))
+
+def print_tables(results):
+    steps = step_order(results)
+    print_table("time (s)", results, steps, lambda stage: f"{stage['seconds']:.3f}")
+    print_table("rows/s", results, steps, lambda stage: f"{stage['rows_per_second']:.0f}" if stage['rows_per_second'] else '-')
+    print_table("peak RSS delta (MB)", results, steps, lambda stage: f"{stage['peak_rss_delta_bytes'] / 1e6:.1f}")
+    if any(not result['failed'] and result['trace_allocations'] for result in results):
+        print_table("allocated (MB)", results, steps,
+                    lambda stage: f"{stage['allocated_bytes'] / 1e6:.1f}" if stage['allocated_bytes'] is not None else '-')
+    print()
+    print(f"{'peak RSS (MB)':<34}" + ''.join(f"{'failed' if result['failed'] else format(result['peak_rss_bytes'] / 1e6, '.1f'):>14}" for result in results))
+
+def main():
+    parser = setup_argparse()
+    args = parser.parse_args()
+
+    if args.report:
+        run_size(args.rows[0], args.seed, args.threads, not args.per_row_prompts, args.trace_allocations, args.report)
+        return
+
+    results = [run_size_in_subprocess(rows, args) for rows in args.rows]
+    print_tables(results)
+
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump({'per_row_prompts': args.per_row_prompts, 'threads': args.threads, 'sizes': results}, file, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+### Stand-in Server
+# A local HTTP server that stands in for the NASA image host and the images-api search, so the downloader and the search can be tried and benchmarked without the network. It runs in a background thread on a free port and answers with a small generated JPEG after a fixed latency. The first part of the path picks how it behaves:
+#
+#   /image/<name>     the JPEG
+#   /flaky/<name>     503 the first time each name is asked for, the JPEG after that
+#   /missing/<name>   404
+#   /slow/<name>      the JPEG after --slow-seconds, longer than a short read timeout
+#   /search?q=...     a page of made-up search results in the images-api layout (collection.items, metadata.total_hits and a next link), page and page_size picking the page. Every query has SEARCH_HITS results drawn from a pool of SEARCH_POOL nasa_ids, so different queries share some of them, and their preview links point at /image/.
+#   /stats            the number of requests answered so far for each kind of path, as JSON
+#
+# The JPEG comes with an ETag and a Last-Modified date, and a request that sends either back (If-None-Match / If-Modified-Since) gets 304 Not Modified, like from the real host.
+#
+# Run from the repository root to keep one up by hand:
+#   python -m benchmarks.stand_in_server --port 8765 --latency-ms 50
+
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+import zlib
+from contextlib import contextmanager
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+from PIL import Image
+
+def setup_argparse():
+    parser = argparse.ArgumentParser(description="Local stand-in for the NASA image host")
+    parser.add_argument("--port", type=int, default=8765, help="Port to listen on")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Delay before every answer, in milliseconds")
+    parser.add_argument("--slow-seconds", type=float, default=5, help="Delay of the /slow/ paths, in seconds")
+    return parser
+
+def make_jpeg(size=(640, 480)):
+    image = Image.linear_gradient('L').resize(size).convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, format='JPEG', quality=90)
+    return buffer.getvalue()
+
+SEARCH_HITS = 230
+SEARCH_POOL = 400
+
+# The search results from start to stop of query q, with links to base
+def search_items(base, q, start, stop):
+    offset = zlib.crc32(q.encode()) % SEARCH_POOL
+    items = []
+    for position in range(start, stop):
+        nasa_id = f'STANDIN{(offset + position) % SEARCH_POOL:05d}'
+        items.append({
+            'href': f'{base}/asset/{nasa_id}/collection.json',
+            'data': [{'nasa_id': nasa_id, 'title': f'{q} {position}', 'description': f'Stand-in result {position} for {q}',
+                      'media_type': 'image', 'center': 'JPL', 'date_created': '2020-01-01T00:00:00Z', 'keywords': [q]}],
+            'links': [{'href': f'{base}/image/{nasa_id}~thumb.jpg', 'rel': 'preview', 'render': 'image'}],
+        })
+    return items
+
+def search_page(base, query):
+    params = {name: values[0] for name, values in parse_qs(query).items()}
+    q, page, page_size = params.get('q', ''), int(params.get('page', 1)), int(params.get('page_size', 100))
+    start, stop = (page - 1) * page_size, min(SEARCH_HITS, page * page_size)
+    collection = {'version': '1.0', 'href': f'{base}/search?{query}', 'items': search_items(base, q, start, max(start, stop)), 'metadata': {'total_hits': SEARCH_HITS}}
+    if stop < SEARCH_HITS:
+        params['page'] = page + 1
+        collection['links'] = [{'rel': 'next', 'prompt': 'Next', 'href': f'{base}/search?{urlencode(params)}'}]
+    return {'collection': collection}
+
+def make_handler(latency, slow_seconds, body):
+    flaky_seen = set()
+    counts = {}
+    lock = threading.Lock()
+    etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+    last_modified = formatdate(time.time() - 86400, usegmt=True)
+
+    class StandInHandler(BaseHTTPRequestHandler):
+        # keeps connections open between requests, like the real host
+        protocol_version = 'HTTP/1.1'
+        # sends the body right after the headers, Nagle's algorithm would hold it back until the headers are acknowledged
+        disable_nagle_algorithm = True
+
+        def send_body(self, status, data, content_type='image/jpeg', headers=None):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            path, query = urlsplit(self.path)[2:4]
+            kind = path.strip('/').split('/')[0]
+            with lock:
+                counts[kind] = counts.get(kind, 0) + 1
+            if kind == 'stats':
+                with lock:
+                    self.send_body(200, json.dumps(counts).encode(), 'application/json')
+                return
+            time.sleep(slow_seconds if kind == 'slow' else latency)
+            if kind == 'search':
+                self.send_body(200, json.dumps(search_page(f"http://{self.headers['Host']}", query)).encode(), 'application/json')
+                return
+            if kind == 'flaky':
+                with lock:
+                    first = self.path not in flaky_seen
+                    flaky_seen.add(self.path)
+                if first:
+                    self.send_body(503, b'busy', 'text/plain')
+                    return
+            if kind in ('image', 'flaky', 'slow'):
+                cache_headers = {'ETag': etag, 'Last-Modified': last_modified}
+                if self.headers.get('If-None-Match') == etag or self.headers.get('If-Modified-Since') == last_modified:
+                    self.send_body(304, b'', headers=cache_headers)
+                else:
+                    self.send_body(200, body, headers=cache_headers)
+            else:
+                self.send_body(404, b'not found', 'text/plain')
+
+        def log_message(self, format, *args):
+            pass
+
+    return StandInHandler
+
+class StandInServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # a client that gave up (a read timeout on a /slow/ path, a killed run) is not an error of the server
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+# Starts the server in a background thread and yields its base URL (http://127.0.0.1:<port>)
+@contextmanager
+def serve(latency=0.05, slow_seconds=5, port=0, body=None):
+    server = StandInServer(('127.0.0.1', port), make_handler(latency, slow_seconds, body or make_jpeg()))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f'http://127.0.0.1:{server.server_address[1]}'
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def main():
+    parser = setup_argparse()
+    args = parser.parse_args()
+    with serve(args.latency_ms / 1000, args.slow_seconds, args.port) as url:
+        print(f"serving on {url}, Ctrl+C to stop")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+### Synthetic Catalog
+# Generates exoplanet catalogs of any size, shaped like the NASA columns of exoplanet_data_prompts.csv, so the pipeline can be timed well past the 5,463 planets of the real catalog. The columns the pipeline reads follow the distributions of the real planets: log-normal fits (median and the 5th to 95th percentile spread, in log10) for the masses, radii, densities, periods, orbit sizes, temperatures and magnitudes, the real shares of zeros for the values that are missing, and spectral types drawn from the real mix of classes, including the rare white dwarf ('WD', 'DA', 'DQ'), brown dwarf ('L', 'T') and subdwarf ('sd') types the descriptors treat differently. The columns are drawn independently of each other, so the combinations are less correlated than real planets.
+#
+# With full_schema=True every NASA column of the real catalog is written; the ones the pipeline does not read are filled with zeros (or '0' for text). The columns the pipeline writes itself are left out.
+#
+# Run from the repository root:
+#   python -m benchmarks.synthetic_catalog --rows 100000 --output synthetic_catalog.csv
+
+import argparse
+
+import numpy as np
+import pandas as pd
+
+CATALOG_COLUMNS = ['Unnamed: 0', 'pl_name', 'hostname', 'sy_snum', 'sy_pnum', 'sy_mnum', 'discoverymethod', 'disc_year', 'disc_refname', 'disc_pubdate',
+                   'pl_controv_flag', 'pl_orbper', 'pl_orbpererr1', 'pl_orbpererr2', 'pl_orbperlim', 'pl_orbsmax', 'pl_orbsmaxerr1', 'pl_orbsmaxerr2',
+                   'pl_orbsmaxlim', 'pl_rade', 'pl_radeerr1', 'pl_radeerr2', 'pl_radelim', 'pl_radj', 'pl_radjerr1', 'pl_radjerr2', 'pl_radjlim',
+                   'pl_bmasse', 'pl_bmasseerr1', 'pl_bmasseerr2', 'pl_bmasselim', 'pl_bmassj', 'pl_bmassjerr1', 'pl_bmassjerr2', 'pl_bmassjlim',
+                   'pl_bmassprov', 'pl_dens', 'pl_denserr1', 'pl_denserr2', 'pl_denslim', 'pl_orbeccen', 'pl_orbeccenerr1', 'pl_orbeccenerr2',
+                   'pl_orbeccenlim', 'pl_insol', 'pl_insolerr1', 'pl_insolerr2', 'pl_insollim', 'pl_eqt', 'pl_eqterr1', 'pl_eqterr2', 'pl_eqtlim',
+                   'ttv_flag', 'pl_imppar', 'pl_impparerr1', 'pl_impparerr2', 'pl_impparlim', 'pl_ratror', 'pl_ratrorerr1', 'pl_ratrorerr2',
+                   'pl_ratrorlim', 'st_spectype', 'st_teff', 'st_tefferr1', 'st_tefferr2', 'st_tefflim', 'st_rad', 'st_raderr1', 'st_raderr2',
+                   'st_radlim', 'st_mass', 'st_masserr1', 'st_masserr2', 'st_masslim', 'st_met', 'st_meterr1', 'st_meterr2', 'st_metlim',
+                   'st_metratio', 'st_lum', 'st_lumerr1', 'st_lumerr2', 'st_lumlim', 'st_logg', 'st_loggerr1', 'st_loggerr2', 'st_logglim',
+                   'st_dens', 'st_denserr1', 'st_denserr2', 'st_denslim', 'rastr', 'ra', 'decstr', 'dec', 'sy_dist', 'sy_disterr1', 'sy_disterr2',
+                   'sy_vmag', 'sy_vmagerr1', 'sy_vmagerr2', 'sy_kmag', 'sy_kmagerr1', 'sy_kmagerr2', 'sy_gaiamag', 'sy_gaiamagerr1', 'sy_gaiamagerr2']
+
+TEXT_COLUMNS = ['pl_name', 'hostname', 'discoverymethod', 'disc_refname', 'disc_pubdate', 'pl_bmassprov', 'st_spectype', 'st_metratio', 'rastr', 'decstr']
+
+# (median, spread, share of zeros), median and spread in log10 of the value, from the real planets
+LOG_NORMAL_COLUMNS = {
+    'pl_bmasse': (0.93, 0.98, 0.004),
+    'pl_rade': (0.44, 0.34, 0.003),
+    'pl_orbper': (1.05, 0.93, 0.001),
+    'pl_orbsmax': (-0.99, 0.65, 0.054),
+    'pl_eqt': (2.92, 0.22, 0.261),
+    'pl_dens': (0.41, 0.43, 0.02),
+    'st_teff': (3.75, 0.07, 0.038),
+    'st_rad': (-0.02, 0.22, 0.042),
+    'st_mass': (-0.02, 0.17, 0.001),
+    'sy_vmag': (1.13, 0.11, 0.038),
+}
+
+IMPACT_PARAMETER_ZEROS = 0.276
+
+SYSTEM_STARS = {1: 0.911, 2: 0.078, 3: 0.011}
+SYSTEM_PLANETS = {1: 0.576, 2: 0.224, 3: 0.109, 4: 0.053, 5: 0.024, 6: 0.011, 7: 0.002, 8: 0.001}
+
+DISCOVERY_METHODS = {'Transit': 0.749, 'Radial Velocity': 0.191, 'Microlensing': 0.037, 'Imaging': 0.012, 'Transit Timing Variations': 0.005,
+                     'Eclipse Timing Variations': 0.003, 'Orbital Brightness Modulation': 0.002, 'Pulsar Timing': 0.001}
+
+# about two thirds of the real planets have no spectral type. The rest are mostly main sequence classes, with the rare types given enough weight to show up in small catalogs
+SPECTRAL_TYPE_MISSING = 0.648
+SPECTRAL_CLASSES = {'G': 0.355, 'K': 0.282, 'M': 0.209, 'F': 0.124, 'A': 0.011, 'B': 0.005}
+RARE_SPECTRAL_TYPES = {'WD': 0.003, 'DA': 0.002, 'DQ': 0.001, 'L1.5': 0.002, 'T8.5': 0.002, 'sdBV': 0.002, 'sdB': 0.002}
+LUMINOSITY_CLASSES = {'': 0.55, ' V': 0.35, ' IV': 0.04, ' III': 0.06}
+
+def choice(rng, weights, rows):
+    values = list(weights)
+    p = np.array(list(weights.values()), dtype='float64')
+    return np.array(values, dtype=object)[rng.choice(len(values), size=rows, p=p / p.sum())]
+
+def log_normal(rng, median, spread, zeros, rows):
+    values = 10 ** rng.normal(median, spread, rows)
+    values[rng.random(rows) < zeros] = 0.0
+    return values.round(3)
+
+def spectral_types(rng, rows):
+    rare_share = sum(RARE_SPECTRAL_TYPES.values())
+    kind = rng.random(rows)
+    subclasses = rng.integers(0, 10, rows).astype(str).astype(object)
+    types = choice(rng, SPECTRAL_CLASSES, rows) + subclasses + choice(rng, LUMINOSITY_CLASSES, rows)
+
+    rare = kind < rare_share
+    types[rare] = choice(rng, RARE_SPECTRAL_TYPES, int(rare.sum()))
+    # left empty like in the NASA export, so preprocess_exoplanet_data fills them with 0
+    types[kind > 1 - SPECTRAL_TYPE_MISSING] = np.nan
+    return types
+
+def synthetic_catalog(rows, seed=0, full_schema=False):
+    rng = np.random.default_rng(seed)
+    hosts = pd.Series(np.arange(rows) // 2).astype(str)
+
+    columns = {
+        'Unnamed: 0': np.arange(rows, dtype='float64'),
+        'pl_name': ('SYN-' + hosts + ' ' + np.where(np.arange(rows) % 2, 'c', 'b')).to_numpy(dtype=object),
+        'hostname': ('SYN-' + hosts).to_numpy(dtype=object),
+        'sy_snum': choice(rng, SYSTEM_STARS, rows).astype('float64'),
+        'sy_pnum': choice(rng, SYSTEM_PLANETS, rows).astype('float64'),
+        'sy_mnum': np.zeros(rows),
+        'discoverymethod': choice(rng, DISCOVERY_METHODS, rows),
+        'disc_year': rng.integers(1995, 2024, rows).astype('float64'),
+        'pl_imppar': np.where(rng.random(rows) < IMPACT_PARAMETER_ZEROS, 0.0, rng.random(rows).round(3)),
+        'st_spectype': spectral_types(rng, rows),
+    }
+    for col, (median, spread, zeros) in LOG_NORMAL_COLUMNS.items():
+        columns[col] = log_normal(rng, median, spread, zeros, rows)
+
+    if full_schema:
+        for col in CATALOG_COLUMNS:
+            if col not in columns:
+                columns[col] = np.full(rows, '0', dtype=object) if col in TEXT_COLUMNS else np.zeros(rows)
+        return pd.DataFrame(columns)[CATALOG_COLUMNS]
+
+    return pd.DataFrame(columns)[[col for col in CATALOG_COLUMNS if col in columns]]
+
+def setup_argparse():
+    parser = argparse.ArgumentParser(description="Generate a synthetic exoplanet catalog")
+    parser.add_argument("--rows", type=int, default=100000, help="Number of planets to generate")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--full-schema", action="store_true", help="Write every NASA column of the real catalog, not only the ones the pipeline reads")
+    parser.add_argument("--output", default="synthetic_catalog.csv", help="Path of the CSV file to write")
+    return parser
+
+def main():
+    parser = setup_argparse()
+    args = parser.parse_args()
+
+    catalog = synthetic_catalog(args.rows, args.seed, args.full_schema)
+    catalog.to_csv(args.output, index=False)
+    print(f"{len(catalog)} planets, {len(catalog.columns)} columns written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+### Worker Scaling Benchmark
+# Runs the sharded prompt generation on the exoplanet data with a growing number of worker processes and prints the scaling curve (time, speedup and parallel efficiency for each worker count). Every run's output is checked against the single-process output.
+#
+# Run from the repository root:
+#   python -m benchmarks.worker_scaling_benchmark --exoplanet-data exoplanet_data_prompts.csv.zip --rows 50000 --workers 1 2 4 8 16 32
+
+import argparse
+import filecmp
+import os
+import tempfile
+import time
+
+import catalog_streaming
+import prompt_generator_functions as pgf
+
+def setup_argparse():
+    parser = argparse.ArgumentParser(description="Benchmark prompt generation across worker processes")
+    parser.add_argument("--exoplanet-data", default="exoplanet_data_prompts.csv.zip", help="Path to the exoplanet data CSV file (or the .zip it ships in)")
+    parser.add_argument("--rows", type=int, default=50000, help="Number of exoplanet rows to benchmark (0 for all of them)")
+    parser.add_argument("--chunksize", type=int, default=2000, help="Rows per shard")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32], help="Worker counts to run")
+    return parser
+
+def write_sample(exoplanet_data_path, rows, folder):
+    # the benchmark reads the same rows for every worker count, so cut them out once
+    sample_path = os.path.join(folder, 'sample.csv')
+    with pgf.open_catalog(exoplanet_data_path) as catalog, open(sample_path, 'wb') as sample:
+        for i, line in enumerate(catalog):
+            if rows and i > rows:
+                break
+            sample.write(line)
+    return sample_path
+
+def main():
+    parser = setup_argparse()
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        sample_path = write_sample(args.exoplanet_data, args.rows, folder)
+
+        print(f"{os.cpu_count()} cpus available")
+        print(f"{'workers':>8}{'rows':>10}{'time (s)':>12}{'rows/s':>12}{'speedup':>10}{'efficiency':>12}  identical")
+
+        baseline_path = None
+        baseline_time = None
+        for workers in args.workers:
+            output_path = os.path.join(folder, f'prompts_{workers}.csv')
+            start = time.perf_counter()
+            rows = catalog_streaming.stream_exoplanet_prompts(pgf.chunk_pipeline(), sample_path, output_path, chunksize=args.chunksize, workers=workers)
+            elapsed = time.perf_counter() - start
+
+            if baseline_path is None:
+                baseline_path, baseline_time, baseline_workers = output_path, elapsed, workers
+            identical = filecmp.cmp(baseline_path, output_path, shallow=False)
+            speedup = baseline_time / elapsed * baseline_workers
+            print(f"{workers:>8}{rows:>10}{elapsed:>12.2f}{rows / elapsed:>12.0f}{speedup:>9.2f}x{speedup / workers:>11.0%}  {identical}")
+
+if __name__ == "__main__":
+    main()
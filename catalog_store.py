@@ -0,0 +1,218 @@
+### Catalog Store
+# Finding the prompts of one planet or host star in exoplanet_data_prompts.csv means parsing the whole 146 MB file. The catalog store copies the prompt generator's output (CSV or Parquet) once into a SQLite file, with indexes on the columns planets are looked up and filtered by, so a lookup is an index search that takes milliseconds.
+#
+# Only the rows with a planet name are stored: the catalog ends in about a million blank rows, which the pipeline writes with a pl_name of 0. The build streams the output in chunks and writes the store to a .partial file that replaces the old store once it is complete, so a failed build never leaves a half-written store behind.
+#
+# Run from the repository root:
+#   python catalog_store.py build --prompts exoplanet_data_prompts.csv --store exoplanet_catalog.sqlite
+#   python catalog_store.py planet "Kepler-22 b"
+#   python catalog_store.py host TRAPPIST-1 --columns pl_name 75_tokens
+#   python catalog_store.py query --category super-earth --range pl_eqt 200 320 --range st_teff 3000 4000
+#   python catalog_store.py export --category gas-giant --output gas_giant_prompts.csv
+
+import argparse
+import os
+import sqlite3
+import time
+
+import pandas as pd
+
+import prompt_generator_functions as pgf
+
+DEFAULT_STORE_PATH = 'exoplanet_catalog.sqlite'
+TABLE = 'planets'
+
+# point lookups and the category filter
+LOOKUP_COLUMNS = ['pl_name', 'hostname', 'planet_category']
+# range filters that are common enough to be worth an index
+RANGE_COLUMNS = ['pl_eqt', 'st_teff', 'pl_bmasse', 'pl_rade', 'pl_orbper']
+
+# what lookups return when no columns are asked for
+DEFAULT_COLUMNS = ['pl_name', 'hostname', 'planet_category'] + list(pgf.PROMPT_TEMPLATES)
+
+BUILD_CHUNKSIZE = 100000
+
+def setup_argparse():
+    parser = argparse.ArgumentParser(description="Indexed SQLite store of the generated exoplanet prompts")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Path to the SQLite store")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    build = commands.add_parser("build", help="Build the store from the prompt generator's output")
+    build.add_argument("--prompts", default="exoplanet_data_prompts.csv", help="Path to exoplanet_data_prompts.csv or .parquet")
+    build.add_argument("--chunksize", type=int, default=BUILD_CHUNKSIZE, help="Rows read and inserted at a time")
+
+    planet = commands.add_parser("planet", help="Look up planets by name")
+    planet.add_argument("names", nargs="+", help="Planet names (pl_name)")
+
+    host = commands.add_parser("host", help="Look up the planets of host stars")
+    host.add_argument("names", nargs="+", help="Host star names (hostname)")
+
+    for name, help_text in [("query", "Print the planets that match the filters"), ("export", "Write the planets that match the filters to a CSV file")]:
+        command = commands.add_parser(name, help=help_text)
+        command.add_argument("--category", nargs="+", default=None, help="Only planets of these categories (planet_category)")
+        command.add_argument("--range", nargs=3, action="append", default=[], metavar=("COLUMN", "LOW", "HIGH"),
+                             help="Only planets with LOW <= COLUMN <= HIGH, can be given more than once (for example --range pl_eqt 200 400)")
+        command.add_argument("--limit", type=int, default=None, help="At most this many planets")
+        if name == "export":
+            command.add_argument("--output", required=True, help="Path of the CSV file to write")
+
+    for command in [planet, host] + [commands.choices["query"], commands.choices["export"]]:
+        command.add_argument("--columns", nargs="+", default=None, help="Columns to return (default: name, host, category and the prompts; 'all' for every column)")
+    return parser
+
+def quote(column):
+    return '"' + column.replace('"', '""') + '"'
+
+def read_in_chunks(path, chunksize):
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+        return
+    # round_trip parses every float back to exactly the value that was written
+    yield from pd.read_csv(path, chunksize=chunksize, low_memory=False, float_precision='round_trip')
+
+def planet_rows(chunk):
+    names = chunk['pl_name']
+    return chunk[names.notna() & (names.astype(str).str.strip() != '0')]
+
+def build_store(prompts_path, store_path=DEFAULT_STORE_PATH, chunksize=BUILD_CHUNKSIZE):
+    partial_path = store_path + '.partial'
+    if os.path.exists(partial_path):
+        os.remove(partial_path)
+
+    rows = 0
+    connection = sqlite3.connect(partial_path)
+    try:
+        # nothing needs to survive a crash halfway through, the .partial file is thrown away
+        connection.execute('PRAGMA journal_mode = OFF')
+        connection.execute('PRAGMA synchronous = OFF')
+        columns = None
+        for chunk in read_in_chunks(prompts_path, chunksize):
+            chunk = planet_rows(chunk)
+            # categoricals from Parquet are stored as their text
+            chunk = chunk.astype({col: object for col, dtype in chunk.dtypes.items() if isinstance(dtype, pd.CategoricalDtype)})
+            chunk.to_sql(TABLE, connection, if_exists='append', index=False)
+            columns = list(chunk.columns)
+            rows += len(chunk)
+
+        # indexes are built once at the end, which is faster than keeping them up to date row by row
+        for column in LOOKUP_COLUMNS + RANGE_COLUMNS:
+            if columns is not None and column in columns:
+                connection.execute(f'CREATE INDEX {quote("index_" + column)} ON {TABLE} ({quote(column)})')
+        connection.execute('ANALYZE')
+        connection.commit()
+    finally:
+        connection.close()
+
+    os.replace(partial_path, store_path)
+    return rows
+
+def open_store(store_path=DEFAULT_STORE_PATH):
+    if not os.path.exists(store_path):
+        raise FileNotFoundError(f"{store_path} does not exist, build it first with: python catalog_store.py build --store {store_path}")
+    connection = sqlite3.connect(f'file:{store_path}?mode=ro', uri=True)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+def store_columns(connection):
+    return [row[1] for row in connection.execute(f'PRAGMA table_info({TABLE})')]
+
+def selected_columns(connection, columns):
+    available = store_columns(connection)
+    if columns == ['all']:
+        return available
+    if columns is None:
+        return [col for col in DEFAULT_COLUMNS if col in available]
+    unknown = [col for col in columns if col not in available]
+    if unknown:
+        raise ValueError(f"unknown columns: {', '.join(unknown)}")
+    return columns
+
+def fetch(connection, where, parameters, columns=None, limit=None):
+    select = ', '.join(quote(col) for col in selected_columns(connection, columns))
+    sql = f'SELECT {select} FROM {TABLE}'
+    if where:
+        sql += ' WHERE ' + ' AND '.join(where)
+    if limit is not None:
+        sql += ' LIMIT ?'
+        parameters = list(parameters) + [limit]
+    return [dict(row) for row in connection.execute(sql, parameters)]
+
+def in_clause(column, values):
+    return f'{quote(column)} IN ({", ".join("?" * len(values))})', list(values)
+
+def find_planets(connection, names, columns=None):
+    where, parameters = in_clause('pl_name', names)
+    return fetch(connection, [where], parameters, columns)
+
+def find_hosts(connection, hostnames, columns=None):
+    where, parameters = in_clause('hostname', hostnames)
+    return fetch(connection, [where], parameters, columns)
+
+# categories is a list of planet_category values, ranges maps a column to an inclusive (low, high) pair where either end can be None. Planets missing a ranged value (0) are left out.
+def query_planets(connection, categories=None, ranges=None, columns=None, limit=None):
+    available = store_columns(connection)
+    where, parameters = [], []
+    if categories:
+        clause, values = in_clause('planet_category', categories)
+        where.append(clause)
+        parameters += values
+    for column, (low, high) in (ranges or {}).items():
+        if column not in available:
+            raise ValueError(f"unknown column: {column}")
+        # a missing value is 0 in the catalog, it is never inside a range
+        where.append(f'{quote(column)} != 0')
+        if low is not None:
+            where.append(f'{quote(column)} >= ?')
+            parameters.append(low)
+        if high is not None:
+            where.append(f'{quote(column)} <= ?')
+            parameters.append(high)
+    return fetch(connection, where, parameters, columns, limit)
+
+def export_planets(connection, output_path, categories=None, ranges=None, columns=None, limit=None):
+    rows = query_planets(connection, categories, ranges, columns, limit)
+    pd.DataFrame(rows, columns=selected_columns(connection, columns)).to_csv(output_path, index=False)
+    return len(rows)
+
+def parse_ranges(ranges):
+    return {column: (float(low), float(high)) for column, low, high in ranges}
+
+def print_rows(rows):
+    for row in rows:
+        print('\n'.join(f"{column}: {value}" for column, value in row.items()))
+        print()
+
+def main():
+    parser = setup_argparse()
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == 'build':
+        rows = build_store(args.prompts, args.store, args.chunksize)
+        print(f"{rows} planets stored in {args.store} in {time.perf_counter() - start:.1f} s")
+        return
+
+    connection = open_store(args.store)
+    try:
+        if args.command == 'planet':
+            rows = find_planets(connection, args.names, args.columns)
+        elif args.command == 'host':
+            rows = find_hosts(connection, args.names, args.columns)
+        elif args.command == 'query':
+            rows = query_planets(connection, args.category, parse_ranges(args.range), args.columns, args.limit)
+        else:
+            count = export_planets(connection, args.output, args.category, parse_ranges(args.range), args.columns, args.limit)
+            print(f"{count} planets written to {args.output} in {(time.perf_counter() - start) * 1000:.1f} ms")
+            return
+    except ValueError as error:
+        parser.error(str(error))
+    finally:
+        connection.close()
+
+    print_rows(rows)
+    print(f"{len(rows)} planets in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+if __name__ == "__main__":
+    main()
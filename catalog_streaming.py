@@ -0,0 +1,98 @@
+### Catalog Streaming
+# The full exoplanet dataset is 146 MB of text and keeps growing as the descriptor and prompt columns are added, so it can also be run through the pipeline a chunk at a time and appended to the output as it goes. Since no planet depends on another row, the chunks (shards) can also be handed to a pool of worker processes and written back in their original order.
+#
+# To write exactly what the whole-dataset run writes, every chunk needs the decisions pandas and the pipeline make from the whole dataset:
+# * the dtype read_csv picks for each column (a chunk without blank rows would otherwise read sy_pnum as int and write "1" instead of "1.0")
+# * whether to_numeric can downcast each numeric column to float32 (it only does when every value survives the cast)
+# * whether planets are categorized by mass or by radius
+# A first pass over the file works these out without holding more than one chunk in memory.
+#
+# prompt_generator_functions.py runs it when given --chunksize, --max-memory-mb or --workers.
+
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# What a stream needs from the pipeline, handed in by prompt_generator_functions (its chunk_pipeline()) so this file does not import it: open_catalog(path) opens the catalog as a binary file, float_columns are the columns preprocessing downcasts to float32 where every value fits, and generate_chunk(chunk, float_dtypes, by_mass, unique_prompts, columns) preprocesses one chunk and generates its prompts. generate_chunk is sent to the worker processes, so it has to be defined at the top level of a module.
+ChunkPipeline = namedtuple('ChunkPipeline', ['open_catalog', 'float_columns', 'generate_chunk'])
+
+def scan_catalog(pipeline, path, chunksize):
+    kinds = {}
+    float_dtypes = dict.fromkeys(pipeline.float_columns, np.dtype('float32'))
+    by_mass = False
+    with pipeline.open_catalog(path) as catalog:
+        for chunk in pd.read_csv(catalog, chunksize=chunksize, low_memory=False):
+            for column, dtype in chunk.dtypes.items():
+                kinds.setdefault(column, set()).add(dtype.kind)
+
+            chunk = chunk[pipeline.float_columns].drop(0, errors='ignore').fillna(0)
+            for col in pipeline.float_columns:
+                if pd.to_numeric(chunk[col], downcast='float').dtype != np.dtype('float32'):
+                    float_dtypes[col] = np.dtype('float64')
+            by_mass = by_mass or bool(chunk['pl_bmasse'].astype('float64').any())
+
+    dtypes = {}
+    for column, found in kinds.items():
+        if found == {'i'}:
+            dtypes[column] = 'int64'
+        elif found <= {'i', 'f'}:
+            dtypes[column] = 'float64'
+        elif found == {'b'}:
+            dtypes[column] = 'bool'
+        elif 'b' not in found:
+            # a column with any text in it is read as text everywhere
+            dtypes[column] = object
+    return dtypes, float_dtypes, by_mass
+
+# Picks the number of rows per chunk from a memory budget, by running a small sample through the pipeline and measuring how much memory each finished row takes. The factor covers the raw chunk, the intermediate arrays of each step and the csv text of the chunk being written. With a process pool the budget is shared by every shard in flight.
+def chunksize_for_memory(pipeline, path, max_memory_mb, dtypes, float_dtypes, by_mass, unique_prompts=False, sample_rows=1000, overhead_factor=4, shards_in_flight=1):
+    with pipeline.open_catalog(path) as catalog:
+        sample = pd.read_csv(catalog, nrows=sample_rows, dtype=dtypes, low_memory=False)
+    sample = pipeline.generate_chunk(sample, float_dtypes, by_mass, unique_prompts)
+
+    bytes_per_row = sample.memory_usage(index=True, deep=True).sum() / max(len(sample), 1)
+    return max(1, int(max_memory_mb * 1024 * 1024 / (bytes_per_row * overhead_factor * shards_in_flight)))
+
+# Runs the whole chain on one shard of rows and hands back the csv text for it. This is what each worker process runs, so it only takes plain arguments that can be sent to another process.
+def generate_shard(generate_chunk, shard, float_dtypes, by_mass, unique_prompts, header, columns=None):
+    shard = generate_chunk(shard, float_dtypes, by_mass, unique_prompts, columns)
+    return len(shard), shard.to_csv(index=False, header=header)
+
+# Like executor.map, but only keeps a couple of shards per worker queued so the catalog is never read into memory all at once, and still returns the results in the order the shards were read.
+def map_shards_in_order(generate_chunk, shards, workers, float_dtypes, by_mass, unique_prompts, columns=None):
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for i, shard in enumerate(shards):
+            pending.append(executor.submit(generate_shard, generate_chunk, shard, float_dtypes, by_mass, unique_prompts, i == 0, columns))
+            if len(pending) >= workers * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def stream_exoplanet_prompts(pipeline, exoplanet_data_path, output_path='exoplanet_data_prompts.csv', chunksize=None, max_memory_mb=None, workers=1, unique_prompts=False, columns=None, scan_chunksize=50000, default_chunksize=10000):
+    dtypes, float_dtypes, by_mass = scan_catalog(pipeline, exoplanet_data_path, chunksize or scan_chunksize)
+    if chunksize is None and max_memory_mb is not None:
+        # each worker holds one shard, and up to two more per worker wait in the queue or as csv text
+        shards_in_flight = 1 if workers == 1 else workers * 3
+        chunksize = chunksize_for_memory(pipeline, exoplanet_data_path, max_memory_mb, dtypes, float_dtypes, by_mass, unique_prompts, shards_in_flight=shards_in_flight)
+    chunksize = chunksize or default_chunksize
+
+    # write next to the output and swap it in at the end, the input and the output are often the same file
+    partial_path = output_path + '.partial'
+    rows = 0
+    with pipeline.open_catalog(exoplanet_data_path) as catalog, open(partial_path, 'w', newline='') as output:
+        shards = pd.read_csv(catalog, chunksize=chunksize, dtype=dtypes, low_memory=False)
+        if workers > 1:
+            results = map_shards_in_order(pipeline.generate_chunk, shards, workers, float_dtypes, by_mass, unique_prompts, columns)
+        else:
+            results = (generate_shard(pipeline.generate_chunk, shard, float_dtypes, by_mass, unique_prompts, i == 0, columns) for i, shard in enumerate(shards))
+
+        for shard_rows, text in results:
+            output.write(text)
+            rows += shard_rows
+    os.replace(partial_path, output_path)
+
+    return rows
@@ -0,0 +1,280 @@
+### Curate Images
+# Picks the search results worth training on. `sheet` searches the queries (through nasa_search and its response cache), downloads every result's preview thumbnail at the same time (image_downloader.download_all, through the download cache), and writes for each query, in one go:
+#
+#   curation/<query>/sheet_01.jpg ...   numbered contact sheets, 100 thumbnails each, the number under each is its position in the results
+#   curation/<query>/index.html         the same thumbnails with a checkbox each, which builds the `select` command for the ticked images
+#   curation/<query>/index.json         the nasa_id behind every number, so `select` reads the numbers the way the sheets showed them
+#
+# `select` saves the choice of a query in curation_manifest.json, keyed by nasa_id: every image on its sheets is kept or left out for that query, and the manifest holds the search result of each image it lists. An image stays kept when the results of a query come back in another order, or on another page. `sheet --only-new` only shows the images the manifest has no choice for yet, and `export` writes the search results of the kept images.
+#
+# Run from the repository root:
+#   python curate_images.py sheet exoplanet "planet artist concept"
+#   python curate_images.py select --query exoplanet --keep 0 35 36 37
+#   python curate_images.py export --output kept_images.json
+
+import argparse
+import html
+import json
+import os
+import re
+import time
+from io import BytesIO
+
+from PIL import Image, ImageDraw, ImageFont
+
+import download_cache
+import image_downloader
+import nasa_search
+
+DEFAULT_FOLDER = 'curation'
+DEFAULT_MANIFEST = 'curation_manifest.json'
+DEFAULT_MAX_PAGES = 1
+THUMBNAIL_SIZE = 160
+LABEL_HEIGHT = 16
+SHEET_COLUMNS = 10
+SHEET_ROWS = 10
+KEPT_COLOR = (60, 200, 90)
+ASSET_PREVIEW_URL = 'https://images-assets.nasa.gov/image/{0}/{0}~thumb.jpg'
+
+def setup_argparse():
+    parser = argparse.ArgumentParser(description="Contact-sheet curation of the NASA image search results")
+    parser.add_argument("--folder", default=DEFAULT_FOLDER, help="Folder of the contact sheets, one subfolder per query")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST, help="JSON file of the kept and left out images, keyed by nasa_id")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    sheet = commands.add_parser("sheet", help="Search the queries and write numbered contact sheets and an HTML page of their results")
+    sheet.add_argument("queries", nargs="+", help="Search terms, one query per argument")
+    sheet.add_argument("--max-pages", type=int, default=DEFAULT_MAX_PAGES, help="Pages of results shown per query")
+    sheet.add_argument("--only-new", action="store_true", help="Only show the images the manifest has no choice for yet")
+    sheet.add_argument("--workers", type=int, default=image_downloader.DEFAULT_WORKERS, help="Number of thumbnails downloaded at the same time")
+    sheet.add_argument("--api-url", default=nasa_search.DEFAULT_API_URL, help="Base URL of the images API")
+    sheet.add_argument("--search-cache-dir", default=nasa_search.DEFAULT_CACHE_DIR, help="Folder of the cached search responses")
+    sheet.add_argument("--offline", action="store_true", help="Only use the cached search responses and make no API calls")
+    sheet.add_argument("--cache-dir", default=download_cache.DEFAULT_CACHE_DIR, help="Folder of the download cache the thumbnails go through")
+    sheet.add_argument("--no-cache", action="store_true", help="Download every thumbnail, without the download cache")
+
+    select = commands.add_parser("select", help="Save which images of a query's sheets are kept")
+    select.add_argument("--query", required=True, help="The query, as given to sheet")
+    select.add_argument("--keep", type=int, nargs="*", default=[], help="Numbers of the kept images, as shown on the sheets")
+    select.add_argument("--keep-ids", nargs="*", default=[], help="nasa_ids of the kept images (what the HTML page hands out)")
+
+    export = commands.add_parser("export", help="Write the search results of the kept images")
+    export.add_argument("--query", default=None, help="Only the images kept for this query")
+    export.add_argument("--output", default="kept_images.json", help="JSON file of the kept images' search results")
+    return parser
+
+def query_folder(folder, query):
+    return os.path.join(folder, re.sub(r'[^a-z0-9]+', '_', query.lower()).strip('_') or 'query')
+
+def preview_url(item):
+    links = item.get('links', [])
+    for link in links:
+        if link.get('rel') == 'preview':
+            return link['href']
+    return links[0]['href'] if links else None
+
+def title(item):
+    return item['data'][0].get('title', '')
+
+# The manifest maps each nasa_id to its search result and the choice made for it under each query that showed it ({'item': ..., 'queries': {query: True or False}})
+def load_manifest(path=DEFAULT_MANIFEST):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as file:
+        return json.load(file)['images']
+
+def save_manifest(manifest, path=DEFAULT_MANIFEST):
+    partial_path = path + '.partial'
+    with open(partial_path, 'w') as file:
+        json.dump({'version': 1, 'images': manifest}, file, indent=1)
+    os.replace(partial_path, path)
+
+# Of the shown items (nasa_id to search result) of query, keeps the ones in keep_ids and leaves out the others
+def record_selection(manifest, query, shown, keep_ids):
+    unknown = set(keep_ids) - set(shown)
+    if unknown:
+        raise ValueError(f"not on the sheets of {query!r}: {', '.join(sorted(unknown))}")
+    for nasa_id, item in shown.items():
+        entry = manifest.setdefault(nasa_id, {'item': item, 'queries': {}})
+        entry['item'] = item
+        entry['queries'][query] = nasa_id in keep_ids
+
+# Keeps the nasa_ids for query, leaving any choice already made for one of them as it is, and touching no other image. items gives their search results; an image missing from it gets a placeholder result with its preview link on images-assets.nasa.gov, replaced by update_items once a search finds it.
+def record_kept(manifest, query, keep_ids, items=None):
+    for nasa_id in keep_ids:
+        item = (items or {}).get(nasa_id) or {'href': None, 'data': [{'nasa_id': nasa_id}], 'links': [{'href': ASSET_PREVIEW_URL.format(nasa_id), 'rel': 'preview', 'render': 'image'}]}
+        entry = manifest.setdefault(nasa_id, {'item': item, 'queries': {}})
+        entry['queries'].setdefault(query, True)
+
+# Replaces the search results stored in the manifest with the newer ones in items
+def update_items(manifest, items):
+    for nasa_id, entry in manifest.items():
+        if nasa_id in items:
+            entry['item'] = items[nasa_id]
+
+def choices(manifest, query):
+    return {nasa_id: entry['queries'][query] for nasa_id, entry in manifest.items() if query in entry['queries']}
+
+# The nasa_ids kept for query, or for any query
+def kept_ids(manifest, query=None):
+    return [nasa_id for nasa_id, entry in manifest.items() if (entry['queries'].get(query) if query else any(entry['queries'].values()))]
+
+# Downloads the preview thumbnails of the items (nasa_id to search result) at the same time and returns nasa_id to image bytes, and the failed downloads
+def fetch_thumbnails(items, workers=image_downloader.DEFAULT_WORKERS, cache=None):
+    ids_by_url = {}
+    for nasa_id, item in items.items():
+        ids_by_url.setdefault(preview_url(item), []).append(nasa_id)
+    urls = list(ids_by_url)
+    thumbnails, failures = {}, []
+    for position, result in image_downloader.download_all(urls, workers=workers, cache=cache):
+        if result.error:
+            failures.append(result)
+            continue
+        for nasa_id in ids_by_url[urls[position]]:
+            thumbnails[nasa_id] = result.content
+    return thumbnails, failures
+
+def open_thumbnail(content, size=THUMBNAIL_SIZE):
+    try:
+        img = Image.open(BytesIO(content))
+        img.draft('RGB', (size, size))
+        img = img.convert('RGB')
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+    img.thumbnail((size, size))
+    return img
+
+# Draws the numbered (number, nasa_id) entries onto sheets of SHEET_COLUMNS x SHEET_ROWS thumbnails, with a frame around the kept ones, and returns the sheet paths
+def write_contact_sheets(numbered, thumbnails, folder, kept=()):
+    cell_width, cell_height = THUMBNAIL_SIZE + 4, THUMBNAIL_SIZE + LABEL_HEIGHT + 4
+    per_sheet = SHEET_COLUMNS * SHEET_ROWS
+    font = ImageFont.load_default()
+    paths = []
+    for sheet_start in range(0, len(numbered), per_sheet):
+        entries = numbered[sheet_start:sheet_start + per_sheet]
+        rows = -(-len(entries) // SHEET_COLUMNS)
+        sheet = Image.new('RGB', (SHEET_COLUMNS * cell_width, rows * cell_height), (20, 20, 20))
+        draw = ImageDraw.Draw(sheet)
+        for cell, (number, nasa_id) in enumerate(entries):
+            left, top = cell % SHEET_COLUMNS * cell_width, cell // SHEET_COLUMNS * cell_height
+            if nasa_id in kept:
+                draw.rectangle((left, top, left + cell_width - 1, top + THUMBNAIL_SIZE + 3), outline=KEPT_COLOR, width=2)
+            img = thumbnails.get(nasa_id)
+            if img is not None:
+                sheet.paste(img, (left + 2 + (THUMBNAIL_SIZE - img.width) // 2, top + 2 + (THUMBNAIL_SIZE - img.height) // 2))
+            else:
+                draw.text((left + 8, top + THUMBNAIL_SIZE // 2), 'no thumbnail', fill=(160, 160, 160), font=font)
+            draw.text((left + 2, top + THUMBNAIL_SIZE + 4), f'{number}  {nasa_id}'[:28], fill=(230, 230, 230), font=font)
+        path = os.path.join(folder, f'sheet_{sheet_start // per_sheet + 1:02d}.jpg')
+        sheet.save(path, format='JPEG', quality=85)
+        paths.append(path)
+    return paths
+
+HTML_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title}</title>
+<style>
+body {{ background: #141414; color: #ddd; font-family: sans-serif; }}
+.grid {{ display: flex; flex-wrap: wrap; gap: 6px; }}
+label {{ width: {size}px; font-size: 11px; cursor: pointer; }}
+label img {{ width: {size}px; height: {size}px; object-fit: contain; background: #000; border: 3px solid #141414; }}
+input:checked + img {{ border-color: #3cc85a; }}
+textarea {{ width: 100%; height: 5em; }}
+</style></head>
+<body>
+<h2>{title}</h2>
+<p>Tick the images to keep, then run the command below from the repository root.</p>
+<textarea id="command" readonly></textarea>
+<div class="grid">
+{figures}
+</div>
+<script>
+const boxes = document.querySelectorAll('input[type=checkbox]');
+function update() {{
+  const ids = Array.from(boxes).filter(box => box.checked).map(box => box.value);
+  document.getElementById('command').value = {command} + ids.join(' ');
+}}
+boxes.forEach(box => box.addEventListener('change', update));
+update();
+</script>
+</body></html>
+"""
+
+def write_html(query, numbered, items, folder, kept=()):
+    figures = []
+    for number, nasa_id in numbered:
+        checked = ' checked' if nasa_id in kept else ''
+        name = html.escape(title(items[nasa_id]))
+        figures.append(f'<label title="{name}"><input type="checkbox" value="{html.escape(nasa_id)}"{checked} hidden>'
+                       f'<img src="thumbs/{html.escape(nasa_id)}.jpg" loading="lazy"><br>{number} {html.escape(nasa_id)}<br>{name[:40]}</label>')
+    command = json.dumps(f'python curate_images.py select --query "{query}" --keep-ids ')
+    path = os.path.join(folder, 'index.html')
+    with open(path, 'w') as file:
+        file.write(HTML_PAGE.format(title=html.escape(f'{query}: {len(numbered)} images'), size=THUMBNAIL_SIZE, figures='\n'.join(figures), command=command))
+    return path
+
+# Writes the contact sheets, the HTML page and the number index of one query's items (nasa_id to search result, in result order) and returns the paths of the sheets and the page
+def write_query_sheets(query, items, thumbnails, folder=DEFAULT_FOLDER, manifest=None, only_new=False):
+    folder = query_folder(folder, query)
+    os.makedirs(os.path.join(folder, 'thumbs'), exist_ok=True)
+    made = choices(manifest or {}, query)
+    numbered = [(number, nasa_id) for number, nasa_id in enumerate(items) if not (only_new and nasa_id in made)]
+    kept = {nasa_id for nasa_id, keep in made.items() if keep}
+
+    images = {}
+    for number, nasa_id in numbered:
+        if nasa_id in thumbnails:
+            images[nasa_id] = open_thumbnail(thumbnails[nasa_id])
+            if images[nasa_id] is not None:
+                images[nasa_id].save(os.path.join(folder, 'thumbs', f'{nasa_id}.jpg'), format='JPEG', quality=85)
+    with open(os.path.join(folder, 'index.json'), 'w') as file:
+        json.dump({'query': query, 'numbers': {number: nasa_id for number, nasa_id in numbered}, 'items': {nasa_id: items[nasa_id] for number, nasa_id in numbered}}, file)
+    return write_contact_sheets(numbered, images, folder, kept), write_html(query, numbered, items, folder, kept)
+
+# The nasa_ids and search results shown on the sheets of query, by number
+def read_query_index(folder, query):
+    path = os.path.join(query_folder(folder, query), 'index.json')
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"no contact sheets for {query!r} in {folder}, run the sheet command first")
+    with open(path) as file:
+        index = json.load(file)
+    return {int(number): nasa_id for number, nasa_id in index['numbers'].items()}, index['items']
+
+def main():
+    parser = setup_argparse()
+    args = parser.parse_args()
+    manifest = load_manifest(args.manifest)
+
+    if args.command == 'sheet':
+        start = time.perf_counter()
+        search_cache = nasa_search.ResponseCache(args.search_cache_dir, offline=args.offline)
+        results = nasa_search.search_all(args.queries, args.max_pages, api_url=args.api_url, cache=search_cache)
+        cache = None if args.no_cache else download_cache.DownloadCache(args.cache_dir)
+        thumbnails, failures = fetch_thumbnails(results.items, args.workers, cache)
+        for query, ids in results.queries.items():
+            sheets, page = write_query_sheets(query, {nasa_id: results.items[nasa_id] for nasa_id in ids}, thumbnails, args.folder, manifest, args.only_new)
+            print(f"{query}: {len(sheets)} contact sheets in {os.path.dirname(page)}, open {page} to tick the images to keep")
+        if failures:
+            print(f"{len(failures)} thumbnails could not be downloaded")
+        print(f"{len(results.items)} images in {time.perf_counter() - start:.1f} s")
+
+    elif args.command == 'select':
+        numbers, items = read_query_index(args.folder, args.query)
+        missing = [number for number in args.keep if number not in numbers]
+        if missing:
+            parser.error(f"numbers not on the sheets of {args.query!r}: {missing}")
+        keep_ids = {numbers[number] for number in args.keep} | set(args.keep_ids)
+        try:
+            record_selection(manifest, args.query, items, keep_ids)
+        except ValueError as error:
+            parser.error(str(error))
+        save_manifest(manifest, args.manifest)
+        print(f"{args.query}: {len(keep_ids)} of {len(items)} images kept, {len(kept_ids(manifest))} kept in all, saved to {args.manifest}")
+
+    else:
+        kept = [manifest[nasa_id]['item'] for nasa_id in kept_ids(manifest, args.query)]
+        with open(args.output, 'w') as file:
+            json.dump(kept, file)
+        print(f"{len(kept)} kept images written to {args.output}")
+
+if __name__ == "__main__":
+    main()
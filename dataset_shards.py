@@ -0,0 +1,145 @@
+### Dataset Shards
+# Writes the training samples into a few large tar files instead of one small file per image, in the layout WebDataset reads: each sample is a run of tar members that share a key (image_1.jpg, image_1.json), and a sample never spans two shards. A shard is closed and a new one started when the next sample would take it over max_bytes, and each shard is written to a .partial file that is renamed when it is complete, so a shard that exists is always whole.
+#
+# index.csv lists every member with the shard it is in and the offset and size of its data in that file, so one sample can be read with a single seek without scanning the tar. It is written when the writer is closed.
+#
+# iterate_samples reads the shards front to back as a stream, in big sequential reads, which is what disks and object stores are fastest at.
+#
+# Run from the repository root to list or time a folder of shards:
+#   python dataset_shards.py data_shards --show 3
+
+import argparse
+import csv
+import io
+import os
+import tarfile
+import time
+
+DEFAULT_SHARD_BYTES = 512 * 1024 ** 2
+SHARD_NAME = 'shard-{:06d}.tar'
+INDEX_NAME = 'index.csv'
+INDEX_COLUMNS = ['key', 'member', 'shard', 'offset', 'size']
+READ_BUFFER = 1024 ** 2
+
+def setup_argparse():
+    parser = argparse.ArgumentParser(description="Read a folder of dataset shards from start to end and report the read speed")
+    parser.add_argument("folder", help="Folder holding the shards and index.csv")
+    parser.add_argument("--show", type=int, default=0, help="Print the keys and members of the first N samples")
+    return parser
+
+def padded(size):
+    return -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+class ShardWriter:
+    def __init__(self, folder, max_bytes=DEFAULT_SHARD_BYTES):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.shard_number = -1
+        self.tar = None
+        self.index = []
+        os.makedirs(folder, exist_ok=True)
+
+    def shard_path(self):
+        return os.path.join(self.folder, SHARD_NAME.format(self.shard_number))
+
+    def open_shard(self):
+        self.close_shard()
+        self.shard_number += 1
+        self.tar = tarfile.open(self.shard_path() + '.partial', 'w', format=tarfile.USTAR_FORMAT)
+
+    def close_shard(self):
+        if self.tar is not None:
+            self.tar.close()
+            os.replace(self.shard_path() + '.partial', self.shard_path())
+            self.tar = None
+
+    # The size of the finished shard file with sample_bytes more in it: the two zero blocks that end a tar are counted too, and tar then pads the file to a whole 10 kB record
+    def size_with(self, sample_bytes):
+        end = self.tar.offset + sample_bytes + 2 * tarfile.BLOCKSIZE
+        return -(-end // tarfile.RECORDSIZE) * tarfile.RECORDSIZE
+
+    # Adds one sample: members maps an extension ('jpg', 'json', 'txt') to its bytes
+    def write(self, key, members):
+        sample_bytes = sum(tarfile.BLOCKSIZE + padded(len(data)) for data in members.values())
+        if self.tar is None or (self.tar.offset > 0 and self.size_with(sample_bytes) > self.max_bytes):
+            self.open_shard()
+
+        for extension, data in members.items():
+            info = tarfile.TarInfo(f'{key}.{extension}')
+            info.size = len(data)
+            info.mtime = time.time()
+            self.tar.addfile(info, io.BytesIO(data))
+            # the data ends the member, padded to a whole block
+            offset = self.tar.offset - padded(len(data))
+            self.index.append({'key': key, 'member': info.name, 'shard': SHARD_NAME.format(self.shard_number), 'offset': offset, 'size': len(data)})
+
+    def close(self):
+        self.close_shard()
+        partial_path = os.path.join(self.folder, INDEX_NAME + '.partial')
+        with open(partial_path, 'w', newline='') as file:
+            writer = csv.DictWriter(file, fieldnames=INDEX_COLUMNS)
+            writer.writeheader()
+            writer.writerows(self.index)
+        os.replace(partial_path, os.path.join(self.folder, INDEX_NAME))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exception):
+        self.close()
+
+def shard_paths(folder):
+    return sorted(os.path.join(folder, name) for name in os.listdir(folder) if name.startswith('shard-') and name.endswith('.tar'))
+
+# Yields every sample of the shards in order, as a dict with its '__key__' and the bytes of each member by extension
+def iterate_samples(folder):
+    for path in shard_paths(folder):
+        with open(path, 'rb', buffering=READ_BUFFER) as file, tarfile.open(fileobj=file, mode='r|') as tar:
+            sample = None
+            for info in tar:
+                if not info.isfile():
+                    continue
+                key, extension = info.name.split('.', 1)
+                if sample is not None and sample['__key__'] != key:
+                    yield sample
+                    sample = None
+                if sample is None:
+                    sample = {'__key__': key}
+                sample[extension] = tar.extractfile(info).read()
+            if sample is not None:
+                yield sample
+
+# The index as a dict of key -> {extension: (shard, offset, size)}
+def load_index(folder):
+    index = {}
+    with open(os.path.join(folder, INDEX_NAME), newline='') as file:
+        for row in csv.DictReader(file):
+            extension = row['member'].split('.', 1)[1]
+            index.setdefault(row['key'], {})[extension] = (row['shard'], int(row['offset']), int(row['size']))
+    return index
+
+# Reads one sample through the index, with one seek per member
+def read_sample(folder, index, key):
+    sample = {'__key__': key}
+    for extension, (shard, offset, size) in index[key].items():
+        with open(os.path.join(folder, shard), 'rb') as file:
+            file.seek(offset)
+            sample[extension] = file.read(size)
+    return sample
+
+def main():
+    parser = setup_argparse()
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    samples, total = 0, 0
+    for sample in iterate_samples(args.folder):
+        if samples < args.show:
+            print(sample['__key__'], ', '.join(f"{extension} ({len(data)} bytes)" for extension, data in sample.items() if extension != '__key__'))
+        samples += 1
+        total += sum(len(data) for extension, data in sample.items() if extension != '__key__')
+    elapsed = time.perf_counter() - start
+    print(f"{samples} samples in {len(shard_paths(args.folder))} shards, {total / 1e6:.1f} MB read in {elapsed:.2f} s ({total / 1e6 / elapsed if elapsed else 0:.0f} MB/s, {samples / elapsed if elapsed else 0:.0f} samples/s)")
+
+if __name__ == "__main__":
+    main()
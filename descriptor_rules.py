@@ -0,0 +1,376 @@
+### Descriptor Rules
+# This file holds the threshold ladders used by prompt_generator_functions to translate the numeric planet and star data into words. Each ladder is written as a table of bands instead of a chain of if/elif statements, and every table is compiled once (when this file is imported) into a sorted list of bin edges. The descriptor functions then look up every row of a column at the same time with np.searchsorted instead of looping with iterrows.
+
+import numpy as np
+import pandas as pd
+
+# ## Reference Values
+# Masses of the planets in our solar system (in earth masses) and their orbital periods (in days), used for comparative purposes.
+
+MERCURY_MASS = 0.0553
+VENUS_MASS = 0.815
+EARTH_MASS = 1.0
+MARS_MASS = 0.107
+JUPITER_MASS = 317.8
+SATURN_MASS = 95.2
+URANUS_MASS = 14.5
+NEPTUNE_MASS = 17.1
+
+MERCURY_SPIN = 88
+VENUS_SPIN = 224
+EARTH_SPIN = 365
+MARS_SPIN = 687
+JUPITER_SPIN = 4332
+SATURN_SPIN = 10747
+URANUS_SPIN = 30589
+NEPTUNE_SPIN = 59800
+
+ROCKY_CATEGORIES = ('terrestrial', 'super-earth')
+
+# Saved in the incremental manifest of prompt_generator_functions. The tables below are fingerprinted automatically, bump this when the code that applies them changes the output.
+RULE_SET_VERSION = 1
+
+# ## Rule Tables
+# A ladder is a list of (lower, upper, text) bands. A value falls in a band when lower < value <= upper, and None means the band is open on that side. Bands are checked in order and the first match wins, exactly like the original if/elif chains, so bands that are shadowed by an earlier band (or that are empty) are kept as written and simply never match. A value that matches no band is left without a description.
+
+PLANET_MASS_DESCRIPTION_BY_MASS = [
+    (None, MERCURY_MASS, 'tiny'),
+    (MERCURY_MASS, MARS_MASS, 'very small'),
+    (MARS_MASS, VENUS_MASS, 'small'),
+    (VENUS_MASS, EARTH_MASS, 'medium small'),
+    (URANUS_MASS, NEPTUNE_MASS, 'medium'),
+    (NEPTUNE_MASS, SATURN_MASS, 'large'),
+    (SATURN_MASS, JUPITER_MASS, 'giant'),
+    (JUPITER_MASS, None, 'massive'),
+]
+
+PLANET_MASS_DESCRIPTION_BY_CATEGORY = {
+    'terrestrial': 'small',
+    'super-earth': 'medium',
+    'neptune-like': 'large',
+    'gas-giant': 'giant',
+}
+
+# planet color from the equilibrium temperature, one ladder per planet category
+PLANET_COLOR_BY_EQT = {
+    ROCKY_CATEGORIES: [
+        (None, 20.0, 'has a composition of hydrogen and helium producing a distince white color'),
+        (20.0, 200.0, 'has high quantities of methane known for its rich blue color'),
+        (200.0, 400.0, 'likely has a small amount of blue methane and yellow ammonia. The most dominant color would come from blue liquid water'),
+        (400.0, 600.0, 'most likely has water vapor that still produces a true blue color mixing with the breakdown of methanes deep blue'),
+        (600.0, 800.0, 'has carbon dioxide and hydrocarbons are dominant in this planet which could both come in varying shades of blue and white'),
+        (800.0, 1200.0, 'has white carbon dioxide molecules and pale yellow sulfur compounds are likely on this planet'),
+        (1200.0, 1700.0, 'has pale yellow sulfure compounds and blue and white water vapor are likely dominate on this planet'),
+        (1700.0, None, 'is so hot all metals are breaking down causing the planet to likely be covered in lava'),
+    ],
+    ('neptune-like',): [
+        (None, 90.0, 'consists mostly of helium and hydrogen which are dominantly white, but it mixes with frozen methane characterized by a light blue color'),
+        (90.0, 110.0, 'has methane as a liquid and dominant in the atmosphere shifting the color to a azure blue color'),
+        (110.0, 275.0, 'has methane as a gas and producing a deep blue color'),
+        (275.0, 375.0, 'has a dark blue methane color mixing with water vapor clouds of a much lighter blue color and traces of ammonia as a light yellow color'),
+        (375.0, 500.0, 'methane is breaking down and possibly mixing with other chemicals such as sulfur, known for its pale yellow color'),
+        (500.0, 800.0, 'methane is breaking down, so the planet is likely no longer a deep blue, but hydrocarbons are likely present in the atmosphere, which depending on composition are varying shades of blue'),
+        (800.0, 900.0, 'has deep blue methane is breaking down and less pronounced and likely to have alkali metals known for their silvery white color'),
+        (900.0, 1400.0, 'has deep blue methane is breaking down and less pronounced, aerosols and thermal emissions are more likely and often give off a neutral or red color that would mix with the blue'),
+        (1400.0, None, 'likely overtaken by aerosols and thermal emissions as well as high-temperature gases causing it to be between purple and red in color'),
+    ],
+    ('gas-giant',): [
+        (None, 70.0, 'has frozen ammonia producing a duller yellow color merging with the more dominant methane, characterized by its shade of blue'),
+        (70.0, 150.0, 'most likely overrun with ammonia clouds characterized by their variety of yellow coloring'),
+        (150.0, 250.0, 'has methane in its blue color but in very small quantities. The dominant color will be ammonia, which is now a liquid giving the planet a darker yellow color closer to brown'),
+        (250.0, 350.0, 'the atmosphere is overtaken with water vapor giving the planet a mostly white color with the posibility of slight blue tinting'),
+        (350.0, 800.0, 'is so warm it likely does not have clouds and appears as a uniform blue orb'),
+        (800.0, 900.0, 'is in transition from a blue atmosphere to being overtaken by carbon monoxide and alkali metals known for being silvery white'),
+        (900.0, 1400.0, 'has carbon monoxide and alkali metals like sodium and potassium as dominant, which known for their silvery white coloring'),
+        (1400.0, None, 'is dominated by silicate and iron clouds most notably variations of red coloring'),
+    ],
+    ('unknown planet size',): [
+        (None, None, 'is an unknown planet color'),
+    ],
+}
+
+# planet color from the mass when there is no equilibrium temperature
+PLANET_COLOR_BY_MASS = [
+    (None, MERCURY_MASS, 'is likely extremely hot and possibly covered in lava, primary composed of silicate minerals and oxides ranging in a variety of colors from silvery gray to a rich deep red'),
+    (MERCURY_MASS, MARS_MASS, 'is primarily composed of silicate minerals and oxides ranging in a variety of colors from silvery gray to a rich deep red'),
+    (MARS_MASS, VENUS_MASS, 'is primarily composed of silicate minerals and oxides ranging in a variety of colors from silvery gray to a rich deep red, as well as other gas chemicals such as carbon dioxide which produces a white color, and sulfur known for being a pale yellow'),
+    (VENUS_MASS, EARTH_MASS, 'likely has a mixture of blue liquid water, and other gas chemicals such as carbon dioxide which produces a white color, and sulfur known for being pale yellow in color'),
+    (EARTH_MASS, None, 'likely has water vapor producing a blue color as well as helium and hydrogen, which both produce shades of white'),
+    (None, URANUS_MASS, 'consisting mostly of helium and hydrogen which are dominantly white, but it mixes with frozen methane characterized by a light blue color'),
+    (URANUS_MASS, NEPTUNE_MASS, 'has methane as a liquid and dominant in the atmosphere shifting the color to a azure blue color'),
+    (NEPTUNE_MASS, None, 'has methane as a gas and producing a deep blue color'),
+    (None, SATURN_MASS, 'has frozen ammonia producing a duller yellow color with slight traces of methane characterized by its shade of true blue'),
+    (SATURN_MASS, JUPITER_MASS, 'is most likely overrun with ammonia clouds characterized by their variety of yellow coloring'),
+    (JUPITER_MASS, None, 'has methane in its blue color but in very small quantities with the dominant color will be ammonia, which is now a liquid giving the planet a range of darker yellow and brown colors'),
+]
+
+# planet color when there is neither a temperature nor a mass
+PLANET_COLOR_BY_CATEGORY = {
+    'terrestrial': 'a rocky world made up of metals and rocks',
+    'super-earth': 'a rocky world made up of metals and rocks',
+    'neptune-like': 'an icy world composed of frozen gases',
+    'gas-giant': 'a giant world obscured by swirling gases',
+    'unknown planet size': 'has an unknown planet color',
+}
+
+PLANET_COLOR_SHORT_BY_EQT = {
+    ROCKY_CATEGORIES: [
+        (None, 20.0, 'is white in color'),
+        (20.0, 200.0, 'is rich blue in color'),
+        (200.0, 400.0, 'contains liquid water, and has traces of blue and yellow coloring'),
+        (400.0, 600.0, 'is a shade of blue in color'),
+        (600.0, 800.0, 'is a varying shade of blue and/or white'),
+        (800.0, 1200.0, 'is white and pale yellow in color'),
+        (1200.0, 1700.0, 'is mostly blue and white with possible pale yellow coloring'),
+        (1700.0, None, 'is covered in lava'),
+    ],
+    ('neptune-like',): [
+        (None, 90.0, 'is mostly white mixed with light blue in color'),
+        (90.0, 110.0, 'is azure blue in color'),
+        (110.0, 275.0, 'is a deep blue color'),
+        (275.0, 375.0, 'is mostly a dark blue color mixing with light blue and pale yellow'),
+        (375.0, 500.0, 'is a mixture of blue and yellow in color'),
+        (500.0, 800.0, 'is a shade of blue'),
+        (800.0, 900.0, 'is mostly blue mixing with a silvery white color'),
+        (900.0, 1400.0, 'is mostly blue mixing with brown and red colors'),
+        (1400.0, None, 'is between purple and red in color'),
+    ],
+    ('gas-giant',): [
+        (None, 70.0, 'is pale yellow in color with slight traces of blue'),
+        (70.0, 150.0, 'a shade of yellow in color'),
+        (150.0, 250.0, 'a yellow brown in color with slight traces of blue'),
+        (250.0, 350.0, 'mostly white in color with slight traces of blue'),
+        (350.0, 800.0, 'a uniform blue in color'),
+        (800.0, 900.0, 'is blue mixing with silvery white in color'),
+        (900.0, 1400.0, 'is mostly silvery white in color'),
+        (1400.0, None, 'a shade of red in color'),
+    ],
+    ('unknown planet size',): [
+        (None, None, 'unknown planet color'),
+    ],
+}
+
+PLANET_COLOR_SHORT_BY_MASS = [
+    (None, MERCURY_MASS, 'is covered in lava and a shade of deep red to silvery gray in color'),
+    (MERCURY_MASS, MARS_MASS, 'a shade of deep red to silvery gray in color'),
+    (MARS_MASS, VENUS_MASS, 'is likely a shade of deep red to silvery gray with traces of white and pale yellow coloring'),
+    (VENUS_MASS, EARTH_MASS, 'contains liquid water and possible white and yellow coloring'),
+    (EARTH_MASS, None, 'is mostly blue with traces of white coloring'),
+    (None, URANUS_MASS, 'is light blue with traces of white coloring'),
+    (URANUS_MASS, NEPTUNE_MASS, 'an azure blue color'),
+    (NEPTUNE_MASS, None, 'a deep blue color'),
+    (None, SATURN_MASS, 'a dull yellow color mixing with true blue'),
+    (SATURN_MASS, JUPITER_MASS, 'a shade of yellow coloring'),
+    (JUPITER_MASS, None, 'a darker yellow and brown color with possible blue'),
+]
+
+PLANET_COLOR_SHORT_BY_CATEGORY = {
+    'terrestrial': 'is a rocky world made up of metals and rocks',
+    'super-earth': 'is a rocky world made up of metals and rocks',
+    'neptune-like': 'is an icy world composed of frozen gases',
+    'gas-giant': 'is a giant world obscured by swirling gases',
+    'unknown planet size': 'ia an unknown planet color',
+}
+
+# planet spin from the orbital period, one ladder per planet category
+PLANET_SPIN_BY_PERIOD = {
+    ROCKY_CATEGORIES: [
+        (None, MERCURY_SPIN, 'is hot and rotating quickly with little to no atmosphere, clouds, or storms'),
+        (MERCURY_SPIN, VENUS_SPIN, 'is hot and rotating quickly hot with a thick atmosphere of heavy swirling clouds with bright and dark markings'),
+        (VENUS_SPIN, EARTH_SPIN, 'has clouds of various sizes speckling planet atmosphere showing pieces of the planet terrain beneath'),
+        (EARTH_SPIN, MARS_SPIN, 'has clouds of various sizes speckling planet atmosphere showing pieces of the planet terrain beneath'),
+        (MARS_SPIN, None, 'has wisps of clouds of various sizes speckling planet atmosphere showing most of the planet terrain beneath'),
+    ],
+    ('neptune-like',): [
+        (None, URANUS_SPIN, 'has clearly defined striped light and dark icy clouds'),
+        (URANUS_SPIN, NEPTUNE_SPIN, 'has softly defined striped light and dark icy clouds'),
+        (NEPTUNE_SPIN, None, 'has icy clouds with no apparent delineation between colors'),
+    ],
+    ('gas-giant',): [
+        (None, JUPITER_SPIN, 'has stripes of thick clouds of various coloring defined by clear, sharp edges'),
+        (JUPITER_SPIN, SATURN_SPIN, 'has stripes of thick clouds of various coloring defined by softened edges'),
+        (SATURN_SPIN, None, 'has thick clouds of various coloring blending together across the planet surface'),
+    ],
+}
+
+# planet spin from the mass when there is no orbital period
+PLANET_SPIN_BY_MASS = {
+    ROCKY_CATEGORIES: [
+        (None, MERCURY_MASS, 'is hot and rotating quickly with little to no atmosphere, clouds, or storms'),
+        (MERCURY_MASS, VENUS_MASS, 'is hot and rotating quickly with a thick atmosphere of heavy swirling clouds with bright and dark markings'),
+        (VENUS_MASS, EARTH_MASS, 'has clouds of various sizes speckling planet atmosphere showing pieces of the planet terrain beneath'),
+        (EARTH_MASS, MARS_MASS, 'has clouds of various sizes speckling planet atmosphere showing pieces of the planet terrain beneath'),
+        (MARS_MASS, None, 'has wisps of clouds of various sizes speckling planet atmosphere showing most of the planet terrain beneath'),
+    ],
+    ('neptune-like',): [
+        (None, URANUS_MASS, 'has clearly defined striped light and dark icy clouds'),
+        (URANUS_MASS, NEPTUNE_MASS, 'has softly defined striped light and dark icy clouds'),
+        (NEPTUNE_MASS, None, 'has icy clouds with no apparent delineation between colors'),
+    ],
+    ('gas-giant',): [
+        (None, JUPITER_MASS, 'has stripes of thick clouds of various coloring defined by clear, sharp edges'),
+        (JUPITER_MASS, SATURN_MASS, 'has stripes of thick clouds of various coloring defined by softened edges'),
+        (SATURN_MASS, None, 'has thick clouds of various coloring blending together across the planet surface'),
+    ],
+}
+
+PLANET_SPIN_SHORT_BY_PERIOD = {
+    ROCKY_CATEGORIES: [
+        (None, MERCURY_SPIN, 'is hot and rotating quickly with little to no clouds'),
+        (MERCURY_SPIN, VENUS_SPIN, 'is hot and rotating quickly hot with swirling clouds of light and dark markings'),
+        (VENUS_SPIN, EARTH_SPIN, 'has clouds of various sizes'),
+        (EARTH_SPIN, MARS_SPIN, 'has clouds of various sizes'),
+        (MARS_SPIN, None, 'has thin clouds of various sizes'),
+    ],
+    ('neptune-like',): [
+        (None, URANUS_SPIN, 'has clearly defined striped light and dark clouds'),
+        (URANUS_SPIN, NEPTUNE_SPIN, 'has softly defined striped light and dark clouds'),
+        (NEPTUNE_SPIN, None, 'has cloud colors blending together'),
+    ],
+    ('gas-giant',): [
+        (None, JUPITER_SPIN, 'has clear, sharp-edge stripes of thick clouds'),
+        (JUPITER_SPIN, SATURN_SPIN, 'has soft-edged stripes of thick clouds'),
+        (SATURN_SPIN, None, 'has thick clouds of various coloring blending together'),
+    ],
+}
+
+PLANET_SPIN_SHORT_BY_MASS = {
+    ROCKY_CATEGORIES: [
+        (None, MERCURY_MASS, 'is hot and rotating quickly with little to no clouds'),
+        (MERCURY_MASS, VENUS_MASS, 'is hot and rotating quickly hot with swirling clouds of light and dark markings'),
+        (VENUS_MASS, EARTH_MASS, 'has thick clouds of various sizes'),
+        (EARTH_MASS, MARS_MASS, 'has thick clouds of various sizes'),
+        (MARS_MASS, None, 'has thin clouds of various sizes'),
+    ],
+    ('neptune-like',): [
+        (None, URANUS_MASS, 'has clearly defined striped light and dark clouds'),
+        (URANUS_MASS, NEPTUNE_MASS, 'has softly defined striped light and dark icy clouds'),
+        (NEPTUNE_MASS, None, 'has cloud colors blending together'),
+    ],
+    ('gas-giant',): [
+        (None, JUPITER_MASS, 'has clear, sharp-edge stripes of thick clouds'),
+        (JUPITER_MASS, SATURN_MASS, 'has soft-edged stripes of thick clouds'),
+        (SATURN_MASS, None, 'has thick clouds of various coloring blending together'),
+    ],
+}
+
+PLANET_SPIN_WITHOUT_CATEGORY = 'rotates around its star'
+
+TIDAL_LOCKED = 'only has one side of the planet facing the sun. The side facing the sun is extremely hot and the side that faces away from the sun is dark and cold'
+NOT_TIDAL_LOCKED = 'spins around its orbit so both sides get heat from the sun'
+
+# stellar color from the first letter of the harvard spectral classification, including the special cases (T/L brown dwarfs, D white dwarfs)
+STELLAR_COLOR_BY_SPECTRAL_CLASS = {
+    'M': 'orange red',
+    'm': 'orange red',
+    'K': 'light orange',
+    'G': 'yellow',
+    'F': 'yellow white',
+    'A': 'white',
+    'B': 'blue white',
+    'O': 'blue',
+    'T': 'violet',
+    'L': 'magenta',
+    'D': 'white',
+}
+
+WHITE_DWARF_SPECTRAL_TYPE = 'WD'
+WHITE_DWARF_SPECTRAL_CLASS = 'D'
+BROWN_DWARF_SPECTRAL_CLASSES = ('L', 'T')
+SUBDWARF_SPECTRAL_CLASS = 's'
+
+STELLAR_COLOR_BY_TEFF = [
+    (None, 3500.0, 'orange red'),
+    (3500.0, 5000.0, 'light orange'),
+    (5000.0, 6000.0, 'yellow'),
+    (6000.0, 7500.0, 'yellow white'),
+    (7500.0, 11000.0, 'white'),
+    (11000.0, 25000.0, 'blue white'),
+    (25000.0, 100000.0, 'blue'),
+    (100000.0, None, 'white'),
+]
+
+# white dwarfs, brown dwarfs and subdwarfs are always tiny, everything else is sized by its color
+TINY_SPECTRAL_CLASSES = ('W', 'D', 'L', 'T', 's')
+
+STELLAR_MASS_DESCRIPTION_BY_COLOR = {
+    'orange red': 'very small',
+    'light orange': 'small',
+    'yellow': 'medium small',
+    'yellow white': 'medium',
+    'white': 'large',
+    'blue white': 'giant',
+    'blue': 'massive',
+}
+
+STELLAR_MASS_DESCRIPTION_UNKNOWN = 'unknown size'
+
+# ## Compiling the Rule Tables
+# Every ladder is turned into sorted bin edges plus the text for each bin. The bins are (-inf, e0], (e0, e1], ..., (en, inf), which lines up with the lower < value <= upper bands above, so np.searchsorted(edges, values, side='left') gives the bin of each value. For each bin we work out which band would have matched first in the original if/elif chain (None if no band matches).
+
+def compile_ladder(bands):
+    edges = sorted({bound for lower, upper, text in bands for bound in (lower, upper) if bound is not None})
+    edges = np.array(edges, dtype='float64')
+
+    # the upper edge of each bin lies inside that bin, so it decides which band the whole bin belongs to
+    probes = np.append(edges, np.inf)
+    labels = np.empty(len(probes), dtype=object)
+    for i, probe in enumerate(probes):
+        for lower, upper, text in bands:
+            if (lower is None or lower < probe) and (upper is None or probe <= upper):
+                labels[i] = text
+                break
+
+    # NaN fails every comparison in the original chains, so only a band with no bounds at all can describe it
+    nan_label = next((text for lower, upper, text in bands if lower is None and upper is None), None)
+
+    return edges, labels, nan_label
+
+def compile_ladders_by_category(ladders):
+    compiled = {}
+    for categories, bands in ladders.items():
+        ladder = compile_ladder(bands)
+        for category in categories:
+            compiled[category] = ladder
+    return compiled
+
+def apply_ladder(compiled, values):
+    edges, labels, nan_label = compiled
+    values = np.asarray(values, dtype='float64')
+    result = labels[np.searchsorted(edges, values, side='left')]
+    result[np.isnan(values)] = nan_label
+    return result
+
+def apply_ladders_by_category(compiled, categories, values):
+    categories = np.asarray(categories, dtype=object)
+    values = np.asarray(values, dtype='float64')
+    result = np.full(len(values), None, dtype=object)
+    for category, ladder in compiled.items():
+        rows = categories == category
+        if rows.any():
+            result[rows] = apply_ladder(ladder, values[rows])
+    return result
+
+def apply_mapping(mapping, keys):
+    mapped = pd.Series(keys, dtype=object).map(mapping)
+    return mapped.where(mapped.notna(), None).to_numpy(dtype=object)
+
+PLANET_MASS_DESCRIPTION_BY_MASS_COMPILED = compile_ladder(PLANET_MASS_DESCRIPTION_BY_MASS)
+PLANET_COLOR_BY_EQT_COMPILED = compile_ladders_by_category(PLANET_COLOR_BY_EQT)
+PLANET_COLOR_BY_MASS_COMPILED = compile_ladder(PLANET_COLOR_BY_MASS)
+PLANET_COLOR_SHORT_BY_EQT_COMPILED = compile_ladders_by_category(PLANET_COLOR_SHORT_BY_EQT)
+PLANET_COLOR_SHORT_BY_MASS_COMPILED = compile_ladder(PLANET_COLOR_SHORT_BY_MASS)
+PLANET_SPIN_BY_PERIOD_COMPILED = compile_ladders_by_category(PLANET_SPIN_BY_PERIOD)
+PLANET_SPIN_BY_MASS_COMPILED = compile_ladders_by_category(PLANET_SPIN_BY_MASS)
+PLANET_SPIN_SHORT_BY_PERIOD_COMPILED = compile_ladders_by_category(PLANET_SPIN_SHORT_BY_PERIOD)
+PLANET_SPIN_SHORT_BY_MASS_COMPILED = compile_ladders_by_category(PLANET_SPIN_SHORT_BY_MASS)
+STELLAR_COLOR_BY_TEFF_COMPILED = compile_ladder(STELLAR_COLOR_BY_TEFF)
+
+# the original functions wrote each matching row with dataset.at, so rows without a match kept whatever was already in the column (or NaN when the column was new)
+def assign_descriptor(dataset, column, values):
+    unmatched = pd.isna(values)
+    if unmatched.any():
+        previous = dataset[column].to_numpy(dtype=object) if column in dataset else np.full(len(dataset), np.nan, dtype=object)
+        values = np.where(unmatched, previous, values)
+    dataset[column] = values
+    return dataset
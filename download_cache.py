@@ -0,0 +1,156 @@
+### Download Cache
+# An on-disk cache for image_downloader, so a rerun does not download what an earlier run already has. The content of each download is stored once under its SHA-256 (objects/ab/abcdef...), and an index maps every URL to the hash of its content and the ETag and Last-Modified the server sent with it. Two URLs that serve the same bytes share one stored file.
+#
+# A cached URL is answered from disk without asking the server. With revalidate on, the server is asked whether the copy is still current (If-None-Match / If-Modified-Since): a 304 answer costs no download, a 200 replaces the copy.
+#
+# Every download is written to a .partial file, renamed into place and added to the index. The index is saved (the same .partial and rename) every SAVE_EVERY stores or SAVE_SECONDS seconds, whichever comes first, and by flush and close, which also save the last-used times of the files read since; a run that is interrupted keeps everything up to the last save, and the next run picks up from there. Writing the whole index after every download would cost O(N²) for N downloads and hold up every download thread while it is written.
+#
+# The stored files are capped at max_bytes: when a new download goes over the cap, the least recently used files are deleted, with the URLs that pointed to them.
+
+import atexit
+import hashlib
+import json
+import os
+import threading
+import time
+
+INDEX_VERSION = 1
+DEFAULT_CACHE_DIR = 'download_cache'
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+SAVE_EVERY = 100
+SAVE_SECONDS = 10
+
+class DownloadCache:
+    def __init__(self, folder=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES, revalidate=False):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self.revalidate = revalidate
+        self.index_path = os.path.join(folder, 'index.json')
+        self.lock = threading.Lock()
+        # only one thread writes index.json at a time, and without holding self.lock while it does
+        self.save_lock = threading.Lock()
+        self.urls = {}
+        self.objects = {}
+        self.total_bytes = 0
+        self.unsaved = 0
+        self.dirty = False
+        self.saved_at = time.monotonic()
+        self.load()
+        atexit.register(self.flush)
+
+    def load(self):
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path) as file:
+            saved = json.load(file)
+        if saved.get('version') != INDEX_VERSION:
+            return
+        # a file deleted by hand is dropped from the index instead of being served
+        self.objects = {digest: entry for digest, entry in saved['objects'].items() if os.path.exists(self.object_path(digest))}
+        self.urls = {url: entry for url, entry in saved['urls'].items() if entry['sha256'] in self.objects}
+        self.total_bytes = sum(entry['size'] for entry in self.objects.values())
+
+    # Writes the index if anything changed since it was last written. The index is serialized with the lock held, and written to disk after it is released.
+    def save(self):
+        with self.save_lock:
+            with self.lock:
+                if not self.dirty:
+                    return
+                data = json.dumps({'version': INDEX_VERSION, 'urls': self.urls, 'objects': self.objects})
+                self.dirty, self.unsaved, self.saved_at = False, 0, time.monotonic()
+            os.makedirs(self.folder, exist_ok=True)
+            partial_path = self.index_path + '.partial'
+            with open(partial_path, 'w') as file:
+                file.write(data)
+            os.replace(partial_path, self.index_path)
+
+    def object_path(self, digest):
+        return os.path.join(self.folder, 'objects', digest[:2], digest)
+
+    def size(self):
+        with self.lock:
+            return self.total_bytes
+
+    # The cached entry of a URL (its hash, ETag and Last-Modified), or None
+    def get(self, url):
+        with self.lock:
+            return self.urls.get(url)
+
+    def conditional_headers(self, entry):
+        headers = {}
+        if entry and entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry and entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    # The cached content of the entry, marked as just used. None when its file has gone missing.
+    def read(self, entry):
+        try:
+            with open(self.object_path(entry['sha256']), 'rb') as file:
+                content = file.read()
+        except FileNotFoundError:
+            return None
+        with self.lock:
+            if entry['sha256'] in self.objects:
+                self.objects[entry['sha256']]['last_used'] = time.time()
+                self.dirty = True
+        return content
+
+    def store(self, url, content, headers):
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # the thread id keeps two threads storing the same content from writing the same .partial file
+            partial_path = f'{path}.{threading.get_ident()}.partial'
+            with open(partial_path, 'wb') as file:
+                file.write(content)
+            os.replace(partial_path, path)
+
+        with self.lock:
+            if digest not in self.objects:
+                self.total_bytes += len(content)
+            self.objects[digest] = {'size': len(content), 'last_used': time.time()}
+            self.urls[url] = {'sha256': digest, 'etag': headers.get('ETag'), 'last_modified': headers.get('Last-Modified')}
+            self.evict(keep=digest)
+            self.dirty = True
+            self.unsaved += 1
+            due = self.unsaved >= SAVE_EVERY or time.monotonic() - self.saved_at >= SAVE_SECONDS
+        if due:
+            self.save()
+        return digest
+
+    # Called with the lock held. Deletes the least recently used files until the cache fits in max_bytes, never the one just stored.
+    def evict(self, keep=None):
+        if self.total_bytes <= self.max_bytes:
+            return
+        evicted = set()
+        for digest, entry in sorted(self.objects.items(), key=lambda item: item[1]['last_used']):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if digest == keep:
+                continue
+            self.total_bytes -= entry['size']
+            evicted.add(digest)
+            try:
+                os.remove(self.object_path(digest))
+            except FileNotFoundError:
+                pass
+        for digest in evicted:
+            del self.objects[digest]
+        self.urls = {url: entry for url, entry in self.urls.items() if entry['sha256'] not in evicted}
+
+    # Saves what changed since the index was last written: the downloads stored and the last-used times of the files read
+    def flush(self):
+        self.save()
+
+    def close(self):
+        self.flush()
+        atexit.unregister(self.flush)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
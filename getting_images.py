@@ -1,67 +1,84 @@
 import argparse
-import nasapy
+import json
 import os
-import matplotlib.pyplot as plt
-from skimage import io
-import pandas as pd
+
+import curate_images
+import download_cache
+import image_downloader
+import nasa_search
+
+QUERIES = {
+    'exoplanet': "exoplanet",
+    'planet_concept': "planet artist concept",
+    'planet_photographs': "planet photographs",
+}
+# The images picked by hand, one query at a time, before there was a curation manifest. They were picked by their position in the results, which has moved since, so they are kept here by nasa_id. They are the images of training_data_prompts.csv, which was made from the picks in the order they were made: the first 13 and the last 7 match the exoplanet and planet photographs lists of 13 and 7 positions, and the 46 images between them, counting PIA23690 that was picked for both queries, are the planet artist concept picks, whose list had 49 positions.
+LEGACY_KEPT_IDS = {
+    "exoplanet": [
+        "PIA22082", "PIA20690", "GSFC_20171208_Archive_e001417", "GSFC_20171208_Archive_e000132", "PIA23408", "PIA22069", "PIA22087", "PIA21473",
+        "PIA22098", "GSFC_20171208_Archive_e002172", "PIA22097", "PIA22192", "PIA23690",
+    ],
+    "planet artist concept": [
+        "PIA10969", "PIA08042", "PIA18926", "PIA12015", "PIA15629", "PIA18921", "PIA21430", "PIA13691", "PIA13994", "PIA09956", "PIA13776",
+        "PIA17999", "PIA19344", "PIA23690", "PIA19346", "PIA09118", "PIA17307", "PIA17002", "PIA10108", "PIA13351", "PIA18018", "PIA14883", "PIA18910",
+        "PIA17849", "PIA17003", "PIA17004", "PIA09117", "PIA09931", "PIA15257", "PIA09200", "PIA22088", "PIA21470", "PIA01938", "PIA09378",
+        "PIA14724", "PIA13054", "PIA08003", "PIA16693", "PIA06939", "PIA15623", "PIA16885", "PIA10118", "PIA14870", "PIA15606", "PIA21472",
+        "PIA21468",
+    ],
+    "planet photographs": [
+        "PIA00046", "PIA00050", "PIA00371", "PIA18033", "PIA21837", "GSFC_20171208_Archive_e000795", "PIA00057",
+    ],
+}
 
 def setup_argparse():
     parser = argparse.ArgumentParser(description="NASA Image and Video Library Dataset")
-    parser.add_argument("-k", "--api-key", required=True, help="NASA API key")
+    parser.add_argument("-k", "--api-key", default=None, help="NASA API key (not needed: the image library search does not take one)")
     parser.add_argument("--exoplanet", action="store_true", help="Get and save exoplanet images")
     parser.add_argument("--planet-concept", action="store_true", help="Get and save planet artist concept images")
     parser.add_argument("--planet-photographs", action="store_true", help="Get and save planet photographs images")
+    parser.add_argument("--max-pages", type=int, default=nasa_search.DEFAULT_MAX_PAGES, help="Most pages of results fetched per query")
+    parser.add_argument("--api-url", default=nasa_search.DEFAULT_API_URL, help="Base URL of the images API")
+    parser.add_argument("--cache-dir", default=nasa_search.DEFAULT_CACHE_DIR, help="Folder of the cached search responses")
+    parser.add_argument("--ttl-hours", type=float, default=nasa_search.DEFAULT_TTL / 3600, help="Hours a cached search response is used before it is requested again")
+    parser.add_argument("--offline", action="store_true", help="Only use the cached search responses and make no API calls")
+    parser.add_argument("--workers", type=int, default=image_downloader.DEFAULT_WORKERS, help="Number of thumbnails downloaded at the same time")
+    parser.add_argument("--download-cache-dir", default=download_cache.DEFAULT_CACHE_DIR, help="Folder of the download cache the thumbnails go through")
+    parser.add_argument("--curation-folder", default=curate_images.DEFAULT_FOLDER, help="Folder of the contact sheets, one subfolder per query")
+    parser.add_argument("--manifest", default=curate_images.DEFAULT_MANIFEST, help="JSON file of the kept and left out images, keyed by nasa_id")
+    parser.add_argument("--output", default="kept_images.json", help="JSON file the search results of the kept images are written to")
     return parser
 
-def get_images(database_name):
-    for i, image in enumerate(database_name):
-        link_data = image['links']
-
-        for url in link_data:
-            image_url = url['href']
-            image_to_show = io.imread(image_url)
-            plt.imshow(image_to_show)
-            plt.xlabel(i)
-            plt.show()
-
-def save_keep_images(database_name, keep_indexes):
-    keep_images = []
-    for i, image in enumerate(database_name):
-        if i in keep_indexes:
-            keep_images.append(database_name[i])
-    return keep_images
-
 def main():
     parser = setup_argparse()
     args = parser.parse_args()
 
-    api_key = args.api_key
-    nasa = nasapy.Nasa(key=api_key)
+    # the selected queries are searched together, every page at the same time, through the response cache
+    queries = [query for name, query in QUERIES.items() if getattr(args, name)]
+    cache = nasa_search.ResponseCache(args.cache_dir, args.ttl_hours * 3600, args.offline)
+    results = nasa_search.search_all(queries, args.max_pages, api_url=args.api_url, cache=cache)
+    print(f"{len(results.items)} distinct images, {results.api_calls} API calls, {results.cached_pages} pages from the cache")
 
-    if args.exoplanet:
-        exoplanet_images = nasa.media_search(query="exoplanet", media_type="image")
-        exoplanet_data = exoplanet_images['items']
-        get_images(exoplanet_data)
+    # the images picked by hand before the manifest are kept, unless a choice has been made for them since; the others are left for curation
+    manifest = curate_images.load_manifest(args.manifest)
+    for query in queries:
+        curate_images.record_kept(manifest, query, LEGACY_KEPT_IDS.get(query, []), results.items)
+    curate_images.update_items(manifest, results.items)
+    curate_images.save_manifest(manifest, args.manifest)
 
-        keep_indexes = [0, 35, 36, 37, 38, 39, 41, 42, 45, 46, 54, 55, 65]
-        save_keep_images(exoplanet_data, keep_indexes)
+    # numbered contact sheets of every result, to pick from with curate_images.py select
+    thumbnails, failures = curate_images.fetch_thumbnails(results.items, args.workers, download_cache.DownloadCache(args.download_cache_dir))
+    for query in queries:
+        items = {nasa_id: results.items[nasa_id] for nasa_id in results.queries[query]}
+        sheets, page = curate_images.write_query_sheets(query, items, thumbnails, args.curation_folder, manifest)
+        print(f"{query}: {len(curate_images.kept_ids(manifest, query))} kept, {len(sheets)} contact sheets in {os.path.dirname(page)}")
+    if failures:
+        print(f"{len(failures)} thumbnails could not be downloaded")
 
-    if args.planet_concept:
-        planet_images = nasa.media_search(query="planet artist concept", media_type="image")
-        planet_data = planet_images["items"]
-        get_images(planet_data)
-
-        keep_indexes = [0, 1, 3, 4, 6, 7, 9, 10, 11, 12, 13, 14, 15, 18, 19, 20, 21, 25, 26, 35, 43, 45, 46, 47, 48, 51, 52, 53, 54, 55, 57, 59, 62, 69, 70, 71, 72, 73, 74, 76, 77, 80, 83, 84, 85, 86, 87, 92, 96]
-        save_keep_images(planet_data, keep_indexes)
-
-    if args.planet_photographs:
-        planet_photos = nasa.media_search(query="planet photographs", media_type="image")
-        planet_photo_data = planet_photos["items"]
-        get_images(planet_photo_data)
-
-        keep_indexes = [4, 6, 14, 29, 77, 80, 87]
-        save_keep_images(planet_photo_data, keep_indexes)
+    # Save the kept images' search results
+    kept = [manifest[nasa_id]['item'] for nasa_id in curate_images.kept_ids(manifest) if any(manifest[nasa_id]['queries'].get(query) for query in queries)]
+    with open(args.output, 'w') as file:
+        json.dump(kept, file)
+    print(f"{len(kept)} kept images written to {args.output}")
 
 if __name__ == "__main__":
     main()
-
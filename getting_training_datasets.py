@@ -1,59 +1,216 @@
 import pandas as pd
-import os
 from PIL import Image
-import requests
-from io import BytesIO
+import os
 import json
+import time
 import argparse
+from contextlib import nullcontext
+
+import aspect_buckets
+import dataset_shards
+import download_cache
+import image_array_store
+import image_downloader
+import image_processing
+import instrumentation
+import metadata_writer
+
+TAGS = "solo, no humans, space, starry night"
+REQUIRED_COLUMNS = ['image_link', 'mass_prompt', 'ratio_prompt', 'size_text_prompt', '75_tokens']
+# carried along when the input has them (training_data_prompts.csv as shipped has no shorter_prompt)
+OPTIONAL_COLUMNS = ['shorter_prompt']
+# the columns stored with each image in the shards, next to its caption and tags, when the input has them
+SAMPLE_COLUMNS = ['image_link', 'mass_prompt', 'ratio_prompt', 'size_text_prompt', 'shorter_prompt']
+
+def no_stage(name, rows=None):
+    return nullcontext({})
 
 def main(args):
+    # --profile-report times each step of the download loop, stage is a no-op without it
+    profiler = instrumentation.Profiler(args.trace_allocations, args.profile_stage, args.profile_output) if args.profile_report else None
+    stage = profiler.stage if profiler else no_stage
+
     # Read in the dataset
     dataset = pd.read_csv(args.input_csv)
 
-    training_data = dataset[['image_link', 'mass_prompt', 'ratio_prompt', 'size_text_prompt', 'shorter_prompt', '75_tokens']]
+    missing = [column for column in REQUIRED_COLUMNS if column not in dataset.columns]
+    if missing:
+        raise SystemExit(f"{args.input_csv} is missing the columns {', '.join(missing)}")
+    training_data = dataset[REQUIRED_COLUMNS[:-1] + [column for column in OPTIONAL_COLUMNS if column in dataset.columns] + REQUIRED_COLUMNS[-1:]]
+    sample_columns = [column for column in SAMPLE_COLUMNS if column in training_data.columns]
 
     data_folder = args.data_folder
-    os.makedirs(data_folder, exist_ok=True)
+    # with --shards the images are written into tar shards instead of data_folder
+    shard_writer = dataset_shards.ShardWriter(args.shards, int(args.shard_max_mb * 1024 ** 2)) if args.shards else None
+    if not shard_writer:
+        os.makedirs(data_folder, exist_ok=True)
 
-    for index, data in training_data.iterrows():
-        image_url = data['image_link']
+    # The images are downloaded concurrently over a shared connection pool, and decoded, resized and saved by a pool of processes as they arrive. An image used by several rows is downloaded and resized once.
+    rows_by_url = {}
+    for index, url in training_data['image_link'].items():
+        rows_by_url.setdefault(url, []).append(index)
+    urls = list(rows_by_url)
+    cache = None if args.no_cache else download_cache.DownloadCache(args.cache_dir, int(args.cache_max_mb * 1024 ** 2), args.revalidate)
 
-        # Getting the Image and opening it using PIL
-        response = requests.get(image_url)
-        img = Image.open(BytesIO(response.content))
+    # with --buckets each image is resized and cropped to the aspect-ratio bucket nearest its own shape, read from its header, instead of stretched to 512x512
+    buckets = (args.bucket_resolutions or aspect_buckets.make_buckets(args.bucket_pixels)) if args.buckets else None
+    bucket_of = {}
+    manifest = []
 
-        # Resize the image to 512x512
-        img_resized = img.resize((512, 512))
+    training_data = training_data.assign(image_path=None)
+    failures = []
+    sources = {}
+    downloaded = {}
+    throughput = {'download': [0, 0.0], 'decode': [0, 0.0], 'resize': [0, 0.0], 'save': [0, 0.0]}
+    if shard_writer:
+        throughput['shard'] = [0, 0.0]
 
-        # Save the resized image to the 'data' folder
-        image_path = os.path.join(data_folder, f'image_{index + 1}.jpg')
-        img_resized.save(image_path)
+    def add_stage(name, seconds, images=1):
+        throughput[name][0] += images
+        throughput[name][1] += seconds
+        if profiler:
+            # the downloads and the image processing run on other threads and processes, so their times are added up from the results
+            profiler.add(name, seconds, images, 0, None)
 
-        # Update the dataset with the image path
-        training_data.at[index, 'image_path'] = image_path
+    def images_to_process(downloads):
+        for position, result in downloads:
+            add_stage('download', result.seconds)
+            if result.error:
+                failures.append(result)
+                continue
+            sources[result.source] = sources.get(result.source, 0) + 1
+            downloaded[result.url] = result._replace(content=None)
+            paths = None if shard_writer else [os.path.join(data_folder, f'image_{index + 1}.jpg') for index in rows_by_url[result.url]]
+            size = image_processing.IMAGE_SIZE
+            if buckets:
+                try:
+                    source_size = aspect_buckets.header_size(result.content)
+                except (OSError, ValueError, Image.DecompressionBombError) as error:
+                    failures.append(result._replace(content=None, error=f'not an image: {error}'))
+                    continue
+                size = aspect_buckets.nearest_bucket(*source_size, buckets)
+                bucket_of[result.url] = size
+            yield result.url, result.content, paths, size
 
-    # Save the updated DataFrame with image paths
-    training_data.to_csv(args.output_csv, index=False)
+    def caption_record(index, columns=()):
+        values = training_data.loc[index, ['75_tokens', *columns]]
+        return {'tags': TAGS, **values.where(values.notna(), None).rename({'75_tokens': 'caption'}).to_dict()}
 
-    updated_training_data = pd.read_csv(args.output_csv)
+    # the caption and tags of each image are written as soon as it is saved, to files that only replace the old ones once the run is through
+    metadata_jsonl = args.metadata_jsonl or os.path.join(data_folder, 'metadata.jsonl')
+    metadata = nullcontext() if shard_writer else metadata_writer.MetadataWriter(metadata_jsonl, None if args.no_metadata_json else args.metadata_json)
 
-    metadata_dict = {}
+    start = time.perf_counter()
+    with stage('download_and_resize', len(training_data)), metadata:
+        downloads = image_downloader.download_all(urls, workers=args.workers, per_host=args.per_host, timeout=(args.connect_timeout, args.read_timeout),
+                                                  retries=args.retries, backoff=args.backoff, cache=cache)
+        processed = image_processing.process_all(images_to_process(downloads), workers=args.process_workers, queue_size=args.queue_size,
+                                                 batch_size=args.bucket_batch_size if buckets else 1,
+                                                 resample=args.resample, quality=args.quality, fit='crop' if buckets else 'stretch')
+        for result in processed:
+            if result.error:
+                failures.append(downloaded[result.key]._replace(error=result.error))
+                continue
+            add_stage('decode', result.decode_seconds)
+            add_stage('resize', result.resize_seconds)
+            add_stage('save', result.save_seconds, len(result.paths or rows_by_url[result.key]))
+            if buckets:
+                bucket = bucket_of[result.key]
+                for index in rows_by_url[result.key]:
+                    training_data.at[index, 'bucket'] = aspect_buckets.bucket_name(bucket)
+                    manifest.append({'file_name': f'image_{index + 1}.jpg', 'bucket': aspect_buckets.bucket_name(bucket), 'width': bucket.width, 'height': bucket.height,
+                                     'source_width': result.source_size[0], 'source_height': result.source_size[1]})
+
+            if shard_writer:
+                # every row is a sample of its own: the image and a JSON record with its caption, tags and prompts
+                shard_start = time.perf_counter()
+                for index in rows_by_url[result.key]:
+                    key = f'image_{index + 1}'
+                    shard_writer.write(key, {'jpg': result.data, 'json': json.dumps(caption_record(index, sample_columns)).encode()})
+                    training_data.at[index, 'image_path'] = f'{key}.jpg'
+                    training_data.at[index, 'shard'] = dataset_shards.SHARD_NAME.format(shard_writer.shard_number)
+                add_stage('shard', time.perf_counter() - shard_start, len(rows_by_url[result.key]))
+                continue
+
+            # Update the dataset with the image paths and write their metadata
+            for index, image_path in zip(rows_by_url[result.key], result.paths):
+                training_data.at[index, 'image_path'] = image_path
+                metadata.write(os.path.splitext(os.path.basename(image_path))[0], os.path.relpath(image_path, os.path.dirname(metadata_jsonl) or '.'), caption_record(index))
+
+    if shard_writer:
+        shard_writer.close()
+    print(f"{len(urls)} distinct images: {sources.get('network', 0)} downloaded, {sources.get('cache', 0)} from the cache, {sources.get('revalidated', 0)} revalidated")
+    image_processing.print_throughput(throughput, throughput['resize'][0], time.perf_counter() - start)
+
+    # Images that could not be downloaded are reported and left out of the outputs
+    if failures:
+        image_downloader.write_failure_report(failures, args.failure_report)
+        print(f"{len(failures)} of {len(urls)} distinct images could not be downloaded, see {args.failure_report}")
+        training_data = training_data.dropna(subset=['image_path'])
+
+    if buckets:
+        bucket_manifest = args.bucket_manifest or os.path.join(args.shards or data_folder, aspect_buckets.DEFAULT_MANIFEST)
+        aspect_buckets.write_manifest(manifest, bucket_manifest)
+        aspect_buckets.print_bucket_counts(manifest)
+        print(f"bucket of {len(manifest)} images written to {bucket_manifest}")
+
+    # Save the updated DataFrame with image paths
+    training_data.to_csv(args.output_csv, index=False)
 
-    for index, data in updated_training_data.iterrows():
-        image_path = data['image_path'].split("/")[1].split(".")[0]
-        metadata = {"tags": "solo, no humans, space, starry night",
-                    "caption": data["75_tokens"]}
+    if shard_writer:
+        # the caption and tags of every image are in its shard, next to it
+        print(f"{len(training_data)} samples written to {shard_writer.shard_number + 1} shards in {args.shards}")
+    else:
+        print(f"metadata of {metadata.records} images written to {' and '.join(metadata.paths)}")
 
-        metadata_dict[image_path] = metadata
+    # the images are decoded once more into one array, which training epochs can read without decoding
+    if args.array_store:
+        with stage('export_array', metadata.records):
+            count = image_array_store.export_images(image_array_store.read_metadata(metadata_jsonl), os.path.dirname(metadata_jsonl) or '.', args.array_store, args.array_shuffle_seed)
+        print(f"{count} decoded images written to {args.array_store}, with their captions in {image_array_store.index_path(args.array_store)}")
 
-    with open(args.metadata_json, "w") as json_file:
-        json.dump(metadata_dict, json_file)
+    if profiler:
+        instrumentation.print_report(profiler.write_report(args.profile_report))
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Prepare Datasets for Training")
     parser.add_argument("--input-csv", type=str, default="training_data_prompts.csv", help="Input CSV file")
     parser.add_argument("--output-csv", type=str, default="updated_training_data_prompts.csv", help="Output CSV file")
     parser.add_argument("--data-folder", type=str, default="data_huggingface", help="Folder for resized images")
-    parser.add_argument("--metadata-json", type=str, default="metadata.json", help="Metadata JSON file")
+    parser.add_argument("--metadata-jsonl", type=str, default=None, help="Metadata JSONL file, one line per image (default: metadata.jsonl in --data-folder)")
+    parser.add_argument("--metadata-json", type=str, default="metadata.json", help="Metadata JSON file, a dict of every image's caption and tags")
+    parser.add_argument("--no-metadata-json", action="store_true", help="Only write the JSONL metadata, not the JSON dict")
+    parser.add_argument("--shards", type=str, default=None, help="Write the images with their captions into tar shards in this folder (WebDataset layout, with an index.csv) instead of one file per image in --data-folder")
+    parser.add_argument("--shard-max-mb", type=float, default=dataset_shards.DEFAULT_SHARD_BYTES / 1024 ** 2, help="Size a shard is kept under")
+    parser.add_argument("--array-store", type=str, default=None, help="Also write every resized image, decoded, into one memory-mapped .npy array (N x 512 x 512 x 3) with a caption index next to it")
+    parser.add_argument("--array-shuffle-seed", type=int, default=None, help="Store the images in the array in a random order made from this seed")
+    parser.add_argument("--workers", type=int, default=image_downloader.DEFAULT_WORKERS, help="Number of images downloaded at the same time")
+    parser.add_argument("--per-host", type=int, default=image_downloader.DEFAULT_PER_HOST, help="Most downloads from the same host at the same time")
+    parser.add_argument("--connect-timeout", type=float, default=image_downloader.DEFAULT_TIMEOUT[0], help="Seconds to wait for a connection")
+    parser.add_argument("--read-timeout", type=float, default=image_downloader.DEFAULT_TIMEOUT[1], help="Seconds to wait for data from a connected server")
+    parser.add_argument("--retries", type=int, default=image_downloader.DEFAULT_RETRIES, help="Times a failed download is retried (for timeouts, dropped connections, 429 and 5xx)")
+    parser.add_argument("--backoff", type=float, default=image_downloader.DEFAULT_BACKOFF, help="Seconds before the first retry, doubled for every retry after it")
+    parser.add_argument("--cache-dir", type=str, default=download_cache.DEFAULT_CACHE_DIR, help="Folder of the download cache, so a rerun only downloads images it does not have yet")
+    parser.add_argument("--cache-max-mb", type=float, default=download_cache.DEFAULT_MAX_BYTES / 1024 ** 2, help="Size the download cache is kept under, the least recently used images are removed first")
+    parser.add_argument("--revalidate", action="store_true", help="Ask the server whether each cached image is still current (ETag / Last-Modified) instead of using it as it is")
+    parser.add_argument("--no-cache", action="store_true", help="Download every image, without reading or filling the cache")
+    parser.add_argument("--failure-report", type=str, default="download_failures.csv", help="CSV file listing the images that could not be downloaded")
+    parser.add_argument("--process-workers", type=int, default=None, help="Number of processes decoding and resizing the images (default: one per CPU, 0 to do it in the main process)")
+    parser.add_argument("--queue-size", type=int, default=image_processing.DEFAULT_QUEUE_SIZE, help="Most downloaded images waiting to be processed, the downloads wait when it is reached")
+    parser.add_argument("--resample", choices=list(image_processing.RESAMPLING_FILTERS), default=image_processing.DEFAULT_RESAMPLE, help="Resampling filter used to resize the images to 512x512")
+    parser.add_argument("--buckets", action="store_true", help="Resize each image to the aspect-ratio bucket nearest its shape, cropping what does not fit, instead of stretching it to 512x512, and write a bucket manifest")
+    parser.add_argument("--bucket-resolutions", type=aspect_buckets.parse_bucket, nargs="+", default=None, help="With --buckets, the bucket sizes as WIDTHxHEIGHT (default: every multiple of 64 within --bucket-pixels)")
+    parser.add_argument("--bucket-pixels", type=int, default=aspect_buckets.DEFAULT_PIXEL_BUDGET, help="With --buckets, the pixels of a bucket when the buckets are generated")
+    parser.add_argument("--bucket-batch-size", type=int, default=aspect_buckets.DEFAULT_BATCH_SIZE, help="With --buckets, images of the same bucket resized together by one process")
+    parser.add_argument("--bucket-manifest", type=str, default=None, help="With --buckets, the CSV listing the bucket of every image (default: bucket_manifest.csv in --data-folder or --shards)")
+    parser.add_argument("--quality", type=int, default=image_processing.DEFAULT_QUALITY, help="JPEG quality of the saved images (1 to 95)")
+    parser.add_argument("--profile-report", type=str, default=None, help="Write the time, images/s and memory of each step of the download loop to this JSON file")
+    parser.add_argument("--profile-stage", type=str, default=None, help="With --profile-report, also run this step under cProfile (the download, decode, resize and save steps run on other threads and processes, so only download_and_resize can be profiled)")
+    parser.add_argument("--profile-output", type=str, default=None, help="Where to dump the cProfile stats of --profile-stage (default <stage>.prof)")
+    parser.add_argument("--trace-allocations", action="store_true", help="With --profile-report, also record the bytes allocated by each step (slower)")
     args = parser.parse_args()
+    if args.shards and args.array_store:
+        parser.error("--array-store is written from the image files, it cannot be combined with --shards")
+    if args.buckets and args.array_store:
+        parser.error("--array-store holds images of one size, it cannot be combined with --buckets")
     main(args)
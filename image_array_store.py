@@ -0,0 +1,152 @@
+### Image Array Store
+# Keeps every resized training image decoded, in one uint8 array of shape N x 512 x 512 x 3 saved as a .npy file, so a training epoch reads pixels straight from the page cache instead of decoding N JPEGs again. The JPEGs are decoded once, by the export, and a JSONL index next to the array (images.npy -> images.captions.jsonl) holds the key, file name, caption and tags of each row in the same order.
+#
+# The array is opened memory-mapped: nothing is read until a batch is touched, and a batch of consecutive rows is a view into the mapping, with no copy. batches() hands out such views in order, or in a random order of whole batch-sized blocks for each epoch (the rows can be shuffled once at export time with shuffle_seed, so the blocks do not always hold the same neighbours). A fully random permutation cannot be a view of the file; shuffle='exact' gathers each batch into one reused buffer instead, which is one memory copy per image and still no decoding.
+#
+# Both files are written to .partial files and renamed when complete.
+#
+# Run from the repository root:
+#   python image_array_store.py export --data-folder data_huggingface --store images.npy
+#   python image_array_store.py epoch --store images.npy --batch-size 32
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+import image_processing
+
+DEFAULT_STORE_PATH = 'images.npy'
+DEFAULT_BATCH_SIZE = 32
+# Pillow releases the GIL while decoding, so threads decode in parallel
+DEFAULT_DECODE_THREADS = os.cpu_count()
+
+def setup_argparse():
+    parser = argparse.ArgumentParser(description="Decoded image array for fast training epochs")
+    parser.add_argument("--store", default=DEFAULT_STORE_PATH, help="Path to the .npy image array (its caption index is written next to it)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    export = commands.add_parser("export", help="Decode the images listed in a metadata.jsonl into the array")
+    export.add_argument("--data-folder", default="data_huggingface", help="Folder of the resized images")
+    export.add_argument("--metadata-jsonl", default=None, help="Metadata of the images (default: metadata.jsonl in --data-folder)")
+    export.add_argument("--shuffle-seed", type=int, default=None, help="Store the images in a random order made from this seed")
+
+    epoch = commands.add_parser("epoch", help="Time one epoch read from the array against decoding the JPEGs")
+    epoch.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Images per batch")
+    epoch.add_argument("--shuffle", choices=["none", "blocks", "exact"], default="blocks", help="Batch order: in order, shuffled blocks (zero-copy) or a full permutation (copied)")
+    epoch.add_argument("--data-folder", default=None, help="Also time decoding the JPEGs of this folder, for comparison")
+    return parser
+
+def index_path(store_path):
+    return os.path.splitext(store_path)[0] + '.captions.jsonl'
+
+def read_metadata(metadata_jsonl):
+    with open(metadata_jsonl) as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+def decode(path, size=image_processing.IMAGE_SIZE):
+    with Image.open(path) as img:
+        img.draft('RGB', size)
+        img = image_processing.to_rgb(img)
+        if img.size != size:
+            img = img.resize(size, image_processing.RESAMPLING_FILTERS[image_processing.DEFAULT_RESAMPLE])
+        return np.asarray(img)
+
+# Decodes the images of the records (dicts with a file_name relative to folder) into a new array at store_path, and writes the caption index next to it
+def export_images(records, folder, store_path=DEFAULT_STORE_PATH, shuffle_seed=None, threads=DEFAULT_DECODE_THREADS):
+    if shuffle_seed is not None:
+        records = [records[i] for i in np.random.default_rng(shuffle_seed).permutation(len(records))]
+    height, width = image_processing.IMAGE_SIZE[1], image_processing.IMAGE_SIZE[0]
+
+    partial_path = store_path + '.partial'
+    images = np.lib.format.open_memmap(partial_path, mode='w+', dtype=np.uint8, shape=(len(records), height, width, 3))
+
+    def decode_into(row):
+        images[row] = decode(os.path.join(folder, records[row]['file_name']))
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        # list() raises the first decoding error, if there is one
+        list(executor.map(decode_into, range(len(records))))
+    images.flush()
+    del images
+
+    partial_index = index_path(store_path) + '.partial'
+    with open(partial_index, 'w') as file:
+        for row, record in enumerate(records):
+            key = record.get('key', os.path.splitext(os.path.basename(record['file_name']))[0])
+            file.write(json.dumps({**record, 'row': row, 'key': key}) + '\n')
+    os.replace(partial_path, store_path)
+    os.replace(partial_index, index_path(store_path))
+    return len(records)
+
+class ImageArrayStore:
+    def __init__(self, store_path=DEFAULT_STORE_PATH):
+        self.images = np.load(store_path, mmap_mode='r')
+        self.records = read_metadata(index_path(store_path))
+        if len(self.records) != len(self.images):
+            raise ValueError(f"{store_path} holds {len(self.images)} images but its index lists {len(self.records)}")
+        self.rows = {record['key']: record['row'] for record in self.records}
+
+    def __len__(self):
+        return len(self.images)
+
+    # The rows start to stop as a read-only view of the file, and their records
+    def batch(self, start, stop):
+        return self.images[start:stop], self.records[start:stop]
+
+    def image(self, key):
+        return self.images[self.rows[key]]
+
+    # Yields (images, records) batches for one epoch. shuffle='blocks' visits the batch-sized blocks in a random order and every batch is a view; shuffle='exact' draws a full permutation and copies each batch into a buffer that is reused, so a batch is only valid until the next one is asked for.
+    def batches(self, batch_size=DEFAULT_BATCH_SIZE, shuffle='none', seed=None):
+        rng = np.random.default_rng(seed)
+        starts = np.arange(0, len(self), batch_size)
+        if shuffle == 'blocks':
+            starts = rng.permutation(starts)
+        if shuffle != 'exact':
+            for start in starts:
+                yield self.batch(start, start + batch_size)
+            return
+
+        order = rng.permutation(len(self))
+        buffer = np.empty((batch_size,) + self.images.shape[1:], dtype=self.images.dtype)
+        for start in starts:
+            # reading the rows in file order keeps the reads as sequential as a random batch allows
+            rows = np.sort(order[start:start + batch_size])
+            images = buffer[:len(rows)]
+            np.take(self.images, rows, axis=0, out=images)
+            yield images, [self.records[row] for row in rows]
+
+def main():
+    parser = setup_argparse()
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.command == 'export':
+        metadata_jsonl = args.metadata_jsonl or os.path.join(args.data_folder, 'metadata.jsonl')
+        records = read_metadata(metadata_jsonl)
+        count = export_images(records, os.path.dirname(metadata_jsonl) or '.', args.store, args.shuffle_seed)
+        print(f"{count} images written to {args.store} ({os.path.getsize(args.store) / 1e6:.0f} MB) in {time.perf_counter() - start:.1f} s")
+        return
+
+    store = ImageArrayStore(args.store)
+    checksum = 0
+    for images, records in store.batches(args.batch_size, args.shuffle):
+        # touch every pixel, like a training step would
+        checksum += int(images.sum(dtype=np.uint64))
+    elapsed = time.perf_counter() - start
+    print(f"{'array (' + args.shuffle + ')':<20}{len(store):>8} images {elapsed:>8.2f} s {len(store) / elapsed:>10.0f} images/s")
+
+    if args.data_folder:
+        start = time.perf_counter()
+        for record in store.records:
+            decode(os.path.join(args.data_folder, record['file_name'])).sum(dtype=np.uint64)
+        elapsed = time.perf_counter() - start
+        print(f"{'JPEG decode':<20}{len(store):>8} images {elapsed:>8.2f} s {len(store) / elapsed:>10.0f} images/s")
+
+if __name__ == "__main__":
+    main()
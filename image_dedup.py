@@ -0,0 +1,229 @@
+### Image Dedup
+# Finds the training images that are the same artwork at another size, crop or compression, so each one is downloaded and trained on once. Every distinct image_link is fetched through the download cache (nothing is downloaded twice, and getting_training_datasets reuses what this stage fetched) and given three 64-bit perceptual hashes, computed with NumPy for a whole batch of images at a time:
+#
+#   aHash  each pixel of an 8x8 greyscale thumbnail against the thumbnail's mean
+#   dHash  each pixel of a 9x8 thumbnail against its right-hand neighbour
+#   pHash  the signs of the lowest 8x8 frequencies of the DCT of a 32x32 thumbnail, against their median
+#
+# Two images are near-duplicates when the Hamming distance between their hashes (of the --hash chosen, pHash by default) is at most --max-distance. The pairs are found through a multi-index hash (HammingIndex), which only compares the hashes that share a chunk of bits with the query instead of every pair, and near-duplicates are joined into groups (if A is near B and B near C, they are one group). Each group keeps its largest image.
+#
+# The report lists every image with its hashes, group and distance to the image its group kept. The filtered dataset is the input CSV without the rows of the images that were dropped, and (with --keep-rows first, the default) with a single row per kept image.
+#
+# Run from the repository root:
+#   python image_dedup.py --input-csv training_data_prompts.csv --output-csv training_data_deduplicated.csv --report dedup_report.csv
+
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+from PIL import Image
+
+import download_cache
+import image_downloader
+
+HASHES = ['ahash', 'dhash', 'phash']
+DEFAULT_HASH = 'phash'
+# of 64 bits; resized or recompressed copies typically differ in a handful of bits, unrelated images in about half of them
+DEFAULT_MAX_DISTANCE = 8
+DEFAULT_BATCH_SIZE = 256
+THUMBNAIL_SIZE = 32
+
+def setup_argparse():
+    parser = argparse.ArgumentParser(description="Find near-duplicate training images with perceptual hashes")
+    parser.add_argument("--input-csv", default="training_data_prompts.csv", help="Dataset with an image_link column")
+    parser.add_argument("--output-csv", default="training_data_deduplicated.csv", help="Where to write the dataset without the duplicates")
+    parser.add_argument("--report", default="dedup_report.csv", help="Where to write the hashes and groups of every image")
+    parser.add_argument("--hash", choices=HASHES, default=DEFAULT_HASH, help="Hash compared to find near-duplicates")
+    parser.add_argument("--max-distance", type=int, default=DEFAULT_MAX_DISTANCE, help="Most differing bits (of 64) between near-duplicates")
+    parser.add_argument("--keep-rows", choices=["first", "all"], default="first", help="Keep only the first row of each kept image, or every row that uses it")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Images hashed together")
+    parser.add_argument("--workers", type=int, default=image_downloader.DEFAULT_WORKERS, help="Number of images downloaded at the same time")
+    parser.add_argument("--cache-dir", default=download_cache.DEFAULT_CACHE_DIR, help="Folder of the download cache shared with getting_training_datasets")
+    return parser
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+# set bits of every byte value
+POPCOUNT = np.array([bin(value).count('1') for value in range(256)], dtype=np.uint8)
+
+def hamming_many(value, values):
+    return POPCOUNT[(values ^ np.uint64(value)).view(np.uint8).reshape(-1, 8)].sum(axis=1)
+
+# Multi-index hashing: the 64 bits are cut into chunks, and two hashes within max_distance bits of each other have at least one chunk within max_distance // chunks bits of each other (if every chunk differed in more, the whole would too). A search only compares the hashes that share a bucket with one of the query's chunks, or with a chunk one bit flip away, instead of every hash.
+class HammingIndex:
+    def __init__(self, values, max_distance=DEFAULT_MAX_DISTANCE):
+        self.values = np.asarray(values, dtype=np.uint64)
+        self.max_distance = max_distance
+        # chunks searched within one bit flip keep them wide (13 bits for a distance of 8), so few hashes share a bucket by chance
+        chunks = max_distance // 2 + 1
+        self.chunk_radius = max_distance // chunks
+        edges = np.linspace(0, 64, chunks + 1).astype(int)
+        self.chunks = list(zip(edges[:-1], edges[1:]))
+        self.buckets = []
+        for low, high in self.chunks:
+            keys = chunk_of(self.values, low, high)
+            order = np.argsort(keys, kind='stable')
+            unique, starts = np.unique(keys[order], return_index=True)
+            self.buckets.append(dict(zip(unique.tolist(), np.split(order, starts[1:]))))
+
+    # the chunk keys within chunk_radius bit flips of key
+    def probes(self, key, bits):
+        keys = {key}
+        for _ in range(self.chunk_radius):
+            keys |= {probe ^ (1 << bit) for probe in keys for bit in range(bits)}
+        return keys
+
+    # The distances and positions of every indexed hash within max_distance of value
+    def search(self, value):
+        candidates = []
+        for (low, high), buckets in zip(self.chunks, self.buckets):
+            key = int(chunk_of(np.uint64(value), low, high))
+            candidates.extend(buckets[probe] for probe in self.probes(key, high - low) if probe in buckets)
+        if not candidates:
+            return np.empty(0, dtype=np.uint64), np.empty(0, dtype=np.int64)
+        positions = np.unique(np.concatenate(candidates))
+        distances = hamming_many(value, self.values[positions])
+        close = distances <= self.max_distance
+        return distances[close], positions[close]
+
+def chunk_of(values, low, high):
+    return (values >> np.uint64(low)) & np.uint64((1 << (high - low)) - 1)
+
+# The greyscale 32x32, 8x8 and 9x8 thumbnails of one image, and its size
+def thumbnails(content):
+    with Image.open(BytesIO(content)) as img:
+        size = img.size
+        # a JPEG is decoded straight at (close to) thumbnail size
+        img.draft('L', (THUMBNAIL_SIZE, THUMBNAIL_SIZE))
+        img = img.convert('L')
+        return (np.asarray(img.resize((THUMBNAIL_SIZE, THUMBNAIL_SIZE), Image.Resampling.LANCZOS), dtype=np.float32),
+                np.asarray(img.resize((8, 8), Image.Resampling.LANCZOS), dtype=np.float32),
+                np.asarray(img.resize((9, 8), Image.Resampling.LANCZOS), dtype=np.float32),
+                size)
+
+def dct_matrix(n):
+    k = np.arange(n)[:, None]
+    matrix = np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n)) * np.sqrt(2 / n)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+DCT_32 = dct_matrix(THUMBNAIL_SIZE)
+
+# N x 64 booleans to N 64-bit integers
+def pack_bits(bits):
+    return [int.from_bytes(row.tobytes(), 'big') for row in np.packbits(bits.reshape(len(bits), 64), axis=1)]
+
+# The three hashes of a batch: large (N x 32 x 32), small (N x 8 x 8) and wide (N x 8 x 9) thumbnails
+def batch_hashes(large, small, wide):
+    ahash = small > small.mean(axis=(1, 2), keepdims=True)
+    dhash = wide[:, :, 1:] > wide[:, :, :-1]
+    # the 2D DCT of every thumbnail at once, and its lowest 8x8 frequencies compared with their median (the DC term, the mean brightness, is left out of the median)
+    frequencies = (DCT_32 @ large @ DCT_32.T)[:, :8, :8].reshape(len(large), 64)
+    phash = frequencies > np.median(frequencies[:, 1:], axis=1, keepdims=True)
+    return {'ahash': pack_bits(ahash), 'dhash': pack_bits(dhash), 'phash': pack_bits(phash)}
+
+def decode_or_none(content):
+    try:
+        return thumbnails(content)
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+# Fetches the URLs through the cache and hashes them a batch at a time. Returns a DataFrame of url, width, height and the hashes, and the failed downloads.
+def hash_images(urls, cache, batch_size=DEFAULT_BATCH_SIZE, workers=image_downloader.DEFAULT_WORKERS):
+    rows, failures, batch = [], [], []
+
+    def flush():
+        with ThreadPoolExecutor(max_workers=os.cpu_count()) as executor:
+            decoded = list(executor.map(lambda result: decode_or_none(result.content), batch))
+        good = [(result, thumbs) for result, thumbs in zip(batch, decoded) if thumbs is not None]
+        failures.extend(result._replace(content=None, error='not an image') for result, thumbs in zip(batch, decoded) if thumbs is None)
+        if good:
+            hashes = batch_hashes(*(np.stack([thumbs[i] for _, thumbs in good]) for i in range(3)))
+            for i, (result, thumbs) in enumerate(good):
+                rows.append({'image_link': result.url, 'width': thumbs[3][0], 'height': thumbs[3][1], **{name: hashes[name][i] for name in HASHES}})
+        batch.clear()
+
+    for position, result in image_downloader.download_all(urls, workers=workers, cache=cache):
+        if result.error:
+            failures.append(result)
+            continue
+        batch.append(result)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return pd.DataFrame(rows, columns=['image_link', 'width', 'height'] + HASHES), failures
+
+# Adds the group, kept image and distance to it of every hashed image
+def group_duplicates(images, hash_name=DEFAULT_HASH, max_distance=DEFAULT_MAX_DISTANCE):
+    parent = list(range(len(images)))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    index = HammingIndex(images[hash_name].to_numpy(dtype=np.uint64), max_distance)
+    for i, value in enumerate(images[hash_name]):
+        # every image within the distance joins this one's group
+        for j in index.search(int(value))[1]:
+            parent[find(j)] = find(i)
+
+    groups = [find(i) for i in range(len(images))]
+    images = images.assign(group=groups, pixels=images['width'] * images['height'])
+    # the largest image of each group is kept (the first one of the largest, on a tie)
+    keep = images.sort_values('pixels', ascending=False, kind='stable').groupby('group').head(1).set_index('group')
+    images['kept_link'] = images['group'].map(keep['image_link'])
+    kept_hash = images['group'].map(keep[hash_name])
+    images['distance'] = [hamming(a, b) for a, b in zip(images[hash_name], kept_hash)]
+    images['kept'] = images['image_link'] == images['kept_link']
+    # numbered by first appearance instead of by union-find root
+    images['group'] = pd.factorize(images['group'])[0]
+    return images.drop(columns='pixels')
+
+def filter_dataset(dataset, images, keep_rows='first'):
+    dropped = set(images.loc[~images['kept'], 'image_link'])
+    filtered = dataset[~dataset['image_link'].isin(dropped)]
+    if keep_rows == 'first':
+        # rows without a link or whose image could not be hashed are not duplicates of anything
+        repeated = filtered['image_link'].notna() & filtered['image_link'].isin(images['image_link']) & filtered.duplicated('image_link')
+        filtered = filtered[~repeated]
+    return filtered
+
+def write_report(images, path):
+    report = images.copy()
+    for name in HASHES:
+        report[name] = report[name].map('{:016x}'.format)
+    report.to_csv(path, index=False)
+
+def main():
+    parser = setup_argparse()
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    dataset = pd.read_csv(args.input_csv)
+    urls = list(dict.fromkeys(dataset['image_link'].dropna()))
+    images, failures = hash_images(urls, download_cache.DownloadCache(args.cache_dir), args.batch_size, args.workers)
+    hashed = time.perf_counter()
+
+    images = group_duplicates(images, args.hash, args.max_distance)
+    grouped = time.perf_counter()
+    write_report(images, args.report)
+    filtered = filter_dataset(dataset, images, args.keep_rows)
+    filtered.to_csv(args.output_csv, index=False)
+
+    duplicates = int((~images['kept']).sum())
+    print(f"{len(urls)} distinct images, {len(images)} hashed in {hashed - start:.1f} s ({len(images) / (hashed - start):.0f} images/s), grouped in {grouped - hashed:.2f} s")
+    print(f"{duplicates} near-duplicates in {images.loc[~images['kept'], 'group'].nunique()} groups ({args.hash}, distance <= {args.max_distance}), see {args.report}")
+    print(f"{len(filtered)} of {len(dataset)} rows written to {args.output_csv}")
+    if failures:
+        print(f"{len(failures)} images could not be fetched or decoded, their rows are kept")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+### Image Downloader
+# Downloads many URLs at once over a pool of reused connections. A thread pool runs the requests, and all the threads share one requests Session whose connection pool is as large as the thread pool, so connections to a host are kept open and reused instead of doing a new TCP and TLS handshake per image. A per-host limit caps how many requests go to the same host at the same time (the NASA images all come from images-assets.nasa.gov, which should not be hammered).
+#
+# Every request has a timeout. Connection errors, timeouts and the statuses a server gives when it is busy (429 and 5xx) are retried with exponential backoff plus a little jitter; other errors (a 404) fail at once. A URL that still fails does not stop the others, it comes back as a DownloadResult with its error so the caller can report it.
+#
+# With a download_cache.DownloadCache, URLs downloaded by an earlier run are answered from disk (or revalidated with a conditional request) and new downloads are added to it.
+#
+# Only a bounded number of downloads are in flight or waiting to be picked up, so the contents of a long list of URLs are never all held in memory at once.
+
+import csv
+import random
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import nullcontext
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_WORKERS = 16
+DEFAULT_PER_HOST = 8
+# seconds to connect, and seconds to wait between bytes of the response
+DEFAULT_TIMEOUT = (5, 30)
+DEFAULT_RETRIES = 3
+# seconds before the first retry, doubled for every retry after it
+DEFAULT_BACKOFF = 0.5
+MAX_BACKOFF = 30
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# source is 'network', 'cache' (answered from the cache without asking the server) or 'revalidated' (the server answered 304 Not Modified)
+DownloadResult = namedtuple('DownloadResult', ['url', 'content', 'status', 'attempts', 'seconds', 'error', 'source'])
+
+# One semaphore per host, made the first time a host is seen
+class HostLimits:
+    def __init__(self, per_host=DEFAULT_PER_HOST):
+        self.per_host = per_host
+        self.semaphores = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.semaphores:
+                self.semaphores[host] = threading.BoundedSemaphore(self.per_host)
+            return self.semaphores[host]
+
+def make_session(pool_size=DEFAULT_WORKERS):
+    session = requests.Session()
+    # the retries are done by fetch, which can tell the caller how many it took
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=0)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def backoff_delay(attempt, backoff=DEFAULT_BACKOFF):
+    # full jitter keeps the retries of many failed requests from arriving at the same moment
+    return min(MAX_BACKOFF, backoff * 2 ** (attempt - 1)) * (0.5 + random.random() / 2)
+
+# Downloads one URL, retrying what can be retried. Never raises for a failed download, the error is in the result. With a download_cache.DownloadCache, cached URLs are answered from it (or revalidated, if the cache says so) and new downloads are stored in it.
+def fetch(session, url, limits=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, cache=None):
+    start = time.perf_counter()
+    if not isinstance(url, str) or not url.startswith(('http://', 'https://')):
+        return DownloadResult(url, None, None, 0, 0.0, 'not an http(s) URL', None)
+
+    entry = cache.get(url) if cache else None
+    if entry and not cache.revalidate:
+        content = cache.read(entry)
+        if content is not None:
+            return DownloadResult(url, content, None, 0, time.perf_counter() - start, None, 'cache')
+        entry = None
+    headers = cache.conditional_headers(entry) if cache else {}
+
+    status, error = None, None
+    for attempt in range(1, retries + 2):
+        try:
+            with limits(url) if limits else nullcontext():
+                response = session.get(url, timeout=timeout, headers=headers)
+                content = response.content
+            status = response.status_code
+            if status == 304 and entry:
+                content = cache.read(entry)
+                if content is not None:
+                    return DownloadResult(url, content, status, attempt, time.perf_counter() - start, None, 'revalidated')
+                # the cached file went missing in the meantime: ask again for the whole image, right away and as part of the same attempt
+                entry, headers = None, {}
+                with limits(url) if limits else nullcontext():
+                    response = session.get(url, timeout=timeout)
+                    content = response.content
+                status = response.status_code
+            if response.ok:
+                if cache:
+                    cache.store(url, content, response.headers)
+                return DownloadResult(url, content, status, attempt, time.perf_counter() - start, None, 'network')
+            error = f'HTTP {status}'
+            if status not in RETRY_STATUSES:
+                break
+        except (requests.ConnectionError, requests.Timeout) as exception:
+            status, error = None, f'{type(exception).__name__}: {exception}'
+        except requests.RequestException as exception:
+            status, error = None, f'{type(exception).__name__}: {exception}'
+            break
+        if attempt <= retries:
+            time.sleep(backoff_delay(attempt, backoff))
+    return DownloadResult(url, None, status, attempt, time.perf_counter() - start, error, 'network')
+
+# Downloads the URLs concurrently and yields (position in urls, DownloadResult) pairs in the order the downloads finish
+def download_all(urls, workers=DEFAULT_WORKERS, per_host=DEFAULT_PER_HOST, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, cache=None):
+    urls = iter(enumerate(urls))
+    limits = HostLimits(per_host)
+    with make_session(workers) as session, ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+
+        def submit():
+            for position, url in urls:
+                pending[executor.submit(fetch, session, url, limits, timeout, retries, backoff, cache)] = position
+                return True
+            return False
+
+        # twice the workers in flight keeps every thread busy while the caller handles finished downloads
+        while len(pending) < 2 * workers and submit():
+            pass
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future.result()
+                submit()
+    if cache:
+        cache.flush()
+
+def write_failure_report(failures, path):
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['url', 'status', 'attempts', 'error'])
+        for result in failures:
+            writer.writerow([result.url, result.status or '', result.attempts, result.error])
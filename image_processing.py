@@ -0,0 +1,146 @@
+### Image Processing
+# Turns downloaded image bytes into the 512x512 RGB JPEGs the model is trained on. Each image is decoded, converted to RGB, resized and saved by process_image, and process_all runs it in a pool of worker processes so decoding and resizing use every core instead of the thread the downloads are handled on. The pool is fed from an iterator through a bounded queue: when it holds queue_size images that are not processed yet, the feeder waits, which also holds back the downloads feeding it, so a slow pool never piles up downloaded bytes in memory.
+#
+# A JPEG is decoded in draft mode: libjpeg scales it down by 1/2, 1/4 or 1/8 while decoding, to the smallest size that is still at least 512x512, so a 4000 pixel photograph is never decoded at full resolution. Other formats are first shrunk with Image.reduce (resize's reducing_gap) before the final resampling filter runs. The filter and the JPEG quality are explicit options.
+#
+# Images can also be resized to a size of their own (the aspect-ratio buckets of aspect_buckets.py): the items then carry their size, fit='crop' resizes each image to cover it and crops the middle instead of stretching it, and process_all hands the pool batches of images of the same size.
+#
+# Images that are not RGB are converted before saving, since JPEG cannot hold an alpha channel or a palette: transparent pixels (RGBA, LA, or P with a transparent color) are laid over black, the background of the space images, and L, P, CMYK and 16-bit images are converted to RGB.
+
+import multiprocessing
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from io import BytesIO
+
+from PIL import Image
+
+IMAGE_SIZE = (512, 512)
+RESAMPLING_FILTERS = {
+    'nearest': Image.Resampling.NEAREST,
+    'box': Image.Resampling.BOX,
+    'bilinear': Image.Resampling.BILINEAR,
+    'hamming': Image.Resampling.HAMMING,
+    'bicubic': Image.Resampling.BICUBIC,
+    'lanczos': Image.Resampling.LANCZOS,
+}
+# bicubic and quality 75 are what Image.resize and JPEG saving used when they were not given
+DEFAULT_RESAMPLE = 'bicubic'
+DEFAULT_QUALITY = 75
+# reduce by whole factors until the image is within this factor of the target size, then resample (Pillow suggests 2 to 3)
+DEFAULT_REDUCING_GAP = 3.0
+DEFAULT_QUEUE_SIZE = 32
+
+# data is the encoded JPEG when the image was not saved to paths
+ProcessResult = namedtuple('ProcessResult', ['key', 'paths', 'source_size', 'source_mode', 'decode_seconds', 'resize_seconds', 'save_seconds', 'error', 'data'])
+PROCESS_STAGES = ['decode', 'resize', 'save']
+
+def to_rgb(img):
+    if img.mode == 'RGB':
+        return img
+    if img.mode == 'P' and 'transparency' in img.info:
+        img = img.convert('RGBA')
+    if img.mode in ('RGBA', 'LA', 'PA'):
+        img = img.convert('RGBA')
+        background = Image.new('RGB', img.size, (0, 0, 0))
+        background.paste(img, mask=img.getchannel('A'))
+        return background
+    if img.mode in ('I;16', 'I;16B', 'I;16L', 'I'):
+        # 16 and 32 bit greyscale would be clipped by convert, scale it to 8 bits first
+        img = img.convert('I').point(lambda value: value * (1 / 256)).convert('L')
+    return img.convert('RGB')
+
+# The part of an image of image_size that is left when it is scaled to cover size and the overflow is cut off evenly on both sides
+def crop_box(image_size, size):
+    width, height = image_size
+    scale = max(size[0] / width, size[1] / height)
+    crop_width, crop_height = size[0] / scale, size[1] / scale
+    left, top = (width - crop_width) / 2, (height - crop_height) / 2
+    return (left, top, left + crop_width, top + crop_height)
+
+# Decodes, converts and resizes one image and saves it to every path in paths, or returns the JPEG bytes when paths is None. fit='stretch' resizes the whole image to size, fit='crop' keeps its aspect ratio and crops the middle of it. Runs in a worker process, so it takes and returns plain values; a failure is returned in the result, not raised.
+# Any failure of one image (a file that does not decode, is truncated past its header, or cannot be saved) is returned as the error of its ProcessResult, with the time spent up to the failing stage, so one bad image never stops process_all
+def process_image(key, content, paths, size=IMAGE_SIZE, resample=DEFAULT_RESAMPLE, quality=DEFAULT_QUALITY, reducing_gap=DEFAULT_REDUCING_GAP, fit='stretch'):
+    times = [time.perf_counter()]
+    source_size = source_mode = None
+    try:
+        img = Image.open(BytesIO(content))
+        source_size, source_mode = img.size, img.mode
+        # only JPEGs have a draft mode, for other formats this does nothing. The draft is at least size on both sides, so it still covers size for a crop.
+        img.draft('RGB', size)
+        img.load()
+        times.append(time.perf_counter())
+
+        img = to_rgb(img)
+        box = crop_box(img.size, size) if fit == 'crop' else None
+        img = img.resize(size, RESAMPLING_FILTERS[resample], box=box, reducing_gap=reducing_gap)
+        times.append(time.perf_counter())
+
+        data = None
+        if paths is None:
+            buffer = BytesIO()
+            img.save(buffer, format='JPEG', quality=quality)
+            data = buffer.getvalue()
+        for path in paths or []:
+            img.save(path, format='JPEG', quality=quality)
+        times.append(time.perf_counter())
+        error = None
+    except Exception as failure:
+        stage = PROCESS_STAGES[len(times) - 1]
+        times.append(time.perf_counter())
+        data = None
+        error = f'not an image: {failure}' if stage == 'decode' else f'{stage} failed: {failure}'
+    seconds = [end - begin for begin, end in zip(times, times[1:])]
+    return ProcessResult(key, paths, source_size, source_mode, *seconds, *[0.0] * (3 - len(seconds)), error, data)
+
+# Processes a list of (key, content, paths) items that are all resized to size
+def process_batch(items, size, **options):
+    return [process_image(key, content, paths, size, **options) for key, content, paths in items]
+
+# Groups the (key, content, paths, size) items into lists of batch_size items of the same size, in the order the lists fill up. The lists that are not full yet are handed out when the items run out.
+def batches_by_size(items, batch_size):
+    groups = {}
+    for key, content, paths, size in items:
+        group = groups.setdefault(size, [])
+        group.append((key, content, paths))
+        if len(group) >= batch_size:
+            yield groups.pop(size), size
+    for size, group in groups.items():
+        yield group, size
+
+# Processes the (key, content, paths, size) items with workers processes (0 runs them in this process) and yields their ProcessResults in the order they finish. Each worker task is a batch of batch_size images of the same size; a batch waits until it is full, so up to batch_size - 1 images of every size are held back until more of that size arrive.
+def process_all(items, workers=None, queue_size=DEFAULT_QUEUE_SIZE, batch_size=1, **options):
+    batches = batches_by_size(items, batch_size)
+    if workers == 0:
+        for batch, size in batches:
+            yield from process_batch(batch, size, **options)
+        return
+
+    # queue_size counts images, the queue holds batches
+    queue_size = max(1, queue_size // batch_size)
+    # the download threads are already running when the pool starts, and forking a process with running threads can leave a lock held in the child
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count(), mp_context=multiprocessing.get_context('spawn')) as executor:
+        pending = set()
+        for batch, size in batches:
+            # hand back what is finished, and wait for a free place when the queue is full
+            done = {future for future in pending if future.done()}
+            if not done and len(pending) >= queue_size:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            pending -= done
+            for future in done:
+                yield from future.result()
+            pending.add(executor.submit(process_batch, batch, size, **options))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield from future.result()
+
+# stages maps each stage to the (images, seconds) it handled. The seconds are added up over all threads or processes that ran the stage, so images/s is what one of them gets through.
+def print_throughput(stages, images, wall_seconds):
+    print(f"{'stage':<12}{'images':>8}{'busy (s)':>10}{'images/s':>10}")
+    for name, (count, seconds) in stages.items():
+        rate = f"{count / seconds:.1f}" if seconds else '-'
+        print(f"{name:<12}{count:>8}{seconds:>10.2f}{rate:>10}")
+    rate = f"{images / wall_seconds:.1f}" if wall_seconds else '-'
+    print(f"{'all (wall)':<12}{images:>8}{wall_seconds:>10.2f}{rate:>10}")
@@ -0,0 +1,99 @@
+### Incremental Regeneration
+# A catalog update only adds or changes a small share of the planets. The manifest saved next to the output maps every planet to a hash of the columns the pipeline reads for it, together with the rule set version and the decisions made from the whole dataset that every row depends on (by_mass and which columns are float32), and records the dtype of every output column. With --incremental a rerun only generates the rows that are new or whose hash changed, takes the generated columns of every other row from the previous output, and keeps the rest of each row from the new catalog. When the rule set or one of those decisions changed, everything is generated again.
+#
+# prompt_generator_functions.py --incremental runs it, and rereads the previous output (the Parquet file when there is one, it keeps the exact dtypes).
+
+import hashlib
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+import descriptor_rules as rules
+
+# What an incremental run needs from the pipeline, handed in by prompt_generator_functions (its incremental_pipeline()) so this file does not import it: generate(dataset, by_mass, unique_prompts, columns=, threads=, timings=) generates the rows given, read_output(path) reads a previous output back, compact(dataset, drop_columns) shrinks the finished dataset, float_columns are the columns preprocessing downcasts to float32 where every value fits, generated_columns are the columns the pipeline writes and prompt_templates are the templates the prompts are formatted with.
+IncrementalPipeline = namedtuple('IncrementalPipeline', ['generate', 'read_output', 'compact', 'float_columns', 'generated_columns', 'prompt_templates'])
+
+PIPELINE_INPUT_COLUMNS = ['sy_snum', 'sy_pnum', 'sy_mnum', 'pl_orbper', 'pl_orbsmax', 'pl_rade', 'pl_bmasse', 'pl_eqt', 'pl_imppar',
+                          'st_spectype', 'st_teff', 'st_mass']
+
+def rule_set_version(prompt_templates):
+    digest = hashlib.sha256()
+    with open(rules.__file__, 'rb') as source:
+        digest.update(source.read())
+    digest.update(repr(sorted(prompt_templates.items())).encode())
+    return f"{rules.RULE_SET_VERSION}-{digest.hexdigest()[:16]}"
+
+# the blank rows at the end of the catalog all have pl_name 0, so every name is counted to keep the keys apart
+def planet_keys(dataset):
+    names = dataset['pl_name'].astype(str)
+    return names + '#' + names.groupby(names, sort=False).cumcount().astype(str)
+
+def input_hashes(dataset):
+    return pd.util.hash_pandas_object(dataset[PIPELINE_INPUT_COLUMNS], index=False).to_numpy()
+
+def manifest_settings(pipeline, dataset, by_mass, drop_columns=(), columns=None):
+    return {
+        'rule_set_version': rule_set_version(pipeline.prompt_templates),
+        'by_mass': bool(by_mass),
+        'float_dtypes': {col: str(dataset[col].dtype) for col in pipeline.float_columns},
+        'drop_columns': list(drop_columns),
+        'columns': None if columns is None else list(columns),
+    }
+
+def load_manifest(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as file:
+        return json.load(file)
+
+def save_manifest(path, manifest):
+    partial_path = path + '.partial'
+    with open(partial_path, 'w') as file:
+        json.dump(manifest, file)
+    os.replace(partial_path, path)
+
+# Returns the finished dataset, the manifest to save once it has been written (so a failed save never leaves a manifest pointing at an output that does not exist) and how many planets were new or changed.
+# The manifest also records the dtype of every output column, which the values read back from the previous output are cast to: a CSV file does not keep them.
+def generate_prompts_incremental(pipeline, dataset, previous_path, manifest_path, unique_prompts=False, compact=False, drop_columns=(), columns=None, threads=1, timings=None):
+    by_mass = bool(dataset['pl_bmasse'].any())
+    settings = manifest_settings(pipeline, dataset, by_mass, drop_columns, columns)
+    keys = planet_keys(dataset)
+    hashes = input_hashes(dataset).tolist()
+
+    previous = None
+    manifest = load_manifest(manifest_path)
+    if manifest is not None and 'dtypes' in manifest and os.path.exists(previous_path) and all(manifest.get(name) == value for name, value in settings.items()):
+        planets = manifest['planets']
+        changed = np.fromiter((planets.get(key) != row_hash for key, row_hash in zip(keys, hashes)), dtype=bool, count=len(keys))
+        if not changed.all():
+            previous = pipeline.read_output(previous_path)
+            previous.index = planet_keys(previous)
+            if not keys[~changed].isin(previous.index).all():
+                previous = None
+    if previous is None:
+        changed = np.ones(len(dataset), dtype=bool)
+
+    # the pipeline is not run on an empty frame, a rerun without changes takes every row from the previous output
+    if changed.any():
+        generated = pipeline.generate(dataset[changed].copy(), by_mass, unique_prompts, columns=columns, threads=threads, timings=timings)
+    else:
+        generated = dataset[changed]
+    if previous is not None:
+        kept = dataset[~changed].copy()
+        kept_keys = keys[~changed]
+        # the values read back from the previous output take the dtypes a full run gave them
+        dtypes = manifest['dtypes']
+        for col in previous.columns:
+            if col in pipeline.generated_columns or col not in dataset.columns:
+                values = previous.loc[kept_keys, col].to_numpy()
+                kept[col] = values if dtypes[col] == 'object' else values.astype(dtypes[col])
+        columns = list(generated.columns) if len(generated) else list(previous.columns)
+        generated = pd.concat([kept[columns], generated[columns]]).loc[dataset.index] if len(generated) else kept[columns]
+
+    dtypes = {col: str(dtype) for col, dtype in generated.dtypes.items()}
+    if compact:
+        generated = pipeline.compact(generated, drop_columns)
+    return generated, {**settings, 'dtypes': dtypes, 'planets': dict(zip(keys, hashes))}, int(changed.sum())
@@ -0,0 +1,146 @@
+### Instrumentation
+# An opt-in layer that records where a run spends its time and memory. Every instrumented call (a wrapped function, or a block run inside profiler.stage) is added up by name: how many times it ran, wall time, rows per second, how far it pushed the peak RSS of the process up and, when allocation tracing is on, the peak number of bytes it had allocated at once. The report is written as JSON (one file per run, so the throughput of runs can be compared over time) and printed as a table. One chosen stage can also be run under cProfile and dumped to a .prof file, which python -m pstats, snakeviz or flameprof (for a flame graph) can read.
+#
+# Nested calls are counted in their parents too, so the times of a function and the functions it calls overlap. When stages run on several threads at the same time their memory numbers overlap as well, use a single thread for clean numbers.
+
+import cProfile
+import functools
+import inspect
+import json
+import os
+import platform
+import resource
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pandas as pd
+
+# ru_maxrss is in kilobytes on Linux and in bytes on macOS
+RSS_UNITS = 1 if sys.platform == 'darwin' else 1024
+
+def peak_rss():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * RSS_UNITS
+
+def count_rows(value):
+    return len(value) if isinstance(value, pd.DataFrame) else None
+
+class Profiler:
+    def __init__(self, trace_allocations=False, profile_stage=None, profile_output=None):
+        self.trace_allocations = trace_allocations
+        self.profile_stage = profile_stage
+        self.profile_output = profile_output or f'{profile_stage}.prof'
+        self.records = {}
+        self.started = time.perf_counter()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.cprofile = cProfile.Profile() if profile_stage else None
+        self.cprofile_depth = 0
+        if trace_allocations and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def add(self, name, seconds, rows, rss_delta, allocated):
+        with self.lock:
+            record = self.records.setdefault(name, {'calls': 0, 'seconds': 0.0, 'rows': 0, 'peak_rss_delta_bytes': 0, 'allocated_bytes': None})
+            record['calls'] += 1
+            record['seconds'] += seconds
+            record['rows'] += rows or 0
+            record['peak_rss_delta_bytes'] = max(record['peak_rss_delta_bytes'], rss_delta)
+            if allocated is not None:
+                record['allocated_bytes'] = max(record['allocated_bytes'] or 0, allocated)
+
+    # Runs the body as one call of the stage called name. rows can be given up front or set later with the yielded dict (stats['rows'] = ...) once it is known.
+    @contextmanager
+    def stage(self, name, rows=None):
+        stats = {'rows': rows}
+        stack = self.local.__dict__.setdefault('stack', [])
+        frame = {'child_peak': 0}
+        if self.trace_allocations:
+            # the peak is reset for this stage, so what the parent reached so far is handed back to it at the end
+            frame['start'], frame['parent_peak'] = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+        stack.append(frame)
+
+        profiling = self.cprofile is not None and name == self.profile_stage
+        if profiling:
+            self.cprofile_depth += 1
+            if self.cprofile_depth == 1:
+                self.cprofile.enable()
+
+        rss_before = peak_rss()
+        start = time.perf_counter()
+        try:
+            yield stats
+        finally:
+            seconds = time.perf_counter() - start
+            rss_delta = peak_rss() - rss_before
+            if profiling:
+                self.cprofile_depth -= 1
+                if self.cprofile_depth == 0:
+                    self.cprofile.disable()
+
+            stack.pop()
+            allocated = None
+            if self.trace_allocations:
+                peak = max(tracemalloc.get_traced_memory()[1], frame['child_peak'])
+                allocated = peak - frame['start']
+                if stack:
+                    stack[-1]['child_peak'] = max(stack[-1]['child_peak'], peak, frame['parent_peak'])
+            self.add(name, seconds, stats['rows'], rss_delta, allocated)
+
+    def wrap(self, function, name=None):
+        name = name or function.__name__
+
+        @functools.wraps(function)
+        def instrumented(*args, **kwargs):
+            rows = next((count_rows(value) for value in list(args) + list(kwargs.values()) if count_rows(value) is not None), None)
+            with self.stage(name, rows) as stats:
+                result = function(*args, **kwargs)
+                if stats['rows'] is None:
+                    stats['rows'] = count_rows(result[0] if isinstance(result, tuple) and result else result)
+            return result
+        return instrumented
+
+    def report(self):
+        stages = []
+        for name, record in self.records.items():
+            rows_per_second = record['rows'] / record['seconds'] if record['rows'] and record['seconds'] else None
+            stages.append({'name': name, **record, 'rows_per_second': rows_per_second})
+        stages.sort(key=lambda stage: stage['seconds'], reverse=True)
+        return {
+            'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'command': sys.argv,
+            'python': platform.python_version(),
+            'pandas': pd.__version__,
+            'cpus': os.cpu_count(),
+            'total_seconds': time.perf_counter() - self.started,
+            'peak_rss_bytes': peak_rss(),
+            'trace_allocations': self.trace_allocations,
+            'stages': stages,
+        }
+
+    def write_report(self, path):
+        report = self.report()
+        with open(path, 'w') as file:
+            json.dump(report, file, indent=2)
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(self.profile_output)
+        return report
+
+def print_report(report):
+    print(f"{report['total_seconds']:.2f} s, peak RSS {report['peak_rss_bytes'] / 1e6:.1f} MB")
+    print(f"{'stage':<34}{'calls':>8}{'time (s)':>12}{'rows':>12}{'rows/s':>14}{'RSS delta (MB)':>16}{'allocated (MB)':>16}")
+    for stage in report['stages']:
+        rows_per_second = f"{stage['rows_per_second']:.0f}" if stage['rows_per_second'] else '-'
+        allocated = f"{stage['allocated_bytes'] / 1e6:.1f}" if stage['allocated_bytes'] is not None else '-'
+        print(f"{stage['name']:<34}{stage['calls']:>8}{stage['seconds']:>12.4f}{stage['rows']:>12}{rows_per_second:>14}"
+              f"{stage['peak_rss_delta_bytes'] / 1e6:>16.1f}{allocated:>16}")
+
+# Replaces every function defined in the module (not the ones it imports) with an instrumented version, so calls between them are recorded as well. skip names functions to leave alone, such as small helpers called once per row.
+def instrument_module(module, profiler, skip=()):
+    for name, function in inspect.getmembers(module, inspect.isfunction):
+        if function.__module__ == module.__name__ and name not in skip and name != 'main':
+            setattr(module, name, profiler.wrap(function, name))
@@ -0,0 +1,55 @@
+### Metadata Writer
+# Writes the caption and tags of each training image as the image is saved, instead of collecting them all at the end. Every record becomes one line of a JSONL file ({"file_name": "image_1.jpg", "tags": ..., "caption": ...}, the metadata.jsonl layout Hugging Face's imagefolder loader reads) and, optionally, one entry of the legacy metadata.json dict ({"image_1": {"tags": ..., "caption": ...}}) that the Kohya fine-tuning notebook reads. The legacy dict is streamed too, entry by entry, so memory stays flat however many images there are.
+#
+# Both files are written to .partial files and only renamed over the real names by close() once every record is in, so a run that crashes leaves the previous metadata untouched instead of a truncated file. Used as a context manager, the .partial files are deleted when the block raises.
+
+import json
+import os
+
+class MetadataWriter:
+    def __init__(self, jsonl_path, json_path=None):
+        self.paths = [path for path in (jsonl_path, json_path) if path]
+        for path in self.paths:
+            if os.path.dirname(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.jsonl = open(jsonl_path + '.partial', 'w') if jsonl_path else None
+        self.json = open(json_path + '.partial', 'w') if json_path else None
+        self.records = 0
+        if self.json:
+            self.json.write('{')
+
+    # key names the image in the legacy dict, file_name is its path relative to the JSONL file
+    def write(self, key, file_name, record):
+        if self.jsonl:
+            self.jsonl.write(json.dumps({'file_name': file_name, **record}) + '\n')
+        if self.json:
+            self.json.write((', ' if self.records else '') + json.dumps(key) + ': ' + json.dumps(record))
+        self.records += 1
+
+    def close(self):
+        if self.json:
+            self.json.write('}')
+        for file in (self.jsonl, self.json):
+            if file:
+                file.flush()
+                os.fsync(file.fileno())
+                file.close()
+        for path in self.paths:
+            os.replace(path + '.partial', path)
+
+    def abort(self):
+        for file in (self.jsonl, self.json):
+            if file:
+                file.close()
+        for path in self.paths:
+            if os.path.exists(path + '.partial'):
+                os.remove(path + '.partial')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exception_type, exception, traceback):
+        if exception_type is None:
+            self.close()
+        else:
+            self.abort()
@@ -0,0 +1,184 @@
+### NASA Search
+# Searches the NASA Image and Video Library (images-api.nasa.gov) for several queries at once and over as many pages as asked for. The first page of every query is requested at the same time; its total_hits tells how many pages the query has, and those pages are then requested at the same time too, over one pooled session (image_downloader.make_session) with the same timeouts and retries as the image downloads. The results are merged in query and page order and deduplicated by nasa_id: an image found by several queries, or on two pages because the results moved between requests, is kept once.
+#
+# Every raw response is cached on disk (search_cache/<sha256 of the URL>.json, with the time it was fetched) and used again until it is older than the TTL, so a rerun within the TTL makes no API calls at all. With offline=True the cache is used whatever its age and nothing is requested; a page that is not cached is an error.
+#
+# api_url points the search at another server, such as the local stand-in of benchmarks/stand_in_server.py.
+#
+# Run from the repository root:
+#   python nasa_search.py exoplanet "planet artist concept" --max-pages 5 --output search_results.json
+#   python nasa_search.py exoplanet --api-url http://127.0.0.1:8765 --cache-dir /tmp/search_cache
+
+import argparse
+import hashlib
+import json
+import math
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
+from urllib.parse import urlencode
+
+import image_downloader
+
+DEFAULT_API_URL = 'https://images-api.nasa.gov'
+DEFAULT_MEDIA_TYPE = 'image'
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_MAX_PAGES = 10
+# the API answers the first 10,000 results of a query and no more
+API_MAX_RESULTS = 10000
+DEFAULT_WORKERS = 8
+DEFAULT_CACHE_DIR = 'search_cache'
+DEFAULT_TTL = 24 * 3600
+DEFAULT_OUTPUT = 'search_results.json'
+
+# items maps each nasa_id to its search result, in the order they were first found; queries maps each query to the nasa_ids it found, in result order; api_calls and cached_pages count the pages requested and the pages read from the cache
+SearchResults = namedtuple('SearchResults', ['items', 'queries', 'total_hits', 'api_calls', 'cached_pages'])
+
+def setup_argparse():
+    parser = argparse.ArgumentParser(description="Search the NASA Image and Video Library")
+    parser.add_argument("queries", nargs="+", help="Search terms, one query per argument")
+    parser.add_argument("--media-type", default=DEFAULT_MEDIA_TYPE, help="Media type of the results")
+    parser.add_argument("--max-pages", type=int, default=DEFAULT_MAX_PAGES, help="Most pages requested per query")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Results per page")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Number of pages requested at the same time")
+    parser.add_argument("--api-url", default=DEFAULT_API_URL, help="Base URL of the images API")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="Folder of the cached responses")
+    parser.add_argument("--ttl-hours", type=float, default=DEFAULT_TTL / 3600, help="Hours a cached response is used before it is requested again")
+    parser.add_argument("--offline", action="store_true", help="Only use the cached responses, whatever their age, and make no API calls")
+    parser.add_argument("--no-cache", action="store_true", help="Request every page, without reading or filling the cache")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON file the deduplicated results are written to")
+    return parser
+
+class ResponseCache:
+    def __init__(self, folder=DEFAULT_CACHE_DIR, ttl=DEFAULT_TTL, offline=False):
+        self.folder = folder
+        self.ttl = ttl
+        self.offline = offline
+        os.makedirs(folder, exist_ok=True)
+
+    def path(self, url):
+        return os.path.join(self.folder, hashlib.sha256(url.encode()).hexdigest() + '.json')
+
+    # The cached response of url, or None when there is none or it is older than the TTL (offline, any age will do)
+    def get(self, url):
+        try:
+            with open(self.path(url)) as file:
+                entry = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if entry.get('url') != url or (not self.offline and time.time() - entry['fetched_at'] > self.ttl):
+            return None
+        return entry['response']
+
+    def store(self, url, response):
+        path = self.path(url)
+        partial_path = f'{path}.{os.getpid()}.partial'
+        with open(partial_path, 'w') as file:
+            json.dump({'url': url, 'fetched_at': time.time(), 'response': response}, file)
+        os.replace(partial_path, path)
+
+# The parameters are sorted so the same page always has the same URL, and the same cache entry
+def page_url(api_url, query, page, page_size=DEFAULT_PAGE_SIZE, media_type=DEFAULT_MEDIA_TYPE):
+    params = {'media_type': media_type, 'page': page, 'page_size': page_size, 'q': query}
+    return f"{api_url.rstrip('/')}/search?{urlencode(sorted(params.items()))}"
+
+def nasa_id(item):
+    return item['data'][0]['nasa_id']
+
+# The collection of one page and where it came from ('cache' or 'network'). Raises RuntimeError when the page cannot be had.
+def fetch_page(session, url, cache=None, timeout=image_downloader.DEFAULT_TIMEOUT, retries=image_downloader.DEFAULT_RETRIES, backoff=image_downloader.DEFAULT_BACKOFF):
+    response = cache.get(url) if cache else None
+    if response is not None:
+        return response['collection'], 'cache'
+    if cache and cache.offline:
+        raise RuntimeError(f"{url} is not in the search cache {cache.folder}, run once without --offline first")
+
+    result = image_downloader.fetch(session, url, timeout=timeout, retries=retries, backoff=backoff)
+    if result.error:
+        raise RuntimeError(f"{url}: {result.error}")
+    try:
+        response = json.loads(result.content)
+        collection = response['collection']
+    except (ValueError, KeyError) as error:
+        raise RuntimeError(f"{url}: not a search response ({error})")
+    if cache:
+        cache.store(url, response)
+    return collection, 'network'
+
+def page_count(total_hits, page_size, max_pages):
+    return max(1, min(max_pages, math.ceil(min(total_hits, API_MAX_RESULTS) / page_size)))
+
+# Searches every query, up to max_pages pages each, and returns the merged SearchResults. The pages are requested over session when one is given (the caller closes it), otherwise over a session of its own that is closed when the search is done.
+def search_all(queries, max_pages=DEFAULT_MAX_PAGES, page_size=DEFAULT_PAGE_SIZE, media_type=DEFAULT_MEDIA_TYPE, api_url=DEFAULT_API_URL, cache=None,
+               workers=DEFAULT_WORKERS, timeout=image_downloader.DEFAULT_TIMEOUT, retries=image_downloader.DEFAULT_RETRIES, backoff=image_downloader.DEFAULT_BACKOFF, session=None):
+    queries = list(dict.fromkeys(queries))
+    with nullcontext(session) if session else image_downloader.make_session(workers) as session:
+        pages, sources = fetch_pages(session, queries, max_pages, page_size, media_type, api_url, cache, workers, timeout, retries, backoff)
+    return merge_pages(pages, queries, max_pages, sources)
+
+# Every page of every query, by (query, page), and how many came from the network and from the cache
+def fetch_pages(session, queries, max_pages, page_size, media_type, api_url, cache, workers, timeout, retries, backoff):
+    pages = {}
+    sources = {'network': 0, 'cache': 0}
+
+    def get(query, page):
+        return fetch_page(session, page_url(api_url, query, page, page_size, media_type), cache, timeout, retries, backoff)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # the later pages of a query are asked for as soon as its first page tells how many there are
+        first_pages = {executor.submit(get, query, 1): query for query in queries}
+        later_pages = {}
+        for future in as_completed(first_pages):
+            query = first_pages[future]
+            collection, source = future.result()
+            pages[query, 1] = collection
+            sources[source] += 1
+            for page in range(2, page_count(collection['metadata']['total_hits'], page_size, max_pages) + 1):
+                later_pages[executor.submit(get, query, page)] = (query, page)
+        for future in as_completed(later_pages):
+            collection, source = future.result()
+            pages[later_pages[future]] = collection
+            sources[source] += 1
+    return pages, sources
+
+def merge_pages(pages, queries, max_pages, sources):
+    items, found, total_hits = {}, {}, {}
+    for query in queries:
+        total_hits[query] = pages[query, 1]['metadata']['total_hits']
+        ids = []
+        for page in range(1, max_pages + 1):
+            for item in pages.get((query, page), {}).get('items', []):
+                items.setdefault(nasa_id(item), item)
+                ids.append(nasa_id(item))
+        found[query] = list(dict.fromkeys(ids))
+    return SearchResults(items, found, total_hits, sources['network'], sources['cache'])
+
+def write_results(results, path):
+    partial_path = path + '.partial'
+    with open(partial_path, 'w') as file:
+        json.dump({'queries': results.queries, 'total_hits': results.total_hits, 'items': list(results.items.values())}, file)
+    os.replace(partial_path, path)
+
+def main():
+    parser = setup_argparse()
+    args = parser.parse_args()
+
+    cache = None if args.no_cache else ResponseCache(args.cache_dir, args.ttl_hours * 3600, args.offline)
+    start = time.perf_counter()
+    try:
+        results = search_all(args.queries, args.max_pages, args.page_size, args.media_type, args.api_url, cache, args.workers)
+    except RuntimeError as error:
+        parser.exit(1, f"search failed: {error}\n")
+    elapsed = time.perf_counter() - start
+
+    print(f"{'query':<32}{'total hits':>12}{'results':>10}")
+    for query, ids in results.queries.items():
+        print(f"{query:<32}{results.total_hits[query]:>12}{len(ids):>10}")
+    print(f"{len(results.items)} distinct results in {elapsed:.2f} s, {results.api_calls} API calls, {results.cached_pages} pages from the cache")
+    write_results(results, args.output)
+    print(f"results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+### Physics
+# The physical quantities derived from the catalog columns, as whole-column NumPy kernels. Each one takes plain arrays (or anything np.asarray takes: lists, Series, scalars) in the units of the NASA catalog and returns an array, so other tools can compute them for millions of rows without building a DataFrame. prompt_generator_functions uses them for the stellar/planet ratio, the orbital periods it fills in and the Roche limit.
+#
+# A missing value is 0 in the catalog. Every kernel returns 0 for a row where one of the inputs it divides by or depends on is 0, instead of dividing by zero or passing a made-up number on.
+#
+# Units: pl_orbsmax in AU, pl_rade in Earth radii, pl_bmasse in Earth masses, st_mass and st_rad in solar units, st_teff in kelvin.
+
+import numpy as np
+
+SOLAR_TEFF = 5772.0
+# the radius of the sun in AU
+SOLAR_RADIUS_AU = 0.00465047
+
+# The star's mass as a percentage of the planet's mass, in float64 whatever the input dtypes are.
+def stellar_planet_ratio(st_mass, pl_bmasse):
+    st_mass = np.asarray(st_mass, dtype='float64')
+    pl_bmasse = np.asarray(pl_bmasse, dtype='float64')
+    known = (st_mass != 0) & (pl_bmasse != 0)
+
+    # the division only runs where both masses are known, the rest of the output stays 0
+    ratio = np.zeros(np.broadcast(st_mass, pl_bmasse).shape)
+    np.divide(st_mass, pl_bmasse, out=ratio, where=known)
+    ratio *= 100
+    return ratio
+
+# Kepler's third law in solar system units: the orbital period in years of a planet pl_orbsmax AU from a star of st_mass solar masses (one by default, like the pipeline assumes).
+def kepler_period(pl_orbsmax, st_mass=1.0):
+    pl_orbsmax = np.asarray(pl_orbsmax, dtype='float64')
+    st_mass = np.asarray(st_mass, dtype='float64')
+    known = (pl_orbsmax != 0) & (st_mass != 0)
+
+    period = np.zeros(np.broadcast(pl_orbsmax, st_mass).shape)
+    np.divide(pl_orbsmax ** 3, st_mass, out=period, where=known)
+    np.sqrt(period, out=period)
+    return period
+
+# pl_orbper with the missing periods of planets that have an orbit size filled in by kepler_period (in years, as the pipeline always has), in the dtype pl_orbper came in.
+def fill_orbital_period(pl_orbper, pl_orbsmax):
+    pl_orbper = np.asarray(pl_orbper)
+    pl_orbsmax = np.asarray(pl_orbsmax)
+    missing = (pl_orbper == 0) & (pl_orbsmax != 0)
+
+    filled = pl_orbper.copy()
+    filled[missing] = kepler_period(pl_orbsmax[missing])
+    return filled
+
+# The distance inside which the star's tides would pull the planet apart (1.26 times the planet's radius times the cube root of the mass ratio). It is worked out in the dtype of the inputs, so float32 columns give a float32 limit.
+def roche_limit(pl_rade, st_mass, pl_bmasse):
+    pl_rade = np.asarray(pl_rade)
+    st_mass = np.asarray(st_mass)
+    pl_bmasse = np.asarray(pl_bmasse)
+    known = (st_mass != 0) & (pl_bmasse != 0)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        limit = 1.26 * pl_rade * (st_mass / pl_bmasse) ** (1/3)
+    return np.where(known, limit, 0)
+
+# The stellar flux the planet receives, relative to what the earth gets from the sun. The star's luminosity comes from its radius and temperature (st_lum is a log10, so its missing 0 would read as one solar luminosity).
+def insolation(st_rad, st_teff, pl_orbsmax):
+    st_rad = np.asarray(st_rad, dtype='float64')
+    st_teff = np.asarray(st_teff, dtype='float64')
+    pl_orbsmax = np.asarray(pl_orbsmax, dtype='float64')
+    known = (st_rad != 0) & (st_teff != 0) & (pl_orbsmax != 0)
+
+    flux = np.zeros(np.broadcast(st_rad, st_teff, pl_orbsmax).shape)
+    np.divide(st_rad * (st_teff / SOLAR_TEFF) ** 2, pl_orbsmax, out=flux, where=known)
+    np.square(flux, out=flux)
+    return flux
+
+# The temperature in kelvin of a planet that absorbs the light it gets (all of it, with the default albedo of 0) and radiates it evenly over its whole surface.
+def equilibrium_temperature(st_teff, st_rad, pl_orbsmax, albedo=0.0):
+    st_teff = np.asarray(st_teff, dtype='float64')
+    st_rad = np.asarray(st_rad, dtype='float64')
+    pl_orbsmax = np.asarray(pl_orbsmax, dtype='float64')
+    known = (st_teff != 0) & (st_rad != 0) & (pl_orbsmax != 0)
+
+    temperature = np.zeros(np.broadcast(st_teff, st_rad, pl_orbsmax).shape)
+    np.divide(st_rad * SOLAR_RADIUS_AU, 2 * pl_orbsmax, out=temperature, where=known)
+    np.sqrt(temperature, out=temperature)
+    temperature *= st_teff * (1 - albedo) ** 0.25
+    return temperature
@@ -4,38 +4,168 @@
 import pandas as pd
 import numpy as np
 import argparse
+import sys
+import time
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import descriptor_rules as rules
+import instrumentation
+import physics
+import spectral_types
+import catalog_streaming
+import incremental_regeneration
 
 def setup_argparse():
     parser = argparse.ArgumentParser(description="Data Preprocessing for Machine Learning")
     parser.add_argument("--training-data", required=True, help="Path to the training data CSV file")
-    parser.add_argument("--exoplanet-data", required=True, help="Path to the exoplanet data CSV file")
+    parser.add_argument("--exoplanet-data", required=True, help="Path to the exoplanet data CSV file (or the .zip it ships in)")
+    parser.add_argument("--unique-prompts", action="store_true", help="Format each prompt once per combination of descriptions instead of once per planet (same output, much faster)")
+    parser.add_argument("--columns", nargs="+", default=None, help="Only run the stages needed for these output columns (for example mass_prompt 75_tokens)")
+    parser.add_argument("--threads", type=int, default=1, help="Run the stages that do not depend on each other (and the two datasets) on this many threads")
+    parser.add_argument("--spectral-index", nargs="?", const="", default=None, help="Keep the parsed spectral types in this JSON file and reuse them on the next run (without a path: " + spectral_types.INDEX_FILE_NAME + " next to the outputs)")
+
+    streaming = parser.add_argument_group("streaming", "Run the exoplanet data through the pipeline a chunk at a time, on one or more processes, and write it as CSV. None of the whole-dataset options can be used with these.")
+    chunks = streaming.add_mutually_exclusive_group()
+    chunks.add_argument("--chunksize", type=int, default=None, help="Stream the exoplanet data through the pipeline this many rows at a time")
+    chunks.add_argument("--max-memory-mb", type=float, default=None, help="Stream the exoplanet data in chunks sized to keep the rows in flight under this many megabytes")
+    streaming.add_argument("--workers", type=int, default=1, help="Split the exoplanet data into shards and generate the prompts for them on this many processes")
+
+    whole_dataset = parser.add_argument_group("whole dataset", "Only without --chunksize, --max-memory-mb and --workers.")
+    whole_dataset.add_argument("--compact", action="store_true", help="Hold the descriptor and prompt columns as categoricals, the sy_* counts as small ints and the physics columns as float32")
+    whole_dataset.add_argument("--drop-intermediate", action="store_true", help="With --compact, drop the columns that are only used to build other columns (" + ", ".join(INTERMEDIATE_COLUMNS) + ")")
+    whole_dataset.add_argument("--memory-report", action="store_true", help="Compact the exoplanet data and print the memory used by each column before and after")
+    whole_dataset.add_argument("--output-format", choices=OUTPUT_FORMATS, default="csv", help="Write the datasets as CSV, Parquet (needs pyarrow) or both")
+    whole_dataset.add_argument("--timings", action="store_true", help="Print how long each stage of the pipeline took")
+    whole_dataset.add_argument("--incremental", action="store_true", help="Only generate the exoplanet rows that are new or changed since the last run, using the manifest saved next to the output")
+    whole_dataset.add_argument("--manifest", default="exoplanet_data_prompts.manifest.json", help="Path to the manifest of the input hashes used by --incremental")
+    whole_dataset.add_argument("--typed-ingest", action="store_true", help="Only read the columns the pipeline uses (names, sy_* counts, the planet and star parameters, the descriptors of an earlier run, and image_description, image_link and Notes of the training data), with declared types, in one pass. Every other column of the input files is left out of the saved datasets; the run prints which")
+    whole_dataset.add_argument("--csv-engine", choices=CSV_ENGINES, default="c", help="With --typed-ingest, parse the CSV files with pandas' C parser or with pyarrow (needs pip install pyarrow)")
+
+    profiling = parser.add_argument_group("profiling")
+    profiling.add_argument("--profile-report", default=None, help="Instrument every function of the pipeline and write the time, rows/s and memory of each one to this JSON file (and print it as a table)")
+    profiling.add_argument("--profile-stage", default=None, help="With --profile-report, also run this function (for example get_orbital_period) under cProfile")
+    profiling.add_argument("--profile-output", default=None, help="Where to dump the cProfile stats of --profile-stage (default <stage>.prof)")
+    profiling.add_argument("--trace-allocations", action="store_true", help="With --profile-report, also record the bytes allocated by each function (slower)")
     return parser
 
-def preprocess_data(training_data_path, exoplanet_data_path):
-    # Load training data and exoplanet data from CSV files
-    training_data = pd.read_csv(training_data_path)
-    exoplanet_data = pd.read_csv(exoplanet_data_path)
-
-    # Preprocessing the training data
-    training_data = training_data.drop('Unnamed: 0', axis=1)
+str_to_float_cols = ['pl_orbper', 'pl_orbsmax', 'pl_rade', 'pl_bmasse', 'pl_dens', 'pl_eqt', 'pl_imppar',
+                    'st_teff', 'st_rad', 'st_mass', 'sy_vmag']
+
+# The exoplanet dataset is shipped zipped (exoplanet_data_prompts.csv.zip). The zip also holds a __MACOSX entry, so we open the csv inside it ourselves instead of letting pandas guess.
+def open_catalog(path):
+    if not zipfile.is_zipfile(path):
+        return open(path, 'rb')
+
+    archive = zipfile.ZipFile(path)
+    members = [name for name in archive.namelist() if name.endswith('.csv') and not name.startswith('__MACOSX')]
+    return archive.open(members[0])
+
+# low_memory=False makes pandas pick one dtype per column from the whole column, instead of mixing types between the blocks it parses
+def read_catalog(path, **kwargs):
+    with open_catalog(path) as catalog:
+        return pd.read_csv(catalog, low_memory=False, **kwargs)
+
+# ## Typed Ingest
+# read_catalog parses every column of the catalog and guesses the type of each one from its values, and a number column with thousands separators in it comes out as text that preprocessing has to strip and parse again. The typed path declares the columns the pipeline reads and their types up front, so the parser only keeps those, reads the numbers straight into float64 (thousands separators included) in one pass and does not have to guess. The numbers are read as float64 and preprocessing still downcasts the ones float32 holds exactly, so the values are the same as on the original path.
+# The descriptor columns of an earlier run are read as well when the file has them, since the pipeline keeps their value where none of its rules match. Every other column of the file is left out of the saved datasets, which generate_datasets lists when it runs (the error bars, discovery and reference columns of the catalog, for example).
+
+CATALOG_SCHEMA = {
+    'pl_name': object,
+    'hostname': object,
+    'sy_snum': 'float64',
+    'sy_pnum': 'float64',
+    'sy_mnum': 'float64',
+    **dict.fromkeys(str_to_float_cols, 'float64'),
+    'st_spectype': object,
+}
+
+TRAINING_SCHEMA = {'image_description': object, 'image_link': object, **CATALOG_SCHEMA, 'Notes': object}
+
+CSV_ENGINES = ['c', 'pyarrow']
+
+def read_header(path):
+    with open_catalog(path) as catalog:
+        return list(pd.read_csv(catalog, nrows=0).columns)
+
+# pyarrow has no thousands separator option, so the numeric columns are read as text and the separators are stripped before the cast, both inside arrow
+def read_csv_with_pyarrow(catalog, dtypes):
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    from pyarrow import csv
+
+    convert_options = csv.ConvertOptions(include_columns=list(dtypes), column_types=dict.fromkeys(dtypes, pa.string()), strings_can_be_null=True)
+    table = csv.read_csv(catalog, convert_options=convert_options)
+    for col, dtype in dtypes.items():
+        if dtype != object:
+            number = pc.cast(pc.replace_substring(table[col], ',', ''), pa.from_numpy_dtype(np.dtype(dtype)))
+            table = table.set_column(table.column_names.index(col), col, number)
+    return table.to_pandas()
+
+# The columns of header that are read and their types: the declared columns in the order the file has them, a declared column the file does not have is left out
+def typed_columns(header, schema):
+    wanted = {**schema, **{col: object for col in DESCRIPTOR_COLUMNS if col not in schema}}
+    return {col: wanted[col] for col in header if col in wanted}
+
+# The columns of the file that read_typed_csv does not read and the pipeline does not write again, which are missing from the saved datasets
+def typed_ingest_left_out(path, schema):
+    header = read_header(path)
+    read = typed_columns(header, schema)
+    return [col for col in header if col not in read and col not in GENERATED_COLUMNS]
+
+def read_typed_csv(path, schema, engine='c'):
+    dtypes = typed_columns(read_header(path), schema)
+
+    with open_catalog(path) as catalog:
+        if engine == 'pyarrow':
+            return read_csv_with_pyarrow(catalog, dtypes)
+        return pd.read_csv(catalog, usecols=list(dtypes), dtype=dtypes, thousands=',', low_memory=False)
+
+def preprocess_training_data(training_data):
+    training_data = training_data.drop('Unnamed: 0', axis=1, errors='ignore')
     training_data.fillna(0, inplace=True)
 
-    str_to_float_cols = ['pl_orbper', 'pl_orbsmax', 'pl_rade', 'pl_bmasse', 'pl_dens', 'pl_eqt', 'pl_imppar',
-                        'st_teff', 'st_rad', 'st_mass', 'sy_vmag']
+    for col in str_to_float_cols:
+        # only columns read as text can hold thousands separators, numbers are cast as they are
+        if training_data[col].dtype == object:
+            training_data[col] = training_data[col].astype(str).str.replace(',', '')
+        training_data[col] = training_data[col].astype('float32')
+
+    # a missing spectral type is 0 after fillna, it is kept as the float 0.0
+    st_spectype = training_data['st_spectype']
+    training_data['st_spectype'] = st_spectype.mask(st_spectype == 0, 0.0)
+    return training_data
+
+# float_dtypes fixes the dtype of each numeric column instead of letting to_numeric decide from the values it was given, which only holds for the whole dataset when the rows are processed in chunks
+def preprocess_exoplanet_data(exoplanet_data, float_dtypes=None):
+    # the first row of the exoplanet data is dropped (only the first chunk has it when streaming)
+    exoplanet_data = exoplanet_data.drop(0, errors='ignore')
+    exoplanet_data.fillna(0, inplace=True)
 
     for col in str_to_float_cols:
-        training_data[col] = training_data[col].astype(str).str.replace(',', '').astype('float32')
-    
-    training_data['st_spectype'] = training_data['st_spectype'].apply(lambda x: float(x) if x == 0 else x)
+        if float_dtypes is None:
+            exoplanet_data[col] = pd.to_numeric(exoplanet_data[col], downcast='float')
+        else:
+            exoplanet_data[col] = pd.to_numeric(exoplanet_data[col]).astype(float_dtypes[col])
+    return exoplanet_data
 
-    # Preprocessing the exoplanet data
-    exoplanet_data = exoplanet_data.drop(0)
-    exoplanet_data.fillna(0, inplace=True)
+# typed reads only the declared columns (see Typed Ingest above), engine picks the parser used for them
+def preprocess_data(training_data_path, exoplanet_data_path, typed=False, engine='c'):
+    # Load training data and exoplanet data from CSV files
+    if typed:
+        training_data = read_typed_csv(training_data_path, TRAINING_SCHEMA, engine)
+        exoplanet_data = read_typed_csv(exoplanet_data_path, CATALOG_SCHEMA, engine)
+    else:
+        training_data = pd.read_csv(training_data_path)
+        exoplanet_data = read_catalog(exoplanet_data_path)
 
-    str_to_float_cols = ['pl_orbper', 'pl_orbsmax', 'pl_rade', 'pl_bmasse', 'pl_dens', 'pl_eqt', 'pl_imppar',
-                        'st_teff', 'st_rad', 'st_mass', 'sy_vmag']
+    # Preprocessing the training data
+    training_data = preprocess_training_data(training_data)
 
-    exoplanet_data[str_to_float_cols] = exoplanet_data[str_to_float_cols].apply(pd.to_numeric, downcast='float')
+    # Preprocessing the exoplanet data
+    exoplanet_data = preprocess_exoplanet_data(exoplanet_data)
     
     return training_data, exoplanet_data
 
@@ -57,30 +187,22 @@ def preprocess_data(training_data_path, exoplanet_data_path):
 # 
 # In the below section, we are defining a function that will categorize our data into types of planets based on their mass or radius.
 
-def get_planet_category(dataset):
-    if dataset['pl_bmasse'].any() != 0.0:
-        conditions = [(dataset['pl_bmasse'] > 0.0) & (dataset['pl_bmasse'] <= 2.0),
-                    (dataset['pl_bmasse'] > 2.0) & (dataset['pl_bmasse'] <= 10.0),
-                    (dataset['pl_bmasse'] > 10.0) & (dataset['pl_bmasse'] <= 17.0),
-                    (dataset['pl_bmasse'] > 17.0),
-                    (dataset['pl_bmasse'] == 0.0)
-                    ]
-        
-        values = ['terrestrial', 'super-earth', 'neptune-like', 'gas-giant', 'unknown planet size']
-
-        dataset['planet_category'] = np.select(conditions, values, default='unknown')
-
-    elif dataset['pl_bmasse'].any() == 0.0 and dataset['pl_rade'] != 0.0:
-        conditions = [(dataset['pl_rade'] > 0.0) & (dataset['pl_rade'] <= 2.0),
-                    (dataset['pl_rade'] > 2.0) & (dataset['pl_rade'] <= 10.0),
-                    (dataset['pl_rade'] > 10.0) & (dataset['pl_rade'] <= 17.0),
-                    (dataset['pl_rade'] > 17.0), 
-                    (dataset['pl_rade'] == 0.0)
-                    ]
-        
-        values = ['terrestrial', 'super-earth', 'neptune-like', 'gas-giant', 'unknown planet size']
+# The whole dataset is categorized by mass when any of its planets has a mass, and by radius otherwise. by_mass lets a caller that only holds part of the dataset (one chunk of a stream) make the same choice the whole dataset would.
+def get_planet_category(dataset, by_mass=None):
+    if by_mass is None:
+        by_mass = dataset['pl_bmasse'].any()
+
+    column = 'pl_bmasse' if by_mass else 'pl_rade'
+    conditions = [(dataset[column] > 0.0) & (dataset[column] <= 2.0),
+                (dataset[column] > 2.0) & (dataset[column] <= 10.0),
+                (dataset[column] > 10.0) & (dataset[column] <= 17.0),
+                (dataset[column] > 17.0),
+                (dataset[column] == 0.0)
+                ]
+    
+    values = ['terrestrial', 'super-earth', 'neptune-like', 'gas-giant', 'unknown planet size']
 
-        dataset['planet_category'] = np.select(conditions, values, default='unknown')
+    dataset['planet_category'] = np.select(conditions, values, default='unknown')
         
     return dataset
 
@@ -89,458 +211,97 @@ def get_planet_category(dataset):
 #In most variations of our code, we will use the earth mass ratio already within our dataset to determine the size of the planet, however, in one instance of our training, we want to edit this to be not a numerical ratio, but a textual categorization. The below code does this for planets, we will do the same thing later on for our stars.
 
 def planet_mass_description(dataset):
-    for index, data in dataset.iterrows():
+    pl_bmasse = dataset['pl_bmasse'].to_numpy(dtype='float64')
 
-        mercury_mass = 0.0553
-        venus_mass = 0.815
-        earth_mass = 1.0
-        mars_mass = 0.107
-        jupiter_mass = 317.8
-        saturn_mass = 95.2
-        uranus_mass = 14.5
-        neptune_mass = 17.1
-
-        if data['pl_bmasse'] != 0:
-            if data['pl_bmasse'] <= mercury_mass:
-                dataset.at[index, 'planet_mass_description'] = 'tiny'
-            elif mercury_mass < data['pl_bmasse'] <= mars_mass:
-                dataset.at[index, 'planet_mass_description'] = 'very small'
-            elif mars_mass < data['pl_bmasse'] <= venus_mass:
-                dataset.at[index, 'planet_mass_description'] = 'small'
-            elif venus_mass < data['pl_bmasse'] <= earth_mass:
-                dataset.at[index, 'planet_mass_description'] = 'medium small'
-            elif uranus_mass < data['pl_bmasse'] <= neptune_mass:
-                dataset.at[index, 'planet_mass_description'] = 'medium'
-            elif neptune_mass < data['pl_bmasse'] <= saturn_mass:
-                dataset.at[index, 'planet_mass_description'] = 'large'
-            elif saturn_mass < data['pl_bmasse'] <= jupiter_mass:
-                dataset.at[index, 'planet_mass_description'] = 'giant'
-            elif jupiter_mass < data['pl_bmasse']:
-                dataset.at[index, 'planet_mass_description'] = 'massive'
-                
-        elif data['pl_bmasse'] == 0:
-            if data['planet_category'] == 'terrestrial':
-                dataset.at[index, 'planet_mass_description'] = 'small'
-            elif data['planet_category'] == 'super-earth':
-                dataset.at[index, 'planet_mass_description'] = 'medium'
-            elif data['planet_category'] == 'neptune-like':
-                dataset.at[index, 'planet_mass_description'] = 'large'
-            elif data['planet_category'] == 'gas-giant':
-                dataset.at[index, 'planet_mass_description'] = 'giant'
+    descriptions = np.select(
+        [pl_bmasse != 0, pl_bmasse == 0],
+        [rules.apply_ladder(rules.PLANET_MASS_DESCRIPTION_BY_MASS_COMPILED, pl_bmasse),
+         rules.apply_mapping(rules.PLANET_MASS_DESCRIPTION_BY_CATEGORY, dataset['planet_category'])],
+        default='unknown size')
 
-        else:
-            dataset.at[index, 'planet_mass_description'] = 'unknown size'
-            
-    return dataset
+    return rules.assign_descriptor(dataset, 'planet_mass_description', descriptions)
 
 # ## Getting Planet_Color Description
 # With the below code, we are defining a function that will return the planet_color based on scientific backed research into the available data in our dataset.
 
 def get_planet_description(dataset):
-    for index, data in dataset.iterrows():
-        #mass of the planets in our solar system for comparative purposes
-        mercury_mass = 0.0553
-        venus_mass = 0.815
-        earth_mass = 1.0
-        mars_mass = 0.107
-        jupiter_mass = 317.8
-        saturn_mass = 95.2
-        uranus_mass = 14.5
-        neptune_mass = 17.1
-
-        if data['pl_eqt'] != 0.0: 
-
-        #coding based on type of planet and planet temperature
-            if data['planet_category'] == 'terrestrial' or data['planet_category'] == 'super-earth':
-                if data['pl_eqt'] <= 20.0:
-                    dataset.at[index, 'planet_color'] = 'has a composition of hydrogen and helium producing a distince white color'
-                elif 20.0 < data['pl_eqt'] <= 200.0:
-                    dataset.at[index, 'planet_color'] = 'has high quantities of methane known for its rich blue color'
-                elif 200.0 < data['pl_eqt'] <= 400.0:
-                    dataset.at[index, 'planet_color'] = 'likely has a small amount of blue methane and yellow ammonia. The most dominant color would come from blue liquid water'
-                elif 400.0 < data['pl_eqt'] <= 600.0:
-                    dataset.at[index, 'planet_color'] = 'most likely has water vapor that still produces a true blue color mixing with the breakdown of methanes deep blue'
-                elif 600.0 < data['pl_eqt'] <= 800.0:
-                    dataset.at[index, 'planet_color'] = 'has carbon dioxide and hydrocarbons are dominant in this planet which could both come in varying shades of blue and white'
-                elif 800.0 < data['pl_eqt'] <= 1200.0:
-                    dataset.at[index, 'planet_color'] = 'has white carbon dioxide molecules and pale yellow sulfur compounds are likely on this planet'
-                elif 1200.0 < data['pl_eqt'] <= 1700.0:
-                    dataset.at[index, 'planet_color'] = 'has pale yellow sulfure compounds and blue and white water vapor are likely dominate on this planet'
-                elif 1700.0 < data['pl_eqt']:
-                    dataset.at[index, 'planet_color'] = 'is so hot all metals are breaking down causing the planet to likely be covered in lava'
-                
-            elif data['planet_category'] == 'neptune-like':
-                if data['pl_eqt'] <= 90.0:
-                    dataset.at[index, 'planet_color'] = 'consists mostly of helium and hydrogen which are dominantly white, but it mixes with frozen methane characterized by a light blue color'
-                elif 90.0 < data['pl_eqt'] <= 110.0:
-                    dataset.at[index, 'planet_color'] = 'has methane as a liquid and dominant in the atmosphere shifting the color to a azure blue color'
-                elif 110.0 < data['pl_eqt'] <= 275.0:
-                    dataset.at[index, 'planet_color'] = 'has methane as a gas and producing a deep blue color'
-                elif 275.0 < data['pl_eqt'] <= 375.0:
-                    dataset.at[index, 'planet_color'] = 'has a dark blue methane color mixing with water vapor clouds of a much lighter blue color and traces of ammonia as a light yellow color'
-                elif 375.0 < data['pl_eqt'] <= 500.0:
-                    dataset.at[index, 'planet_color'] = 'methane is breaking down and possibly mixing with other chemicals such as sulfur, known for its pale yellow color'
-                elif 500.0 < data['pl_eqt'] <= 800.0:
-                    dataset.at[index, 'planet_color'] = 'methane is breaking down, so the planet is likely no longer a deep blue, but hydrocarbons are likely present in the atmosphere, which depending on composition are varying shades of blue'
-                elif 800.0 < data['pl_eqt'] <= 900.0:
-                    dataset.at[index, 'planet_color'] = 'has deep blue methane is breaking down and less pronounced and likely to have alkali metals known for their silvery white color'
-                elif 900.0 < data['pl_eqt'] <= 1400.0:
-                    dataset.at[index, 'planet_color'] = 'has deep blue methane is breaking down and less pronounced, aerosols and thermal emissions are more likely and often give off a neutral or red color that would mix with the blue'
-                elif 1400.0 < data['pl_eqt']:
-                    dataset.at[index, 'planet_color'] = 'likely overtaken by aerosols and thermal emissions as well as high-temperature gases causing it to be between purple and red in color'
-            
-            elif data['planet_category'] == 'gas-giant':
-                if data['pl_eqt'] <= 70.0:
-                    dataset.at[index, 'planet_color'] = 'has frozen ammonia producing a duller yellow color merging with the more dominant methane, characterized by its shade of blue'
-                elif 70.0 < data['pl_eqt'] <= 150.0:
-                    dataset.at[index, 'planet_color'] = 'most likely overrun with ammonia clouds characterized by their variety of yellow coloring'
-                elif 150.0 < data['pl_eqt'] <= 250.0:
-                    dataset.at[index, 'planet_color'] = 'has methane in its blue color but in very small quantities. The dominant color will be ammonia, which is now a liquid giving the planet a darker yellow color closer to brown'
-                elif 250.0 < data['pl_eqt'] <= 350.0: 
-                    dataset.at[index, 'planet_color'] = 'the atmosphere is overtaken with water vapor giving the planet a mostly white color with the posibility of slight blue tinting'
-                elif 350.0 < data['pl_eqt'] <= 800.0:
-                    dataset.at[index, 'planet_color'] = 'is so warm it likely does not have clouds and appears as a uniform blue orb'
-                elif 800.0 < data['pl_eqt'] <= 900.0:
-                    dataset.at[index, 'planet_color'] = 'is in transition from a blue atmosphere to being overtaken by carbon monoxide and alkali metals known for being silvery white'
-                elif 900.0 < data['pl_eqt']<= 1400.0:
-                    dataset.at[index, 'planet_color'] = 'has carbon monoxide and alkali metals like sodium and potassium as dominant, which known for their silvery white coloring'
-                elif 1400.0 < data['pl_eqt']:
-                    dataset.at[index, 'planet_color'] = 'is dominated by silicate and iron clouds most notably variations of red coloring'
-            
-            elif data['planet_category'] == 'unknown planet size':
-                dataset.at[index, 'planet_color'] = 'is an unknown planet color'
-            
-        
-        elif data['pl_eqt'] == 0.0 and data['pl_bmasse'] != 0.0: 
-        #coding based on type of planet and mass
-            if data['pl_bmasse'] <= mercury_mass:
-                dataset.at[index, 'planet_color'] = 'is likely extremely hot and possibly covered in lava, primary composed of silicate minerals and oxides ranging in a variety of colors from silvery gray to a rich deep red'
-            elif mercury_mass < data['pl_bmasse'] <= mars_mass:
-                dataset.at[index, 'planet_color'] = 'is primarily composed of silicate minerals and oxides ranging in a variety of colors from silvery gray to a rich deep red'
-            elif mars_mass < data['pl_bmasse'] <= venus_mass:
-                dataset.at[index, 'planet_color'] = 'is primarily composed of silicate minerals and oxides ranging in a variety of colors from silvery gray to a rich deep red, as well as other gas chemicals such as carbon dioxide which produces a white color, and sulfur known for being a pale yellow'
-            elif venus_mass < data['pl_bmasse'] <= earth_mass:
-                dataset.at[index, 'planet_color'] = 'likely has a mixture of blue liquid water, and other gas chemicals such as carbon dioxide which produces a white color, and sulfur known for being pale yellow in color'
-            elif earth_mass < data['pl_bmasse']:
-                dataset.at[index, 'planet_color'] = 'likely has water vapor producing a blue color as well as helium and hydrogen, which both produce shades of white'
-            elif data['pl_bmasse'] <= uranus_mass:
-                dataset.at[index, 'planet_color'] = 'consisting mostly of helium and hydrogen which are dominantly white, but it mixes with frozen methane characterized by a light blue color'
-            elif uranus_mass < data['pl_bmasse'] <= neptune_mass:
-                dataset.at[index, 'planet_color'] = 'has methane as a liquid and dominant in the atmosphere shifting the color to a azure blue color'
-            elif neptune_mass < data['pl_bmasse']:
-                dataset.at[index, 'planet_color'] = 'has methane as a gas and producing a deep blue color'
-            elif data['pl_bmasse'] <= saturn_mass:
-                dataset.at[index, 'planet_color'] = 'has frozen ammonia producing a duller yellow color with slight traces of methane characterized by its shade of true blue'
-            elif saturn_mass < data['pl_bmasse'] <= jupiter_mass:
-                dataset.at[index, 'planet_color'] = 'is most likely overrun with ammonia clouds characterized by their variety of yellow coloring'
-            elif jupiter_mass < data['pl_bmasse']:
-                dataset.at[index, 'planet_color'] = 'has methane in its blue color but in very small quantities with the dominant color will be ammonia, which is now a liquid giving the planet a range of darker yellow and brown colors'
+    pl_eqt = dataset['pl_eqt'].to_numpy(dtype='float64')
+    pl_bmasse = dataset['pl_bmasse'].to_numpy(dtype='float64')
+    planet_category = dataset['planet_category'].to_numpy(dtype=object)
 
-        else:
-            if data['planet_category'] == 'terrestrial' or data['planet_category'] == 'super-earth':
-                dataset.at[index, 'planet_color'] = 'a rocky world made up of metals and rocks'
-            elif data['planet_category'] == 'neptune-like':
-                dataset.at[index, 'planet_color'] = 'an icy world composed of frozen gases'
-            elif data['planet_category'] == 'gas-giant':
-                dataset.at[index, 'planet_color'] = 'a giant world obscured by swirling gases'
-            elif data['planet_category'] == 'unknown planet size':
-                dataset.at[index, 'planet_color'] = 'has an unknown planet color'
-        
-    return dataset
+    descriptions = np.select(
+        #coding based on type of planet and planet temperature, then on mass, then on type of planet alone
+        [pl_eqt != 0.0, (pl_eqt == 0.0) & (pl_bmasse != 0.0)],
+        [rules.apply_ladders_by_category(rules.PLANET_COLOR_BY_EQT_COMPILED, planet_category, pl_eqt),
+         rules.apply_ladder(rules.PLANET_COLOR_BY_MASS_COMPILED, pl_bmasse)],
+        default=rules.apply_mapping(rules.PLANET_COLOR_BY_CATEGORY, planet_category))
+
+    return rules.assign_descriptor(dataset, 'planet_color', descriptions)
 
 ### Shortened Description
 # 
 # Here we are generating a shorter planet_color description to use as an option when testing.
 def get_planet_description_short(dataset):
-    for index, data in dataset.iterrows():
-        #need to code in the mass of all the planets in our solar system
-        mercury_mass = 0.0553
-        venus_mass = 0.815
-        earth_mass = 1.0
-        mars_mass = 0.107
-        jupiter_mass = 317.8
-        saturn_mass = 95.2
-        uranus_mass = 14.5
-        neptune_mass = 17.1
-
-        if data['pl_eqt'] != 0.0: 
-
-        #coding based on type of planet and planet temperature
-            if data['planet_category'] == 'terrestrial' or data['planet_category'] == 'super-earth':
-                if data['pl_eqt'] <= 20.0:
-                    dataset.at[index, 'planet_color_short'] = 'is white in color'
-                elif 20.0 < data['pl_eqt'] <= 200.0:
-                    dataset.at[index, 'planet_color_short'] = 'is rich blue in color'
-                elif 200.0 < data['pl_eqt'] <= 400.0:
-                    dataset.at[index, 'planet_color_short'] = 'contains liquid water, and has traces of blue and yellow coloring'
-                elif 400.0 < data['pl_eqt'] <= 600.0:
-                    dataset.at[index, 'planet_color_short'] = 'is a shade of blue in color'
-                elif 600.0 < data['pl_eqt'] <= 800.0:
-                    dataset.at[index, 'planet_color_short'] = 'is a varying shade of blue and/or white'
-                elif 800.0 < data['pl_eqt'] <= 1200.0:
-                    dataset.at[index, 'planet_color_short'] = 'is white and pale yellow in color'
-                elif 1200.0 < data['pl_eqt'] <= 1700.0:
-                    dataset.at[index, 'planet_color_short'] = 'is mostly blue and white with possible pale yellow coloring'
-                elif 1700.0 < data['pl_eqt']:
-                    dataset.at[index, 'planet_color_short'] = 'is covered in lava'
-                
-            elif data['planet_category'] == 'neptune-like':
-                if data['pl_eqt'] <= 90.0:
-                    dataset.at[index, 'planet_color_short'] = 'is mostly white mixed with light blue in color'
-                elif 90.0 < data['pl_eqt'] <= 110.0:
-                    dataset.at[index, 'planet_color_short'] = 'is azure blue in color'
-                elif 110.0 < data['pl_eqt'] <= 275.0:
-                    dataset.at[index, 'planet_color_short'] = 'is a deep blue color'
-                elif 275.0 < data['pl_eqt'] <= 375.0:
-                    dataset.at[index, 'planet_color_short'] = 'is mostly a dark blue color mixing with light blue and pale yellow' 
-                elif 375.0 < data['pl_eqt'] <= 500.0:
-                    dataset.at[index, 'planet_color_short'] = 'is a mixture of blue and yellow in color'
-                elif 500.0 < data['pl_eqt'] <= 800.0:
-                    dataset.at[index, 'planet_color_short'] = 'is a shade of blue' 
-                elif 800.0 < data['pl_eqt'] <= 900.0:
-                    dataset.at[index, 'planet_color_short'] = 'is mostly blue mixing with a silvery white color'
-                elif 900.0 < data['pl_eqt'] <= 1400.0:
-                    dataset.at[index, 'planet_color_short'] = 'is mostly blue mixing with brown and red colors' 
-                elif 1400.0 < data['pl_eqt']:
-                    dataset.at[index, 'planet_color_short'] = 'is between purple and red in color' 
-            
-            elif data['planet_category'] == 'gas-giant':
-                if data['pl_eqt'] <= 70.0:
-                    dataset.at[index, 'planet_color_short'] = 'is pale yellow in color with slight traces of blue'
-                elif 70.0 < data['pl_eqt'] <= 150.0:
-                    dataset.at[index, 'planet_color_short'] = 'a shade of yellow in color' 
-                elif 150.0 < data['pl_eqt'] <= 250.0:
-                    dataset.at[index, 'planet_color_short'] = 'a yellow brown in color with slight traces of blue' 
-                elif 250.0 < data['pl_eqt'] <= 350.0: 
-                    dataset.at[index, 'planet_color_short'] = 'mostly white in color with slight traces of blue' 
-                elif 350.0 < data['pl_eqt'] <= 800.0:
-                    dataset.at[index, 'planet_color_short'] = 'a uniform blue in color' 
-                elif 800.0 < data['pl_eqt'] <= 900.0:
-                    dataset.at[index, 'planet_color_short'] = 'is blue mixing with silvery white in color' 
-                elif 900.0 < data['pl_eqt']<= 1400.0:
-                    dataset.at[index, 'planet_color_short'] = 'is mostly silvery white in color' 
-                elif 1400.0 < data['pl_eqt']:
-                    dataset.at[index, 'planet_color_short'] = 'a shade of red in color' 
-            
-            elif data['planet_category'] == 'unknown planet size':
-                dataset.at[index, 'planet_color_short'] = 'unknown planet color'
-            
-        
-        elif data['pl_eqt'] == 0.0 and data['pl_bmasse'] != 0.0: 
-        #coding based on type of planet and mass
-            if data['pl_bmasse'] <= mercury_mass:
-                dataset.at[index, 'planet_color_short'] = 'is covered in lava and a shade of deep red to silvery gray in color' 
-            elif mercury_mass < data['pl_bmasse'] <= mars_mass:
-                dataset.at[index, 'planet_color_short'] = 'a shade of deep red to silvery gray in color'
-            elif mars_mass < data['pl_bmasse'] <= venus_mass:
-                dataset.at[index, 'planet_color_short'] = 'is likely a shade of deep red to silvery gray with traces of white and pale yellow coloring' 
-            elif venus_mass < data['pl_bmasse'] <= earth_mass:
-                dataset.at[index, 'planet_color_short'] = 'contains liquid water and possible white and yellow coloring'
-            elif earth_mass < data['pl_bmasse']:
-                dataset.at[index, 'planet_color_short'] = 'is mostly blue with traces of white coloring' 
-            elif data['pl_bmasse'] <= uranus_mass:
-                dataset.at[index, 'planet_color_short'] = 'is light blue with traces of white coloring' 
-            elif uranus_mass < data['pl_bmasse'] <= neptune_mass:
-                dataset.at[index, 'planet_color_short'] = 'an azure blue color'
-            elif neptune_mass < data['pl_bmasse']:
-                dataset.at[index, 'planet_color_short'] = 'a deep blue color'
-            elif data['pl_bmasse'] <= saturn_mass:
-                dataset.at[index, 'planet_color_short'] = 'a dull yellow color mixing with true blue'
-            elif saturn_mass < data['pl_bmasse'] <= jupiter_mass:
-                dataset.at[index, 'planet_color_short'] = 'a shade of yellow coloring'
-            elif jupiter_mass < data['pl_bmasse']:
-                dataset.at[index, 'planet_color_short'] = 'a darker yellow and brown color with possible blue'
+    pl_eqt = dataset['pl_eqt'].to_numpy(dtype='float64')
+    pl_bmasse = dataset['pl_bmasse'].to_numpy(dtype='float64')
+    planet_category = dataset['planet_category'].to_numpy(dtype=object)
 
-        else:
-            if data['planet_category'] == 'terrestrial' or data['planet_category'] == 'super-earth':
-                dataset.at[index, 'planet_color_short'] = 'is a rocky world made up of metals and rocks'
-            elif data['planet_category'] == 'neptune-like':
-                dataset.at[index, 'planet_color_short'] = 'is an icy world composed of frozen gases'
-            elif data['planet_category'] == 'gas-giant':
-                dataset.at[index, 'planet_color_short'] = 'is a giant world obscured by swirling gases'
-            elif data['planet_category'] == 'unknown planet size':
-                dataset.at[index, 'planet_color_short'] = 'ia an unknown planet color'
-        
-    return dataset
+    descriptions = np.select(
+        [pl_eqt != 0.0, (pl_eqt == 0.0) & (pl_bmasse != 0.0)],
+        [rules.apply_ladders_by_category(rules.PLANET_COLOR_SHORT_BY_EQT_COMPILED, planet_category, pl_eqt),
+         rules.apply_ladder(rules.PLANET_COLOR_SHORT_BY_MASS_COMPILED, pl_bmasse)],
+        default=rules.apply_mapping(rules.PLANET_COLOR_SHORT_BY_CATEGORY, planet_category))
+
+    return rules.assign_descriptor(dataset, 'planet_color_short', descriptions)
 
 # ## Creating a Function to get Orbital Speed
+# planets without an orbital period get one from the size of their orbit (see physics.fill_orbital_period), pl_orbper keeps its dtype
 def get_orbital_period(dataset):
-    for index, data in dataset.iterrows():
-        if data['pl_orbper'] == 0 and data['pl_orbsmax'] !=0:
-            orbit_distance = np.sqrt((data.loc['pl_orbsmax'])**3)
-            dataset.at[index, 'pl_orbper'] = orbit_distance
+    dataset['pl_orbper'] = physics.fill_orbital_period(dataset['pl_orbper'].to_numpy(), dataset['pl_orbsmax'].to_numpy())
     return dataset
 
 # # Creating a function to get planet spin
 #adding in a spin column, as the faster a planet spins, the more turbulent it's weather and the more likely it is to have clouds, banding, etc. 
 def get_planet_spin(dataset):
-    for index, data in dataset.iterrows():
-        #planet orbital periods
-        mercury_spin = 88
-        venus_spin = 224
-        earth_spin = 365
-        mars_spin = 687
-        jupiter_spin = 4332
-        saturn_spin = 10747
-        uranus_spin = 30589
-        neptune_spin = 59800 
-
-        #planet masses 
-        mercury_mass = 0.0553
-        venus_mass = 0.815
-        earth_mass = 1.0
-        mars_mass = 0.107
-        jupiter_mass = 317.8
-        saturn_mass = 95.2
-        uranus_mass = 14.5
-        neptune_mass = 17.1
-
-        if data['pl_orbper'] != 0.0: #checking if there is an orbital period listed in the dataset
-            if data['planet_category'] == 'terrestrial' or data['planet_category'] == 'super-earth': 
-                if data['pl_orbper'] <= mercury_spin:
-                    dataset.at[index, 'planet_spin'] = 'is hot and rotating quickly with little to no atmosphere, clouds, or storms'
-                elif mercury_spin < data['pl_orbper'] <= venus_spin:
-                    dataset.at[index, 'planet_spin'] = 'is hot and rotating quickly hot with a thick atmosphere of heavy swirling clouds with bright and dark markings'
-                elif venus_spin < data['pl_orbper'] <= earth_spin:
-                    dataset.at[index, 'planet_spin'] = 'has clouds of various sizes speckling planet atmosphere showing pieces of the planet terrain beneath'
-                elif earth_spin < data['pl_orbper'] <= mars_spin:
-                    dataset.at[index, 'planet_spin'] = 'has clouds of various sizes speckling planet atmosphere showing pieces of the planet terrain beneath'
-                elif mars_spin < data['pl_orbper']:
-                    dataset.at[index, 'planet_spin'] = 'has wisps of clouds of various sizes speckling planet atmosphere showing most of the planet terrain beneath'
-            elif data['planet_category'] == 'neptune-like':
-                if data['pl_orbper'] <= uranus_spin:
-                    dataset.at[index, 'planet_spin'] = 'has clearly defined striped light and dark icy clouds'
-                elif uranus_spin < data['pl_orbper'] <= neptune_spin:
-                    dataset.at[index, 'planet_spin'] = 'has softly defined striped light and dark icy clouds'
-                elif neptune_spin < data['pl_orbper']:
-                    dataset.at[index, 'planet_spin'] = 'has icy clouds with no apparent delineation between colors'
-            elif data['planet_category'] == 'gas-giant':
-                if data['pl_orbper'] <= jupiter_spin:
-                    dataset.at[index, 'planet_spin'] = 'has stripes of thick clouds of various coloring defined by clear, sharp edges'
-                elif jupiter_spin < data['pl_orbper'] <= saturn_spin:
-                    dataset.at[index, 'planet_spin'] = 'has stripes of thick clouds of various coloring defined by softened edges'
-                elif saturn_spin < data['pl_orbper']:
-                    dataset.at[index, 'planet_spin'] = 'has thick clouds of various coloring blending together across the planet surface'
-        elif data['pl_orbper'] == 0.0:  #if zero go off planet mass and compare to the planets in our solar system
-            if data['planet_category'] == 'terrestrial' or data['planet_category'] == 'super-earth': 
-                if data['pl_bmasse'] <= mercury_mass:
-                    dataset.at[index, 'planet_spin'] = 'is hot and rotating quickly with little to no atmosphere, clouds, or storms'
-                elif mercury_mass < data['pl_bmasse'] <= venus_mass:
-                    dataset.at[index, 'planet_spin'] = 'is hot and rotating quickly with a thick atmosphere of heavy swirling clouds with bright and dark markings'
-                elif venus_mass < data['pl_bmasse'] <= earth_mass:
-                    dataset.at[index, 'planet_spin'] = 'has clouds of various sizes speckling planet atmosphere showing pieces of the planet terrain beneath'
-                elif earth_mass < data['pl_bmasse'] <= mars_mass:
-                    dataset.at[index, 'planet_spin'] = 'has clouds of various sizes speckling planet atmosphere showing pieces of the planet terrain beneath'
-                elif mars_mass < data['pl_bmasse']:
-                    dataset.at[index, 'planet_spin'] = 'has wisps of clouds of various sizes speckling planet atmosphere showing most of the planet terrain beneath'
-            elif data['planet_category'] == 'neptune-like':
-                if data['pl_bmasse'] <= uranus_mass:
-                    dataset.at[index, 'planet_spin'] = 'has clearly defined striped light and dark icy clouds'
-                elif uranus_mass < data['pl_bmasse'] <= neptune_mass:
-                    dataset.at[index, 'planet_spin'] = 'has softly defined striped light and dark icy clouds'
-                elif neptune_mass < data['pl_bmasse']:
-                    dataset.at[index, 'planet_spin'] = 'has icy clouds with no apparent delineation between colors'
-            elif data['planet_category'] == 'gas-giant':
-                if data['pl_bmasse'] <= jupiter_mass:
-                    dataset.at[index, 'planet_spin'] = 'has stripes of thick clouds of various coloring defined by clear, sharp edges'
-                elif jupiter_mass < data['pl_bmasse'] <= saturn_mass:
-                    dataset.at[index, 'planet_spin'] = 'has stripes of thick clouds of various coloring defined by softened edges'
-                elif saturn_mass < data['pl_bmasse']:
-                    dataset.at[index, 'planet_spin'] = 'has thick clouds of various coloring blending together across the planet surface'
-            else:
-                dataset.at[index, 'planet_spin'] = 'rotates around its star'
+    pl_orbper = dataset['pl_orbper'].to_numpy(dtype='float64')
+    pl_bmasse = dataset['pl_bmasse'].to_numpy(dtype='float64')
+    planet_category = dataset['planet_category'].to_numpy(dtype=object)
+
+    #if there is no orbital period, go off planet mass and compare to the planets in our solar system
+    by_mass = rules.apply_ladders_by_category(rules.PLANET_SPIN_BY_MASS_COMPILED, planet_category, pl_bmasse)
+    by_mass[~np.isin(planet_category, list(rules.PLANET_SPIN_BY_MASS_COMPILED))] = rules.PLANET_SPIN_WITHOUT_CATEGORY
+
+    descriptions = np.select(
+        [pl_orbper != 0.0, pl_orbper == 0.0],
+        [rules.apply_ladders_by_category(rules.PLANET_SPIN_BY_PERIOD_COMPILED, planet_category, pl_orbper), by_mass],
+        default=None)
+
+    return rules.assign_descriptor(dataset, 'planet_spin', descriptions)
 
-    return dataset
-    
 #adding in a spin column, as the faster a planet spins, the more turbulent it's weather and the more likely it is to have clouds, banding, etc. 
 #this is the shortened description for the shorter prompt
 def get_planet_spin_short(dataset):
-    for index, data in dataset.iterrows():
-        #planet orbit periods
-        mercury_spin = 88
-        venus_spin = 224
-        earth_spin = 365
-        mars_spin = 687
-        jupiter_spin = 4332
-        saturn_spin = 10747
-        uranus_spin = 30589
-        neptune_spin = 59800 
-
-        #planet masses
-        mercury_mass = 0.0553
-        venus_mass = 0.815
-        earth_mass = 1.0
-        mars_mass = 0.107
-        jupiter_mass = 317.8
-        saturn_mass = 95.2
-        uranus_mass = 14.5
-        neptune_mass = 17.1
-
-        if data['pl_orbper'] != 0.0: #checking if there is an orbital period listed in the dataset
-            if data['planet_category'] == 'terrestrial' or data['planet_category'] == 'super-earth': 
-                if data['pl_orbper'] <= mercury_spin:
-                    dataset.at[index, 'planet_spin_short'] = 'is hot and rotating quickly with little to no clouds'
-                elif mercury_spin < data['pl_orbper'] <= venus_spin:
-                    dataset.at[index, 'planet_spin_short'] = 'is hot and rotating quickly hot with swirling clouds of light and dark markings'
-                elif venus_spin < data['pl_orbper'] <= earth_spin:
-                    dataset.at[index, 'planet_spin_short'] = 'has clouds of various sizes'
-                elif earth_spin < data['pl_orbper'] <= mars_spin:
-                    dataset.at[index, 'planet_spin_short'] = 'has clouds of various sizes'
-                elif mars_spin < data['pl_orbper']:
-                    dataset.at[index, 'planet_spin_short'] = 'has thin clouds of various sizes'
-            elif data['planet_category'] == 'neptune-like':
-                if data['pl_orbper'] <= uranus_spin:
-                    dataset.at[index, 'planet_spin_short'] = 'has clearly defined striped light and dark clouds'
-                elif uranus_spin < data['pl_orbper'] <= neptune_spin:
-                    dataset.at[index, 'planet_spin_short'] = 'has softly defined striped light and dark clouds'
-                elif neptune_spin < data['pl_orbper']:
-                    dataset.at[index, 'planet_spin_short'] = 'has cloud colors blending together'
-            elif data['planet_category'] == 'gas-giant':
-                if data['pl_orbper'] <= jupiter_spin:
-                    dataset.at[index, 'planet_spin_short'] = 'has clear, sharp-edge stripes of thick clouds'
-                elif jupiter_spin < data['pl_orbper'] <= saturn_spin:
-                    dataset.at[index, 'planet_spin_short'] = 'has soft-edged stripes of thick clouds'
-                elif saturn_spin < data['pl_orbper']:
-                    dataset.at[index, 'planet_spin_short'] = 'has thick clouds of various coloring blending together'
-        elif data['pl_orbper'] == 0.0:  #if zero go off planet mass and compare to the planets in our solar system
-            if data['planet_category'] == 'terrestrial' or data['planet_category'] == 'super-earth': 
-                if data['pl_bmasse'] <= mercury_mass:
-                    dataset.at[index, 'planet_spin_short'] = 'is hot and rotating quickly with little to no clouds'
-                elif mercury_mass < data['pl_bmasse'] <= venus_mass:
-                    dataset.at[index, 'planet_spin_short'] = 'is hot and rotating quickly hot with swirling clouds of light and dark markings'
-                elif venus_mass < data['pl_bmasse'] <= earth_mass:
-                    dataset.at[index, 'planet_spin_short'] = 'has thick clouds of various sizes'
-                elif earth_mass < data['pl_bmasse'] <= mars_mass:
-                    dataset.at[index, 'planet_spin_short'] = 'has thick clouds of various sizes'
-                elif mars_mass < data['pl_bmasse']:
-                    dataset.at[index, 'planet_spin_short'] = 'has thin clouds of various sizes'
-            elif data['planet_category'] == 'neptune-like':
-                if data['pl_bmasse'] <= uranus_mass:
-                    dataset.at[index, 'planet_spin_short'] = 'has clearly defined striped light and dark clouds'
-                elif uranus_mass < data['pl_bmasse'] <= neptune_mass:
-                    dataset.at[index, 'planet_spin_short'] = 'has softly defined striped light and dark icy clouds'
-                elif neptune_mass < data['pl_bmasse']:
-                    dataset.at[index, 'planet_spin_short'] = 'has cloud colors blending together'
-            elif data['planet_category'] == 'gas-giant':
-                if data['pl_bmasse'] <= jupiter_mass:
-                    dataset.at[index, 'planet_spin_short'] = 'has clear, sharp-edge stripes of thick clouds'
-                elif jupiter_mass < data['pl_bmasse'] <= saturn_mass:
-                    dataset.at[index, 'planet_spin_short'] = 'has soft-edged stripes of thick clouds'
-                elif saturn_mass < data['pl_bmasse']:
-                    dataset.at[index, 'planet_spin_short'] = 'has thick clouds of various coloring blending together'
-            else:
-                dataset.at[index, 'planet_spin_short'] = 'rotates around its star'
+    pl_orbper = dataset['pl_orbper'].to_numpy(dtype='float64')
+    pl_bmasse = dataset['pl_bmasse'].to_numpy(dtype='float64')
+    planet_category = dataset['planet_category'].to_numpy(dtype=object)
 
-    return dataset
+    #if there is no orbital period, go off planet mass and compare to the planets in our solar system
+    by_mass = rules.apply_ladders_by_category(rules.PLANET_SPIN_SHORT_BY_MASS_COMPILED, planet_category, pl_bmasse)
+    by_mass[~np.isin(planet_category, list(rules.PLANET_SPIN_SHORT_BY_MASS_COMPILED))] = rules.PLANET_SPIN_WITHOUT_CATEGORY
+
+    descriptions = np.select(
+        [pl_orbper != 0.0, pl_orbper == 0.0],
+        [rules.apply_ladders_by_category(rules.PLANET_SPIN_SHORT_BY_PERIOD_COMPILED, planet_category, pl_orbper), by_mass],
+        default=None)
+
+    return rules.assign_descriptor(dataset, 'planet_spin_short', descriptions)
 
 # ## Star and Planet Size as a Ratio
 # 
 # One way we want to define stellar and planet size (to be used for one of the four prompts) is as a ratio between the two. The below code defines this. 
 
 def calculate_stellar_planet_ratio(dataset):
-    dataset['stellar_planet_ratio'] = dataset.apply(lambda row:
-        ((row.st_mass / (row.pl_bmasse)) * 100)
-        if row.st_mass != 0 and row.pl_bmasse != 0 else 0, axis=1)
+    dataset['stellar_planet_ratio'] = physics.stellar_planet_ratio(dataset['st_mass'].to_numpy(), dataset['pl_bmasse'].to_numpy())
     return dataset
 
 # ## Tidal Locked Planets
@@ -550,23 +311,26 @@ def calculate_stellar_planet_ratio(dataset):
 #getting the roche limit so we can determine if a planet is tidal locked or not
 
 def calculate_roche_limit(dataset):
-    return (1.26 * dataset['pl_rade'] * (dataset['st_mass'] / dataset['pl_bmasse']) ** (1/3))\
-        .where((dataset['st_mass'] != 0) & (dataset['pl_bmasse'] != 0), 0)
+    limit = physics.roche_limit(dataset['pl_rade'].to_numpy(), dataset['st_mass'].to_numpy(), dataset['pl_bmasse'].to_numpy())
+    return pd.Series(limit, index=dataset.index)
 
 #determining if a planet is tidally locked or not
 def tidal_locking(dataset):
-    for index, data in dataset.iterrows():
-        if data['pl_imppar'] != 0.0 or data['pl_orbsmax'] != 0.0:
-            if data['pl_imppar'] or data['pl_orbsmax'] < data['roche_limit']:
-                dataset.at[index, 'tidal_locked'] = 'only has one side of the planet facing the sun. The side facing the sun is extremely hot and the side that faces away from the sun is dark and cold'
-            
-            elif data['pl_imppar'] or data['pl_orbsmax'] >= data['roche_limit']:
-                dataset.at[index, 'tidal_locked'] = 'spins around its orbit so both sides get heat from the sun'
-            
-        else:
-            dataset.at[index, 'tidal_locked'] = 0.0
-
-    return dataset
+    pl_imppar = dataset['pl_imppar'].to_numpy(dtype='float64')
+    pl_orbsmax = dataset['pl_orbsmax'].to_numpy(dtype='float64')
+    roche_limit = dataset['roche_limit'].to_numpy(dtype='float64')
+
+    has_orbit = (pl_imppar != 0.0) | (pl_orbsmax != 0.0)
+    descriptions = np.select(
+        [has_orbit & ((pl_imppar != 0.0) | (pl_orbsmax < roche_limit)),
+         has_orbit & (pl_orbsmax >= roche_limit),
+         ~has_orbit],
+        [np.full(len(dataset), rules.TIDAL_LOCKED, dtype=object),
+         np.full(len(dataset), rules.NOT_TIDAL_LOCKED, dtype=object),
+         np.full(len(dataset), 0.0, dtype=object)],
+        default=None)
+
+    return rules.assign_descriptor(dataset, 'tidal_locked', descriptions)
 
 # ## Getting Star Information
 
@@ -589,89 +353,25 @@ def tidal_locking(dataset):
 
 # #### Stellar Color
 
+# Each distinct spectral type is parsed once (see spectral_types.py) and its color worked out once, every row then takes the color of its type
 def get_stellar_color(dataset):
-    for index, data in dataset.iterrows():
-        if data['st_spectype'] != 0:
-            #harvard standard spectral classifications
-            if data['st_spectype'][0] == 'M' or data['st_spectype'][0] == 'm':
-                dataset.at[index, 'stellar_color'] = 'orange red'
-            elif data['st_spectype'][0] == 'K':
-                dataset.at[index, 'stellar_color'] = 'light orange'
-            elif data['st_spectype'][0] == 'G':
-                dataset.at[index, 'stellar_color'] = 'yellow'
-            elif data['st_spectype'][0] == 'F':
-                dataset.at[index, 'stellar_color'] = 'yellow white'
-            elif data['st_spectype'][0] == 'A':
-                dataset.at[index, 'stellar_color'] = 'white'
-            elif data['st_spectype'][0] == 'B':
-                dataset.at[index, 'stellar_color'] = 'blue white'
-            elif data['st_spectype'][0] == 'O':
-                dataset.at[index, 'stellar_color'] = 'blue'
-            #special case star classifications 
-            elif data['st_spectype'][0] == 'T': #late stage brown dwarf 
-                dataset.at[index, 'stellar_color'] = 'violet'
-            elif data['st_spectype'][0] == 'L': #early stage brown dwarf 
-                dataset.at[index, 'stellar_color'] = 'magenta'
-            elif data['st_spectype'] == 'WD' or data['st_spectype'][0] == 'D': #white dwarf
-                dataset.at[index, 'stellar_color'] = 'white'
-            elif data['st_spectype'][0] == 's':
-                if data['st_teff'] <= 3500.0:
-                    dataset.at[index, 'stellar_color'] = 'orange red'
-                elif 3500.0 < data['st_teff'] <= 5000.0:
-                    dataset.at[index, 'stellar_color'] = 'light orange'
-                elif 5000.0 < data['st_teff'] <= 6000.0:
-                    dataset.at[index, 'stellar_color'] = 'yellow'
-                elif  6000.0 < data['st_teff'] <= 7500.0:
-                    dataset.at[index, 'stellar_color'] = 'yellow white'
-                elif 7500.0 < data['st_teff'] <= 11000.0:
-                    dataset.at[index, 'stellar_color'] = 'white'
-                elif 11000.0 < data['st_teff'] <= 25000.0:
-                    dataset.at[index, 'stellar_color'] = 'blue white'
-                elif 25000.0 < data['st_teff'] <= 100000.0:
-                    dataset.at[index, 'stellar_color'] = 'blue'
-                elif 100000.0 < data['st_teff']:
-                    dataset.at[index, 'stellar_color'] = 'white'
-                       
-        elif data['st_spectype'] == 0:
-            #print(dataset.at[index, 'st_spectype'])
-            if data['st_teff'] <= 3500.0:
-                dataset.at[index, 'stellar_color'] = 'orange red'
-            elif 3500.0 < data['st_teff'] <= 5000.0:
-                dataset.at[index, 'stellar_color'] = 'light orange'
-            elif 5000.0 < data['st_teff'] <= 6000.0:
-                dataset.at[index, 'stellar_color'] = 'yellow'
-            elif  6000.0 < data['st_teff'] <= 7500.0:
-                dataset.at[index, 'stellar_color'] = 'yellow white'
-            elif 7500.0 < data['st_teff'] <= 11000.0:
-                dataset.at[index, 'stellar_color'] = 'white'
-            elif 11000.0 < data['st_teff'] <= 25000.0:
-                dataset.at[index, 'stellar_color'] = 'blue white'
-            elif 25000.0 < data['st_teff'] <= 100000.0:
-                dataset.at[index, 'stellar_color'] = 'blue'
-            elif 100000.0 < data['st_teff']:
-                dataset.at[index, 'stellar_color'] = 'white'
-
-        elif data['st_spectype'] == 0 & data['st_teff'] == 0:
-            #print(dataset.at[index, 'st_spectype'])
-            if data['st_mass'] <= 0.45:
-                dataset.at[index, 'stellar_color'] = 'orange red'
-            elif 0.45 < data['st_mass'] <= 0.8:
-                dataset.at[index, 'stellar_color'] = 'light orange'
-            elif 0.8 < data['st_mass'] <= 1.04:
-                dataset.at[index, 'stellar_color'] = 'yellow'
-            elif  1.04 < data['st_mass'] <= 1.4:
-                dataset.at[index, 'stellar_color'] = 'yellow white'
-            elif 1.4 < data['st_mass'] <= 2.1:
-                dataset.at[index, 'stellar_color'] = 'white'
-            elif 2.1 < data['st_mass'] <= 16:
-                dataset.at[index, 'stellar_color'] = 'blue white'
-            elif 16 < data['st_mass']:
-                dataset.at[index, 'stellar_color'] = 'blue'
+    st_spectype = dataset['st_spectype'].astype(object)
+    codes, types = spectral_types.lookup(st_spectype)
+    by_teff = rules.apply_ladder(rules.STELLAR_COLOR_BY_TEFF_COMPILED, dataset['st_teff'].to_numpy(dtype='float64'))
 
-        else:
-            dataset.at[index, 'stellar_color'] = 'unknown stellar color'
-            
-    return dataset
+    #harvard standard spectral classifications, plus the special case star classifications (brown dwarfs and white dwarfs)
+    type_colors = rules.apply_mapping(rules.STELLAR_COLOR_BY_SPECTRAL_CLASS, [parsed.spectral_class for parsed in types])
+    type_colors[[parsed.white_dwarf for parsed in types]] = 'white'
+    by_class = type_colors[codes]
+    #subdwarfs fall back on temperature
+    subdwarf = np.array([parsed.subdwarf for parsed in types], dtype=bool)[codes]
+    by_class[subdwarf] = by_teff[subdwarf]
+
+    #stars without a spectral type also go off temperature. The original st_mass fallback (st_spectype == 0 & st_teff == 0) could never be reached, since every missing spectral type is handled by temperature first
+    missing_spectype = (st_spectype == 0).to_numpy()
+    descriptions = np.where(missing_spectype, by_teff, by_class)
+
+    return rules.assign_descriptor(dataset, 'stellar_color', descriptions)
 
 # #### Stellar Size: As a Description
 
@@ -698,26 +398,16 @@ def get_stellar_color(dataset):
 #
 
 def stellar_mass_description(dataset):
-    for index, data in dataset.iterrows():
-        st_spectype = str(data['st_spectype'])
-        if st_spectype[0] == 'W' or st_spectype[0] == 'D' or st_spectype[0] == 'L' or st_spectype[0] == 'T' or st_spectype[0] == 's':
-            dataset.at[index, 'stellar_mass_description'] = 'tiny'
-        elif data['stellar_color'] == 'orange red':
-            dataset.at[index, 'stellar_mass_description'] = 'very small'
-        elif data['stellar_color'] == 'light orange':
-            dataset.at[index, 'stellar_mass_description'] = 'small'
-        elif data['stellar_color'] == 'yellow':
-            dataset.at[index, 'stellar_mass_description'] = 'medium small'
-        elif data['stellar_color'] == 'yellow white':
-            dataset.at[index, 'stellar_mass_description'] = 'medium'
-        elif data['stellar_color'] == 'white':
-            dataset.at[index, 'stellar_mass_description'] = 'large'
-        elif data['stellar_color'] == 'blue white':
-            dataset.at[index, 'stellar_mass_description'] = 'giant'
-        elif data['stellar_color'] == 'blue':
-            dataset.at[index, 'stellar_mass_description'] = 'massive'
-        else:
-            dataset.at[index, 'stellar_mass_description'] = 'unknown size'
+    codes, types = spectral_types.lookup(dataset['st_spectype'])
+    tiny = np.array([parsed.spectral_class in rules.TINY_SPECTRAL_CLASSES for parsed in types], dtype=bool)[codes]
+
+    descriptions = np.where(
+        tiny,
+        'tiny',
+        rules.apply_mapping(rules.STELLAR_MASS_DESCRIPTION_BY_COLOR, dataset['stellar_color']))
+    descriptions = np.where(pd.isna(descriptions), rules.STELLAR_MASS_DESCRIPTION_UNKNOWN, descriptions).astype(object)
+
+    dataset['stellar_mass_description'] = descriptions
     return dataset
 
 # ### Creating the Image Prompt
@@ -728,6 +418,26 @@ def stellar_mass_description(dataset):
 # 
 # "A solar system made up of {sy_pnum} planet(s), {sy_snum} star(s), and {sy_mnum} moon(s). This {planet_category} planet is {pl_bmasse} the size of earth, {planet_color}, and {planet_spin}. This planet {tidal_locked}. The planet\'s star is {stellar_color} and {st_mass} the size of our sun."
 
+PROMPT_TEMPLATES = {
+    #creating a prompt with star size and planet size as numbers (our foundation prompt)
+    'mass_prompt': "A solar system made up of {sy_pnum} planet(s), {sy_snum} star(s), and {sy_mnum} moon(s). This {planet_category} planet is {pl_bmasse_text} the size of earth, {planet_color} and {planet_spin}. This planet {tidal_locked_text}. The planet\'s star is {stellar_color} and {st_mass_text} the size of the sun.",
+    #creating a prompt with star size and planet size as a ratio
+    'ratio_prompt': "A solar system made up of {sy_pnum} planet(s), {sy_snum} star(s), and {sy_mnum} moon(s). This {planet_category} planet is {pl_bmasse_text} the size of earth, {planet_color} and {planet_spin}. This planet {tidal_locked_text}. The planet\'s star is {stellar_color} and {stellar_planet_ratio} the size of it\'s planet.",
+    #creating a prompt with star and planet size as text
+    'size_text_prompt': "A solar system made up of {sy_pnum} planet(s), {sy_snum} star(s), and {sy_mnum} moon(s). This {planet_mass_description} {planet_category} planet {planet_color}. This planet {planet_spin}. The planet\'s star is {tidal_locked_text} and {stellar_color}.",
+    #creating a prompt with 75 tokens
+    '75_tokens': 'A {stellar_color}, {stellar_mass_description} star with a {planet_mass_description}, {planet_category} planet. The planet {planet_color_short}, {planet_spin_short}, and {tidal_locked}',
+}
+
+# every prompt is built from these already binned columns, plus the three numbers below that change from planet to planet
+PROMPT_KEY_COLUMNS = ['sy_pnum', 'sy_snum', 'sy_mnum', 'planet_category', 'planet_mass_description', 'planet_color', 'planet_color_short',
+                      'planet_spin', 'planet_spin_short', 'tidal_locked', 'stellar_color', 'stellar_mass_description']
+
+def prompt_key_fields(data):
+    fields = {column: data[column] for column in PROMPT_KEY_COLUMNS}
+    fields['tidal_locked_text'] = f"{data['tidal_locked']}" if data['tidal_locked'] != 0 else 'has an unknown spin'
+    return fields
+
 def get_prompts(dataset):
     for index, data in dataset.iterrows():
 
@@ -735,92 +445,379 @@ def get_prompts(dataset):
         #also means we are getting rid of this f"{data['pl_bmasse']} times" if data['pl_bmasse'] != 0 else "an unknown size compared to" and this f"{data['st_mass']} times" if 'st_mass' != 0 else "an unknown size compared to"
         st_mass_int = int(data['st_mass'])
 
-        #creating a prompt with star size and planet size as numbers (our foundation prompt)
-        dataset.at[index, 'mass_prompt'] = "A solar system made up of {} planet(s), {} star(s), and {} moon(s). This {} planet is {} the size of earth, {} and {}. This planet {}. The planet\'s star is {} and {} the size of the sun.".format(
-            data['sy_pnum'], data['sy_snum'], data['sy_mnum'], data['planet_category'], f"{pl_bmasse_int} times" if pl_bmasse_int != 0 else "an unknown size compared to", data['planet_color'], data['planet_spin'], f"{data['tidal_locked']}" if data['tidal_locked'] != 0 else 'has an unknown spin', data['stellar_color'], f"{st_mass_int} times" if st_mass_int != 0 else "an unknown size compared to")
+        fields = prompt_key_fields(data)
+        fields['pl_bmasse_text'] = f"{pl_bmasse_int} times" if pl_bmasse_int != 0 else "an unknown size compared to"
+        fields['st_mass_text'] = f"{st_mass_int} times" if st_mass_int != 0 else "an unknown size compared to"
+        fields['stellar_planet_ratio'] = data['stellar_planet_ratio']
 
-        #creating a prompt with star size and planet size as a ratio
-        dataset.at[index, 'ratio_prompt'] = "A solar system made up of {} planet(s), {} star(s), and {} moon(s). This {} planet is {} the size of earth, {} and {}. This planet {}. The planet\'s star is {} and {} the size of it\'s planet.".format(
-            data['sy_pnum'], data['sy_snum'], data['sy_mnum'], data['planet_category'], f"{pl_bmasse_int} times" if pl_bmasse_int != 0 else "an unknown size compared to", data['planet_color'], data['planet_spin'], f"{data['tidal_locked']}" if data['tidal_locked'] != 0 else 'has an unknown spin', data['stellar_color'], data['stellar_planet_ratio'])
+        for column, template in PROMPT_TEMPLATES.items():
+            dataset.at[index, column] = template.format(**fields)
 
-        #creating a prompt with star and planet size as text
-        dataset.at[index, 'size_text_prompt'] = "A solar system made up of {} planet(s), {} star(s), and {} moon(s). This {} {} planet {}. This planet {}. The planet\'s star is {} and {}.".format(
-            data['sy_pnum'], data['sy_snum'], data['sy_mnum'], data['planet_mass_description'], data['planet_category'], data['planet_color'], data['planet_spin'], f"{data['tidal_locked']}" if data['tidal_locked'] != 0 else 'has an unknown spin', data['stellar_color'], data['stellar_mass_description'])
-        
-        #creating a prompt with 75 tokens
-        dataset.at[index, '75_tokens'] = 'A {}, {} star with a {}, {} planet. The planet {}, {}, and {}'.format(data['stellar_color'], data['stellar_mass_description'], data['planet_mass_description'], data['planet_category'], data['planet_color_short'], data['planet_spin_short'], data['tidal_locked'])
+    return dataset
+
+# ### Rendering Each Prompt Once
+# There are only a few hundred different combinations of the binned columns across thousands of planets, so instead of formatting every row we format each template once per combination, with markers where the per-planet numbers go. The marked text is split into pieces, and every row's prompt is put together by whole-column string concatenation of its combination's pieces and its own numbers. The result is the same text get_prompts writes.
+
+def prompt_number_columns(dataset):
+    pl_bmasse_int = np.trunc(dataset['pl_bmasse'].to_numpy(dtype='float64')).astype('int64')
+    st_mass_int = np.trunc(dataset['st_mass'].to_numpy(dtype='float64')).astype('int64')
+
+    return {
+        'pl_bmasse_text': np.where(pl_bmasse_int != 0, pl_bmasse_int.astype(str).astype(object) + ' times', 'an unknown size compared to').astype(object),
+        'st_mass_text': np.where(st_mass_int != 0, st_mass_int.astype(str).astype(object) + ' times', 'an unknown size compared to').astype(object),
+        'stellar_planet_ratio': dataset['stellar_planet_ratio'].astype(str).to_numpy(dtype=object),
+    }
+
+def get_unique_prompts(dataset):
+    if dataset.empty:
+        return dataset
+
+    keys = dataset[PROMPT_KEY_COLUMNS]
+    key_ids = keys.groupby(PROMPT_KEY_COLUMNS, dropna=False, sort=False, observed=True).ngroup().to_numpy()
+    first_rows = np.unique(key_ids, return_index=True)[1]
+
+    numbers = prompt_number_columns(dataset)
+    markers = {name: f'\0{name}\0' for name in numbers}
+
+    # pieces[column] holds one row per combination: text, number name, text, number name, ..., text
+    pieces = {column: [] for column in PROMPT_TEMPLATES}
+    for _, data in keys.iloc[first_rows].iterrows():
+        fields = {**prompt_key_fields(data), **markers}
+        for column, template in PROMPT_TEMPLATES.items():
+            pieces[column].append(template.format(**fields).split('\0'))
+
+    for column, template_pieces in pieces.items():
+        template_pieces = np.array(template_pieces, dtype=object)
+        prompts = template_pieces[key_ids, 0]
+        for i in range(1, template_pieces.shape[1], 2):
+            prompts = prompts + numbers[template_pieces[0, i]] + template_pieces[key_ids, i + 1]
+        dataset[column] = prompts
+
+    return dataset
+
+# ## Compact Schema
+# The descriptor columns repeat a few long sentences (some planet_color entries are over 250 characters) in every row, and every numeric column is held as float64 or object. compact_dataset stores the repeated text as pandas Categoricals (each sentence is kept once and the rows only hold a small code), the sy_* counts as the smallest integer type that fits and the physics columns as float32. Columns that are only needed to build other columns can be dropped once they have been used.
+
+DESCRIPTOR_COLUMNS = ['planet_category', 'planet_mass_description', 'planet_color', 'planet_color_short', 'planet_spin', 'planet_spin_short',
+                      'tidal_locked', 'stellar_color', 'stellar_mass_description']
+
+COUNT_COLUMNS = ['sy_snum', 'sy_pnum', 'sy_mnum']
+
+PHYSICS_COLUMNS = str_to_float_cols + ['stellar_planet_ratio', 'roche_limit']
+
+# only read by later steps of the pipeline (tidal_locking and the 75 token prompt)
+INTERMEDIATE_COLUMNS = ['roche_limit', 'planet_color_short', 'planet_spin_short']
+
+# a text column is only worth turning into a Categorical when its values repeat
+def compact_text_columns(dataset, columns, max_unique_ratio=0.5):
+    for col in columns:
+        if col in dataset and dataset[col].dtype == object and dataset[col].nunique(dropna=False) <= max_unique_ratio * len(dataset):
+            dataset[col] = dataset[col].astype('category')
+    return dataset
+
+def compact_numeric_columns(dataset):
+    for col in COUNT_COLUMNS:
+        if col in dataset and (dataset[col] % 1 == 0).all():
+            dataset[col] = pd.to_numeric(dataset[col], downcast='integer')
+
+    for col in PHYSICS_COLUMNS:
+        if col in dataset:
+            dataset[col] = dataset[col].astype('float32')
+    return dataset
+
+def compact_dataset(dataset, drop_columns=()):
+    dataset = compact_text_columns(dataset, DESCRIPTOR_COLUMNS + list(PROMPT_TEMPLATES))
+    dataset = compact_numeric_columns(dataset)
+    return dataset.drop(columns=[col for col in drop_columns if col in dataset])
+
+# dtype and bytes of each column (deep, so the text itself is counted and not just the pointers to it)
+def column_memory(dataset):
+    return pd.DataFrame({'dtype': dataset.dtypes.astype(str), 'bytes': dataset.memory_usage(index=False, deep=True)})
+
+def memory_report(before, after):
+    report = pd.DataFrame({
+        'dtype_before': before['dtype'],
+        'bytes_before': before['bytes'],
+        'dtype_after': after['dtype'].reindex(before.index, fill_value='dropped'),
+        'bytes_after': after['bytes'].reindex(before.index, fill_value=0),
+    })
+    report.loc['total'] = ['', report['bytes_before'].sum(), '', report['bytes_after'].sum()]
+    report['reduction'] = 1 - report['bytes_after'] / report['bytes_before']
+    return report
+
+def print_memory_report(name, report):
+    print(f"{name}: {report.at['total', 'bytes_before'] / 1e6:.1f} MB -> {report.at['total', 'bytes_after'] / 1e6:.1f} MB")
+    print(report.to_string(formatters={'reduction': '{:.0%}'.format}))
+
+# ## Pipeline Stages
+# Every step of the pipeline is a stage that declares the columns it reads and the columns it writes. run_pipeline works out the order from those declarations (a stage runs after every other stage that writes a column it reads), runs the stages that do not depend on each other at the same time on a thread pool, and when a caller only asks for some columns it skips every stage those columns do not need.
+
+Stage = namedtuple('Stage', ['name', 'function', 'reads', 'writes'])
+
+def add_roche_limit(dataset):
+    dataset['roche_limit'] = calculate_roche_limit(dataset)
+    return dataset
+
+def add_prompts(dataset, unique_prompts=False):
+    return get_unique_prompts(dataset) if unique_prompts else get_prompts(dataset)
+
+# listed in the order the steps used to run in, which is also the order their new columns end up in
+def pipeline_stages(by_mass=None, unique_prompts=False):
+    planet = ['pl_eqt', 'pl_bmasse', 'planet_category']
+    spin = ['pl_orbper', 'pl_bmasse', 'planet_category']
+    return [
+        Stage('planet_category', partial(get_planet_category, by_mass=by_mass), ['pl_bmasse', 'pl_rade'], ['planet_category']),
+        Stage('planet_mass_description', planet_mass_description, ['pl_bmasse', 'planet_category'], ['planet_mass_description']),
+        Stage('planet_color', get_planet_description, planet, ['planet_color']),
+        Stage('planet_color_short', get_planet_description_short, planet, ['planet_color_short']),
+        Stage('orbital_period', get_orbital_period, ['pl_orbper', 'pl_orbsmax'], ['pl_orbper']),
+        Stage('planet_spin', get_planet_spin, spin, ['planet_spin']),
+        Stage('planet_spin_short', get_planet_spin_short, spin, ['planet_spin_short']),
+        Stage('roche_limit', add_roche_limit, ['pl_rade', 'st_mass', 'pl_bmasse'], ['roche_limit']),
+        Stage('tidal_locked', tidal_locking, ['pl_imppar', 'pl_orbsmax', 'roche_limit'], ['tidal_locked']),
+        Stage('stellar_planet_ratio', calculate_stellar_planet_ratio, ['st_mass', 'pl_bmasse'], ['stellar_planet_ratio']),
+        Stage('stellar_color', get_stellar_color, ['st_spectype', 'st_teff'], ['stellar_color']),
+        Stage('stellar_mass_description', stellar_mass_description, ['st_spectype', 'stellar_color'], ['stellar_mass_description']),
+        Stage('prompts', partial(add_prompts, unique_prompts=unique_prompts), PROMPT_KEY_COLUMNS + ['pl_bmasse', 'st_mass', 'stellar_planet_ratio'], list(PROMPT_TEMPLATES)),
+    ]
+
+# for each stage, the positions of the other stages that write a column it reads
+def stage_dependencies(stages):
+    writers = {}
+    for i, stage in enumerate(stages):
+        for col in stage.writes:
+            writers.setdefault(col, set()).add(i)
+    return [{j for col in stage.reads for j in writers.get(col, ()) if j != i} for i, stage in enumerate(stages)]
+
+# a stage runs as soon as everything it reads has been written, ties are broken by the order the stages are listed in
+def order_stages(stages):
+    dependencies = stage_dependencies(stages)
+    ordered = []
+    while len(ordered) < len(stages):
+        ready = [i for i in range(len(stages)) if i not in ordered and dependencies[i] <= set(ordered)]
+        if not ready:
+            raise ValueError("These stages read each other's columns in a cycle: " + ", ".join(stages[i].name for i in range(len(stages)) if i not in ordered))
+        ordered.append(ready[0])
+    return [stages[i] for i in ordered]
+
+# the stages that write the requested columns, and the stages they need in turn
+def select_stages(stages, columns):
+    needed = set(columns)
+    selected = set()
+    while True:
+        new = {i for i, stage in enumerate(stages) if i not in selected and needed.intersection(stage.writes)}
+        if not new:
+            return [stage for i, stage in enumerate(stages) if i in selected]
+        selected |= new
+        for i in new:
+            needed.update(stages[i].reads)
+
+def run_stage(stage, dataset):
+    start = time.perf_counter()
+    result = stage.function(dataset)
+    return [result[col] for col in stage.writes], time.perf_counter() - start
+
+# The columns of each stage are written back to the dataset in order, so the result (and the column order) is the same however many threads run the stages. Timings are added to the timings dict by stage name when one is passed.
+def run_pipeline(dataset, stages, columns=None, threads=1, timings=None):
+    if columns is not None:
+        stages = select_stages(stages, columns)
+    stages = order_stages(stages)
+    dependencies = stage_dependencies(stages)
+
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        running = {}
+        for i, stage in enumerate(stages):
+            # start every stage whose inputs have all been written to the dataset. Each one gets a shallow copy, taken here before the dataset changes again, so the columns it adds stay out of the dataset the other stages are reading
+            for j in range(i, len(stages)):
+                if j not in running and all(k < i for k in dependencies[j]):
+                    running[j] = executor.submit(run_stage, stages[j], dataset.copy(deep=False))
+
+            values, elapsed = running.pop(i).result()
+            for col, value in zip(stage.writes, values):
+                dataset[col] = value
+            if timings is not None:
+                timings[stage.name] = timings.get(stage.name, 0.0) + elapsed
+    return dataset
+
+def print_stage_timings(name, timings):
+    total = sum(timings.values())
+    print(f"{name}: {total:.2f} s in stages")
+    for stage, elapsed in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        print(f"  {stage:<26}{elapsed:>10.4f} s{elapsed / total if total else 0:>8.1%}")
+
+# ## Running the Whole Pipeline
+# Every step only looks at its own row, so the same pipeline can run on a whole dataset or on one chunk of it at a time.
 
+# columns limits the run to the stages those columns need (None runs all of them), and threads is the number of stages that can run at the same time. With compact=True the descriptor, prompt and numeric columns are shrunk once the prompts have been built (the prompts come out the same).
+def generate_prompts(dataset, by_mass=None, unique_prompts=False, compact=False, drop_columns=(), columns=None, threads=1, timings=None):
+    dataset = run_pipeline(dataset, pipeline_stages(by_mass, unique_prompts), columns, threads, timings)
+
+    if compact:
+        dataset = compact_dataset(dataset, drop_columns)
+
+    return dataset
+
+# ## Saving the Datasets
+# CSV stays the default. Parquet (which needs pyarrow) stores each column on its own, so a loader can read just the prompt columns it needs instead of parsing the whole 146 MB of text again. The descriptor and prompt columns are written as dictionaries, each sentence once per row group and a small code per row, and every row group keeps min/max statistics for each column so read_prompts filters can skip the row groups that cannot match. Parquet files read back with those columns as Categoricals.
+
+OUTPUT_FORMATS = ['csv', 'parquet', 'both']
+
+PARQUET_ROW_GROUP_SIZE = 100000
+
+def output_paths(name, output_format='csv'):
+    extensions = ['csv', 'parquet'] if output_format == 'both' else [output_format]
+    return [f'{name}.{extension}' for extension in extensions]
+
+# fillna(0) leaves the number 0 in the empty cells of the text columns, which a Parquet string column cannot hold, so it is stored as the text the CSV would have
+def text_columns_as_strings(dataset):
+    for col in dataset.columns[dataset.dtypes == object]:
+        values = dataset[col]
+        not_text = values.notna() & ~values.map(lambda value: isinstance(value, str))
+        if not_text.any():
+            dataset[col] = values.where(~not_text, values.astype(str))
     return dataset
 
-def save_datasets(exoplanet_data, training_data):
-    exoplanet_data.to_csv('exoplanet_data_prompts.csv', index=False)
+def write_parquet(dataset, path, row_group_size=PARQUET_ROW_GROUP_SIZE):
+    # a shallow copy, so the caller's columns are left as they are
+    dataset = text_columns_as_strings(dataset.copy(deep=False))
+    dataset = compact_text_columns(dataset, DESCRIPTOR_COLUMNS + list(PROMPT_TEMPLATES), max_unique_ratio=1)
+    dataset.to_parquet(path, engine='pyarrow', index=False, row_group_size=row_group_size, write_statistics=True)
+
+def write_dataset(dataset, path):
+    if path.endswith('.parquet'):
+        write_parquet(dataset, path)
+    else:
+        dataset.to_csv(path, index=False)
+
+# Loads a saved dataset in either format. columns picks the columns to read (the others are never parsed), and for Parquet filters takes pyarrow filters such as [('pl_bmasse', '>', 10)] that skip row groups by their statistics.
+def read_prompts(path, columns=None, filters=None):
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path, engine='pyarrow', columns=columns, filters=filters)
+    if filters is not None:
+        raise ValueError("filters can only be used when reading a .parquet file")
+    # round_trip parses every float back to exactly the value that was written
+    return pd.read_csv(path, usecols=columns, low_memory=False, float_precision='round_trip')
+
+def save_datasets(exoplanet_data, training_data, output_format='csv'):
+    for path in output_paths('exoplanet_data_prompts', output_format):
+        write_dataset(exoplanet_data, path)
+    for path in output_paths('training_data_prompts', output_format):
+        write_dataset(training_data, path)
+
+# ## Streaming and Incremental Runs
+# catalog_streaming and incremental_regeneration are given the parts of the pipeline they run as these tuples, instead of importing this file. They are built when a run starts, so that under --profile-report they hold the instrumented functions (the ones the worker processes can unpickle by name).
+
+# Preprocesses one chunk of the catalog and generates its prompts, in the worker processes of a stream
+def generate_exoplanet_chunk(chunk, float_dtypes, by_mass, unique_prompts=False, columns=None):
+    return generate_prompts(preprocess_exoplanet_data(chunk, float_dtypes), by_mass, unique_prompts, columns=columns)
+
+def chunk_pipeline():
+    return catalog_streaming.ChunkPipeline(open_catalog, str_to_float_cols, generate_exoplanet_chunk)
+
+# pl_orbper is filled in by the pipeline, the rest are written from scratch (the catalog that ships with the repository already has a copy of them from an earlier run)
+GENERATED_COLUMNS = ['pl_orbper'] + DESCRIPTOR_COLUMNS + ['stellar_planet_ratio', 'roche_limit'] + list(PROMPT_TEMPLATES)
+
+def incremental_pipeline():
+    return incremental_regeneration.IncrementalPipeline(generate_prompts, read_prompts, compact_dataset, str_to_float_cols, GENERATED_COLUMNS, PROMPT_TEMPLATES)
+
+# ## Command Line
+# The path of the spectral type index, or None when the run does not keep one
+def spectral_index_path(args):
+    if args.spectral_index is None:
+        return None
+    return args.spectral_index or spectral_types.index_path_next_to(output_paths('exoplanet_data_prompts')[0])
+
+def generate_datasets(args):
+    # Load and preprocess training data and exoplanet data from CSV files
+    training_data, exoplanet_data = preprocess_data(args.training_data, args.exoplanet_data, args.typed_ingest, args.csv_engine)
+    if args.typed_ingest:
+        for path, schema in [(args.training_data, TRAINING_SCHEMA), (args.exoplanet_data, CATALOG_SCHEMA)]:
+            left_out = typed_ingest_left_out(path, schema)
+            if left_out:
+                print(f"--typed-ingest left {len(left_out)} columns of {path} out of the saved dataset: {', '.join(map(repr, left_out))}")
+
+    # Generate the descriptions and prompts for both datasets, side by side when there is more than one thread
+    drop_columns = INTERMEDIATE_COLUMNS if args.drop_intermediate else ()
+    training_timings = {} if args.timings else None
+    exoplanet_timings = {} if args.timings else None
+    options = dict(unique_prompts=args.unique_prompts, drop_columns=drop_columns, columns=args.columns, threads=args.threads)
+    with ThreadPoolExecutor(max_workers=2 if args.threads > 1 else 1) as executor:
+        training_future = executor.submit(generate_prompts, training_data, compact=args.compact, timings=training_timings, **options)
+        if args.incremental:
+            # the previous output is read back from the Parquet file when there is one, it keeps the exact dtypes
+            previous_path = output_paths('exoplanet_data_prompts', args.output_format)[-1]
+            exoplanet_future = executor.submit(incremental_regeneration.generate_prompts_incremental, incremental_pipeline(), exoplanet_data, previous_path, args.manifest,
+                                               compact=args.compact and not args.memory_report, timings=exoplanet_timings, **options)
+        else:
+            exoplanet_future = executor.submit(generate_prompts, exoplanet_data, compact=args.compact and not args.memory_report, timings=exoplanet_timings, **options)
+        training_data = training_future.result()
+        if args.incremental:
+            exoplanet_data, manifest, changed = exoplanet_future.result()
+            print(f"{changed} of {len(exoplanet_data)} planets are new or changed")
+        else:
+            exoplanet_data = exoplanet_future.result()
+
+    if args.timings:
+        print_stage_timings('training data', training_timings)
+        print_stage_timings('exoplanet data', exoplanet_timings)
+
+    if args.memory_report:
+        before = column_memory(exoplanet_data)
+        exoplanet_data = compact_dataset(exoplanet_data, drop_columns)
+        print_memory_report('exoplanet data', memory_report(before, column_memory(exoplanet_data)))
+
+    save_datasets(exoplanet_data, training_data, args.output_format)
+    if args.incremental:
+        incremental_regeneration.save_manifest(args.manifest, manifest)
+
+def stream_datasets(args):
+    # the training data is small, only the exoplanet data is streamed (and split between the workers). Each chunk is written and let go straight away
+    training_data = preprocess_training_data(pd.read_csv(args.training_data))
+    training_data = generate_prompts(training_data, unique_prompts=args.unique_prompts, columns=args.columns, threads=args.threads)
+    catalog_streaming.stream_exoplanet_prompts(chunk_pipeline(), args.exoplanet_data, chunksize=args.chunksize, max_memory_mb=args.max_memory_mb, workers=args.workers,
+                                               unique_prompts=args.unique_prompts, columns=args.columns)
     training_data.to_csv('training_data_prompts.csv', index=False)
 
+def streaming(args):
+    return args.chunksize is not None or args.max_memory_mb is not None or args.workers > 1
+
+# the options of the whole-dataset run: a stream writes each chunk as CSV and lets it go, so none of them can be used with it
+WHOLE_DATASET_OPTIONS = ['compact', 'drop_intermediate', 'memory_report', 'output_format', 'timings', 'incremental', 'manifest', 'typed_ingest', 'csv_engine']
+
+def check_options(parser, args):
+    given = ['--' + option.replace('_', '-') for option in WHOLE_DATASET_OPTIONS if getattr(args, option) != parser.get_default(option)]
+    if streaming(args) and given:
+        parser.error(f"{', '.join(given)} cannot be used with --chunksize, --max-memory-mb or --workers")
+
+def run(args):
+    # the spectral types parsed by earlier runs (the worker processes of a stream get them too, they are forked from this one)
+    index_path = spectral_index_path(args)
+    if index_path:
+        spectral_types.load_index(index_path)
+    if streaming(args):
+        stream_datasets(args)
+    else:
+        generate_datasets(args)
+    if index_path:
+        spectral_types.save_index(index_path)
+
 def main():
     parser = setup_argparse()
     args = parser.parse_args()
-
-    # Load training data and exoplanet data from CSV files
-    training_data = pd.read_csv(args.training_data)
-    exoplanet_data = pd.read_csv(args.exoplanet_data)
-
-    # Preprocess the data using the common preprocessing functions
-    training_data = preprocess_data(training_data)
-    exoplanet_data = preprocess_data(exoplanet_data)
-
-    # get planet category
-    training_data = get_planet_category(training_data)
-    exoplanet_data = get_planet_category(exoplanet_data)
-    
-    # get planet mass description
-    training_data = planet_mass_description(training_data)
-    exoplanet_data = planet_mass_description(exoplanet_data)
-    
-    #get planet color
-    training_data = planet_description(training_data)
-    exoplanet_data = planet_description(exoplanet_data)
-    
-    # get planet description - short
-    training_data = planet_description_short(training_data)
-    exoplanet_data = planet_description_short(exoplanet_data)
-    
-    # get orbital period
-    training_data = get_orbital_period(training_data)
-    exoplanet_data = get_orbital_period(exoplanet_data)
-    
-    # get planet_spin
-    training_data = get_planet_spin(training_data)
-    exoplanet_data = get_planet_spin(exoplanet_data)
-    
-    # get planet_spin - short
-    training_data = get_planet_spin_short(training_data)
-    exoplanet_data = get_planet_spin_short(exoplanet_data)
-    
-    #get tidal locking
-    training_data = tidal_locked(training_data)
-    exoplanet_data = tidal_locked(exoplanet_data)
-    
-    # Calculate the stellar-planet ratio for both datasets
-    exoplanet_data = calculate_stellar_planet_ratio(exoplanet_data)
-    training_data = calculate_stellar_planet_ratio(training_data)
-    
-    #get stellar color
-    training_data = get_stellar_color(training_data)
-    exoplanet_data = get_stellar_color(exoplanet_data)
-    
-    #get stellar mass description
-    training_data = stellar_mass_description(training_data)
-    exoplanet_data = stellar_mass_description(exoplanet_data)
-    
-    # Calculate Roche limit for both datasets
-    exoplanet_data['roche_limit'] = calculate_roche_limit(exoplanet_data)
-    training_data['roche_limit'] = calculate_roche_limit(training_data)
-    
-    # Generate prompts for both datasets
-    exoplanet_data = get_prompts(exoplanet_data)
-    training_data = get_prompts(training_data)
-    
-    save_datasets(exoplanet_data, training_data)
+    check_options(parser, args)
+
+    if not args.profile_report:
+        run(args)
+        return
+
+    # with --workers the shards are generated in other processes, so only the time spent waiting on them is recorded here
+    profiler = instrumentation.Profiler(args.trace_allocations, args.profile_stage, args.profile_output)
+    for module in [sys.modules[__name__], catalog_streaming, incremental_regeneration]:
+        instrumentation.instrument_module(module, profiler)
+    try:
+        run(args)
+    finally:
+        instrumentation.print_report(profiler.write_report(args.profile_report))
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,274 @@
+### Prompt Service
+# A local HTTP service that generates prompts on demand, for planets that are not in the published CSV yet (for example from parameters entered in a UI). The descriptor rules are compiled once when the service starts and every request reuses them.
+#
+#   POST /prompts          one planet as a JSON object, or a JSON list of planets, with the raw catalog parameters (see PARAMETER_COLUMNS, a missing value is 0 like in the catalog). Returns the four prompts for each.
+#   GET  /planets/<name>   the published prompts of an existing planet, looked up by pl_name in the output loaded with --prompts
+#   GET  /metrics          request counts, p50/p99 latency per endpoint (every route, /metrics and unknown paths included) and cache hits
+#
+# Answers are kept in a bounded LRU cache keyed by the parameters the prompts depend on, so asking for the same planet twice does not run the pipeline again. A planet that another request is already generating is not generated a second time: the request waits for that answer instead. The planets of a batch that are not cached are generated together, in one pass of the pipeline. The numbers are held in the same dtypes as the published catalog and planets are categorized by mass like it is (--categorize-by radius to change that), so a planet with the same values gets the same prompts as in the CSV. A description none of the rules can give comes out as 0, as it does for the catalog's planets.
+#
+# Run from the repository root:
+#   python prompt_service.py --prompts exoplanet_data_prompts.csv --port 8000
+#   curl -s localhost:8000/prompts -d '{"pl_bmasse": 5.2, "pl_rade": 1.7, "pl_eqt": 320, "st_spectype": "G2 V", "st_teff": 5700, "st_mass": 1}'
+
+import argparse
+import json
+import math
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+import numpy as np
+import pandas as pd
+
+import prompt_generator_functions as pgf
+import spectral_types
+
+NAME_COLUMNS = ['pl_name', 'hostname']
+COUNT_COLUMNS = ['sy_snum', 'sy_pnum', 'sy_mnum']
+PARAMETER_COLUMNS = COUNT_COLUMNS + pgf.str_to_float_cols + ['st_spectype']
+PROMPT_COLUMNS = list(pgf.PROMPT_TEMPLATES)
+
+# the dtypes preprocess_exoplanet_data ends up with on the shipped catalog (its orbital periods do not all fit in float32)
+CATALOG_FLOAT_DTYPES = {**dict.fromkeys(pgf.str_to_float_cols, 'float32'), 'pl_orbper': 'float64'}
+
+DEFAULT_CACHE_SIZE = 10000
+# latencies kept per endpoint for the percentiles
+LATENCY_WINDOW = 10000
+
+class RequestError(ValueError):
+    pass
+
+def setup_argparse():
+    parser = argparse.ArgumentParser(description="Local HTTP service that generates exoplanet prompts on demand")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to listen on")
+    parser.add_argument("--port", type=int, default=8000, help="Port to listen on")
+    parser.add_argument("--prompts", default=None, help="Published prompts (exoplanet_data_prompts.csv or .parquet) to answer /planets lookups from")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE, help="Number of generated answers kept in the LRU cache")
+    parser.add_argument("--categorize-by", choices=["mass", "radius"], default="mass", help="Categorize planets by mass (like the published catalog) or by radius")
+    parser.add_argument("--spectral-index", default=None, help="Start from the parsed spectral types of this JSON file (see prompt_generator_functions.py --spectral-index)")
+    return parser
+
+# Turns one planet of a request into the values the pipeline reads, in PARAMETER_COLUMNS order, plus its names
+def normalize_planet(planet):
+    if not isinstance(planet, dict):
+        raise RequestError("every planet must be a JSON object")
+    unknown = sorted(set(planet) - set(NAME_COLUMNS + PARAMETER_COLUMNS))
+    if unknown:
+        raise RequestError(f"unknown parameters: {', '.join(unknown)}")
+
+    values = []
+    for col in PARAMETER_COLUMNS:
+        value = planet.get(col)
+        if col == 'st_spectype':
+            if value is not None and not isinstance(value, str):
+                raise RequestError("st_spectype must be a string")
+            values.append(value or 0)
+            continue
+        if value is None:
+            value = 0
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            raise RequestError(f"{col} must be a number")
+        # the value the pipeline would hold, so planets that only differ past float32 precision share a cache entry. JSON lets NaN and Infinity through, and a number too large for the column's dtype becomes infinite; no rule can describe either
+        try:
+            with np.errstate(over='ignore'):
+                value = float(np.dtype(CATALOG_FLOAT_DTYPES.get(col, 'float64')).type(value))
+        except OverflowError:
+            value = math.inf
+        if not math.isfinite(value):
+            raise RequestError(f"{col} must be a finite number")
+        values.append(value)
+    names = {col: planet[col] for col in NAME_COLUMNS if planet.get(col) is not None}
+    return tuple(values), names
+
+def planets_frame(keys):
+    frame = pd.DataFrame(list(keys), columns=PARAMETER_COLUMNS)
+    frame['st_spectype'] = frame['st_spectype'].astype(object)
+    frame = frame.astype(CATALOG_FLOAT_DTYPES)
+    # the catalog's rows always have a name, and the descriptors of its earlier run (0 where that run had none, which is where the pipeline keeps them)
+    frame.insert(0, 'pl_name', pd.Series(0, index=frame.index, dtype=object))
+    for col in pgf.DESCRIPTOR_COLUMNS:
+        frame[col] = pd.Series(0, index=frame.index, dtype=object)
+    return frame
+
+def load_published_prompts(path):
+    published = pgf.read_prompts(path, columns=['pl_name'] + PROMPT_COLUMNS)
+    published = published[published['pl_name'].notna() & (published['pl_name'].astype(str) != '0')]
+    index = {}
+    for row in published.to_dict('records'):
+        index.setdefault(str(row['pl_name']), []).append(row)
+    return index
+
+class PromptService:
+    def __init__(self, cache_size=DEFAULT_CACHE_SIZE, by_mass=True, published=None):
+        self.cache_size = cache_size
+        self.by_mass = by_mass
+        self.published = published or {}
+        self.cache = OrderedDict()
+        # the keys being generated, each with the Future its answer will be set on, guarded by cache_lock
+        self.in_flight = {}
+        self.cache_lock = threading.Lock()
+        self.metrics_lock = threading.Lock()
+        self.latencies = {}
+        self.counts = {'cache_hits': 0, 'cache_misses': 0, 'in_flight_waits': 0, 'generated_batches': 0}
+
+    def generate(self, keys):
+        frame = pgf.generate_prompts(planets_frame(keys), by_mass=self.by_mass, unique_prompts=True, columns=PROMPT_COLUMNS)
+        return frame[PROMPT_COLUMNS].to_dict('records')
+
+    # Answers a batch of normalized planets: cached answers first, then the rest in one pass of the pipeline. Keys another request is generating are waited for, not generated again.
+    def prompts(self, planets):
+        answers = [None] * len(planets)
+        missing, waiting = {}, {}
+        with self.cache_lock:
+            for i, (key, names) in enumerate(planets):
+                if key in self.cache:
+                    self.cache.move_to_end(key)
+                    answers[i] = self.cache[key]
+                elif key in missing:
+                    missing[key].append(i)
+                elif key in self.in_flight:
+                    waiting.setdefault(key, (self.in_flight[key], []))[1].append(i)
+                else:
+                    missing[key] = [i]
+                    self.in_flight[key] = Future()
+
+        if missing:
+            try:
+                generated = self.generate(missing)
+            except BaseException as error:
+                # the requests waiting on these keys fail with the same error, and the next request tries again
+                with self.cache_lock:
+                    for key in missing:
+                        self.in_flight.pop(key).set_exception(error)
+                raise
+            with self.cache_lock:
+                for key, answer in zip(missing, generated):
+                    self.cache[key] = answer
+                    self.cache.move_to_end(key)
+                    self.in_flight.pop(key).set_result(answer)
+                    for i in missing[key]:
+                        answers[i] = answer
+                while len(self.cache) > self.cache_size:
+                    self.cache.popitem(last=False)
+
+        for future, rows in waiting.values():
+            answer = future.result()
+            for i in rows:
+                answers[i] = answer
+
+        with self.metrics_lock:
+            misses = sum(len(rows) for rows in missing.values())
+            waits = sum(len(rows) for future, rows in waiting.values())
+            self.counts['cache_misses'] += misses
+            self.counts['in_flight_waits'] += waits
+            self.counts['cache_hits'] += len(planets) - misses - waits
+            self.counts['generated_batches'] += bool(missing)
+        return [{**names, **answer} for (key, names), answer in zip(planets, answers)]
+
+    def lookup(self, pl_name):
+        return self.published.get(pl_name, [])
+
+    def record(self, endpoint, seconds):
+        with self.metrics_lock:
+            self.latencies.setdefault(endpoint, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def metrics(self):
+        with self.metrics_lock:
+            endpoints = {}
+            for endpoint, latencies in self.latencies.items():
+                milliseconds = np.array(latencies) * 1000
+                endpoints[endpoint] = {
+                    'requests': len(latencies),
+                    'p50_ms': float(np.percentile(milliseconds, 50)),
+                    'p99_ms': float(np.percentile(milliseconds, 99)),
+                    'max_ms': float(milliseconds.max()),
+                }
+            return {**self.counts, 'cache_entries': len(self.cache), 'cache_size': self.cache_size, 'endpoints': endpoints}
+
+def make_handler(service):
+    class PromptHandler(BaseHTTPRequestHandler):
+        def send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def timed(self, endpoint, answer):
+            start = time.perf_counter()
+            try:
+                status, body = answer()
+            except RequestError as error:
+                status, body = 400, {'error': str(error)}
+            except Exception as error:
+                # the client still gets a JSON answer and the request is still counted in /metrics
+                status, body = 500, {'error': f'internal error: {type(error).__name__}: {error}'}
+            self.send_json(status, body)
+            service.record(endpoint, time.perf_counter() - start)
+
+        def do_POST(self):
+            if self.path != '/prompts':
+                self.timed('POST other', lambda: (404, {'error': f'no such endpoint: POST {self.path}'}))
+                return
+
+            def answer():
+                try:
+                    length = int(self.headers.get('Content-Length', 0))
+                except ValueError:
+                    raise RequestError(f"invalid Content-Length: {self.headers['Content-Length']!r}")
+                if length < 0:
+                    raise RequestError(f"invalid Content-Length: {length}")
+                try:
+                    body = json.loads(self.rfile.read(length) or b'null')
+                except json.JSONDecodeError as error:
+                    raise RequestError(f"invalid JSON: {error}")
+                batch = isinstance(body, list)
+                planets = [normalize_planet(planet) for planet in (body if batch else [body])]
+                answers = service.prompts(planets)
+                return 200, answers if batch else answers[0]
+            self.timed('POST /prompts', answer)
+
+        def do_GET(self):
+            if self.path.startswith('/planets/'):
+                def answer():
+                    rows = service.lookup(unquote(self.path[len('/planets/'):]))
+                    return (200, rows) if rows else (404, {'error': 'no planet with that name'})
+                self.timed('GET /planets', answer)
+            elif self.path == '/metrics':
+                self.timed('GET /metrics', lambda: (200, service.metrics()))
+            else:
+                self.timed('GET other', lambda: (404, {'error': f'no such endpoint: GET {self.path}'}))
+
+        def log_message(self, format, *args):
+            # the latencies are in /metrics, a line per request would only slow the service down
+            pass
+
+    return PromptHandler
+
+def main():
+    parser = setup_argparse()
+    args = parser.parse_args()
+
+    if args.spectral_index:
+        spectral_types.load_index(args.spectral_index)
+    published = load_published_prompts(args.prompts) if args.prompts else None
+    service = PromptService(args.cache_size, by_mass=args.categorize_by == 'mass', published=published)
+    # the first pass through the pipeline pays for imports and lazy setup, do it before the first request
+    service.generate([normalize_planet({})[0]])
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    print(f"serving prompts on http://{args.host}:{args.port} ({len(service.published)} published planets)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+### Spectral Type Index
+# The stellar descriptors only need a few facts about each spectral type string: its Harvard class (the first letter), its luminosity class and whether it is one of the special cases (white dwarf, L/T brown dwarf, subdwarf). The catalog holds only a few hundred distinct strings ('A8 III', 'WD', 'sdBV', ...) spread over a million rows, so each distinct string is parsed once into a SpectralType and every row is then resolved by looking up its string's position in that list.
+#
+# When asked to (--spectral-index), the parsed types are kept in a JSON file (spectral_type_index.json next to the outputs, unless another path is given) so later runs only parse strings they have not seen before. Without it nothing is written and every run parses the strings it meets. The file holds the parser's output, not descriptions, so changing the color or size tables in descriptor_rules does not make it stale; changing the parser below means bumping INDEX_VERSION.
+
+import json
+import os
+import re
+import threading
+from collections import namedtuple
+
+import pandas as pd
+
+import descriptor_rules as rules
+
+INDEX_VERSION = 1
+INDEX_FILE_NAME = 'spectral_type_index.json'
+
+SpectralType = namedtuple('SpectralType', ['spectral_class', 'luminosity_class', 'white_dwarf', 'brown_dwarf', 'subdwarf'])
+
+HARVARD_CLASSES = 'OBAFGKMm'
+
+# the first roman numeral that does not follow a letter ('G8 III', 'K1 IIIb', 'G0Vvar', 'F8 IV/V'), the longer numerals are tried first
+LUMINOSITY_CLASS = re.compile(r'(?<![A-Za-z])(Iab|Ia|Ib|III|II|IV|VI|V|I)')
+
+# the parsed types by spectral type string, shared by every thread running a stage
+index = {}
+index_lock = threading.Lock()
+index_changed = False
+
+def parse_spectral_type(spectype):
+    spectral_class = spectype[:1] or None
+    luminosity = LUMINOSITY_CLASS.search(spectype) if spectral_class and spectral_class in HARVARD_CLASSES else None
+    return SpectralType(
+        spectral_class=spectral_class,
+        luminosity_class=luminosity.group(1) if luminosity else None,
+        white_dwarf=spectral_class == rules.WHITE_DWARF_SPECTRAL_CLASS or spectype == rules.WHITE_DWARF_SPECTRAL_TYPE,
+        brown_dwarf=spectral_class in rules.BROWN_DWARF_SPECTRAL_CLASSES,
+        subdwarf=spectral_class == rules.SUBDWARF_SPECTRAL_CLASS,
+    )
+
+# Returns the position of each row's spectral type in types, and the parsed types. Values that are not strings (the 0 of a missing type) are looked up by their text, like str(value)[0] did before.
+def lookup(st_spectype):
+    global index_changed
+    codes, uniques = pd.factorize(pd.Series(st_spectype, dtype=object))
+    spectypes = [str(value) for value in uniques]
+    with index_lock:
+        for spectype in spectypes:
+            if spectype not in index:
+                index[spectype] = parse_spectral_type(spectype)
+                index_changed = True
+        types = [index[spectype] for spectype in spectypes]
+    return codes, types
+
+def load_index(path):
+    if not os.path.exists(path):
+        return
+    with open(path) as file:
+        saved = json.load(file)
+    if saved.get('version') != INDEX_VERSION:
+        return
+    with index_lock:
+        for spectype, fields in saved['types'].items():
+            index.setdefault(spectype, SpectralType(**fields))
+
+# The index file next to output_path, for --spectral-index given without a path
+def index_path_next_to(output_path):
+    return os.path.join(os.path.dirname(output_path), INDEX_FILE_NAME)
+
+# Only writes the file when a run parsed a type it did not have
+def save_index(path):
+    global index_changed
+    with index_lock:
+        if not index_changed and os.path.exists(path):
+            return
+        saved = {'version': INDEX_VERSION, 'types': {spectype: parsed._asdict() for spectype, parsed in sorted(index.items())}}
+        index_changed = False
+
+    partial_path = path + '.partial'
+    with open(partial_path, 'w') as file:
+        json.dump(saved, file, indent=1)
+    os.replace(partial_path, path)
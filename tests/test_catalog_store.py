@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+
+import catalog_store
+
+PLANETS = [
+    {'pl_name': 'Kepler-22 b', 'hostname': 'Kepler-22', 'planet_category': 'super-earth', 'pl_eqt': 262.0, 'st_teff': 5518.0},
+    {'pl_name': 'TRAPPIST-1 e', 'hostname': 'TRAPPIST-1', 'planet_category': 'terrestrial', 'pl_eqt': 251.0, 'st_teff': 2566.0},
+    {'pl_name': 'TRAPPIST-1 f', 'hostname': 'TRAPPIST-1', 'planet_category': 'terrestrial', 'pl_eqt': 219.0, 'st_teff': 2566.0},
+    {'pl_name': '51 Peg b', 'hostname': '51 Peg', 'planet_category': 'gas-giant', 'pl_eqt': 1284.0, 'st_teff': 5768.0},
+    # no equilibrium temperature, which the catalog writes as 0
+    {'pl_name': 'GJ 1214 b', 'hostname': 'GJ 1214', 'planet_category': 'super-earth', 'pl_eqt': 0.0, 'st_teff': 3250.0},
+]
+
+@pytest.fixture
+def store(tmp_path):
+    rows = [{**planet, **{col: f'{col} of {planet["pl_name"]}' for col in catalog_store.pgf.PROMPT_TEMPLATES}} for planet in PLANETS]
+    # the blank rows at the end of the catalog have a pl_name of 0
+    rows.append({col: 0 for col in rows[0]})
+    prompts_path = tmp_path / 'exoplanet_data_prompts.csv'
+    pd.DataFrame(rows).to_csv(prompts_path, index=False)
+
+    store_path = str(tmp_path / 'catalog.sqlite')
+    assert catalog_store.build_store(str(prompts_path), store_path, chunksize=2) == len(PLANETS)
+    connection = catalog_store.open_store(store_path)
+    yield connection
+    connection.close()
+
+def names(rows):
+    return sorted(row['pl_name'] for row in rows)
+
+def test_open_store_needs_a_build(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        catalog_store.open_store(str(tmp_path / 'missing.sqlite'))
+
+def test_find_planets_and_hosts(store):
+    [planet] = catalog_store.find_planets(store, ['Kepler-22 b'])
+    assert list(planet) == catalog_store.DEFAULT_COLUMNS
+    assert planet['mass_prompt'] == 'mass_prompt of Kepler-22 b'
+    assert names(catalog_store.find_hosts(store, ['TRAPPIST-1'])) == ['TRAPPIST-1 e', 'TRAPPIST-1 f']
+    assert catalog_store.find_planets(store, ['0']) == []
+
+def test_columns_are_validated(store):
+    assert list(catalog_store.find_planets(store, ['51 Peg b'], columns=['pl_eqt', 'pl_name'])[0]) == ['pl_eqt', 'pl_name']
+    assert set(catalog_store.find_planets(store, ['51 Peg b'], columns=['all'])[0]) == set(catalog_store.store_columns(store))
+    with pytest.raises(ValueError, match='unknown columns: pl_radj'):
+        catalog_store.find_planets(store, ['51 Peg b'], columns=['pl_name', 'pl_radj'])
+    with pytest.raises(ValueError, match='unknown column: pl_radj'):
+        catalog_store.query_planets(store, ranges={'pl_radj': (1, 2)})
+
+def test_range_filters(store):
+    assert names(catalog_store.query_planets(store, ranges={'pl_eqt': (200, 300)})) == ['Kepler-22 b', 'TRAPPIST-1 e', 'TRAPPIST-1 f']
+    # the ends are inclusive, and an open end only filters on the other
+    assert names(catalog_store.query_planets(store, ranges={'pl_eqt': (251, 262)})) == ['Kepler-22 b', 'TRAPPIST-1 e']
+    assert names(catalog_store.query_planets(store, ranges={'pl_eqt': (None, 230)})) == ['TRAPPIST-1 f']
+    # a missing value is never inside a range, even one that starts below 0
+    assert 'GJ 1214 b' not in names(catalog_store.query_planets(store, ranges={'pl_eqt': (-1, 1000)}))
+    assert names(catalog_store.query_planets(store, ranges={'pl_eqt': (200, 300), 'st_teff': (3000, 6000)})) == ['Kepler-22 b']
+
+def test_category_filter_and_limit(store):
+    assert names(catalog_store.query_planets(store, categories=['super-earth'])) == ['GJ 1214 b', 'Kepler-22 b']
+    assert names(catalog_store.query_planets(store, categories=['super-earth'], ranges={'pl_eqt': (100, 300)})) == ['Kepler-22 b']
+    assert len(catalog_store.query_planets(store, categories=['terrestrial', 'gas-giant'], limit=2)) == 2
+
+def test_export_planets(store, tmp_path):
+    output_path = tmp_path / 'cool_stars.csv'
+    assert catalog_store.export_planets(store, str(output_path), ranges={'st_teff': (2000, 4000)}, columns=['pl_name', 'st_teff']) == 3
+    exported = pd.read_csv(output_path)
+    assert list(exported.columns) == ['pl_name', 'st_teff']
+    assert sorted(exported['pl_name']) == ['GJ 1214 b', 'TRAPPIST-1 e', 'TRAPPIST-1 f']
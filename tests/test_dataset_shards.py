@@ -0,0 +1,66 @@
+import json
+import os
+import random
+import tarfile
+
+import dataset_shards
+
+MAX_BYTES = 64 * 1024
+
+# Samples laid out like getting_training_datasets writes them: a JPEG-sized blob and a JSON record with the caption and tags
+def make_samples(count, seed=0):
+    rng = random.Random(seed)
+    samples = []
+    for number in range(count):
+        image = rng.randbytes(rng.randint(1, 12 * 1024))
+        record = {'tags': ['space', 'planet'], 'caption': f'A planet, number {number}, with "quotes" and ünïcode'}
+        samples.append((f'image_{number}', {'jpg': image, 'json': json.dumps(record).encode()}))
+    # larger than a shard on its own
+    samples.insert(20, ('image_oversized', {'jpg': rng.randbytes(3 * MAX_BYTES), 'json': b'{"tags": [], "caption": "too big"}'}))
+    return samples
+
+def write_shards(folder, samples):
+    with dataset_shards.ShardWriter(str(folder), MAX_BYTES) as writer:
+        for key, members in samples:
+            writer.write(key, members)
+
+def test_shards_stay_under_the_size_bound(tmp_path):
+    samples = make_samples(120)
+    write_shards(tmp_path, samples)
+
+    paths = dataset_shards.shard_paths(str(tmp_path))
+    assert len(paths) > 3
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.partial')]
+    oversized = []
+    for path in paths:
+        with tarfile.open(path) as tar:
+            names = tar.getnames()
+        if os.path.getsize(path) > MAX_BYTES:
+            oversized.append(names)
+    # only the sample too big for any shard gets one over the bound, and has it to itself
+    assert oversized == [['image_oversized.jpg', 'image_oversized.json']]
+
+def test_index_reads_the_same_samples_as_iteration(tmp_path):
+    samples = make_samples(120)
+    write_shards(tmp_path, samples)
+
+    iterated = list(dataset_shards.iterate_samples(str(tmp_path)))
+    assert iterated == [{'__key__': key, **members} for key, members in samples]
+
+    index = dataset_shards.load_index(str(tmp_path))
+    assert list(index) == [key for key, members in samples]
+    keys = list(index)
+    random.Random(1).shuffle(keys)
+    by_key = {sample['__key__']: sample for sample in iterated}
+    for key in keys:
+        assert dataset_shards.read_sample(str(tmp_path), index, key) == by_key[key]
+
+def test_captions_and_tags_survive(tmp_path):
+    samples = make_samples(30)
+    write_shards(tmp_path, samples)
+
+    index = dataset_shards.load_index(str(tmp_path))
+    for key, members in samples:
+        record = json.loads(dataset_shards.read_sample(str(tmp_path), index, key)['json'])
+        assert record == json.loads(members['json'])
+    assert json.loads(dataset_shards.read_sample(str(tmp_path), index, 'image_7')['json'])['caption'] == 'A planet, number 7, with "quotes" and ünïcode'
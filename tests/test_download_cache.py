@@ -0,0 +1,80 @@
+import hashlib
+import json
+import os
+import time
+
+import download_cache
+
+def content(n, size=100):
+    return bytes([n]) * size
+
+def test_store_and_reload(tmp_path):
+    with download_cache.DownloadCache(str(tmp_path)) as cache:
+        digest = cache.store('http://host/a', content(1), {'ETag': '"a"', 'Last-Modified': 'Mon, 01 Jan 2024 00:00:00 GMT'})
+        # the same bytes under another URL are stored once
+        assert cache.store('http://host/b', content(1), {}) == digest
+        assert cache.size() == 100
+
+    reloaded = download_cache.DownloadCache(str(tmp_path))
+    entry = reloaded.get('http://host/a')
+    assert reloaded.read(entry) == content(1)
+    assert reloaded.conditional_headers(entry) == {'If-None-Match': '"a"', 'If-Modified-Since': 'Mon, 01 Jan 2024 00:00:00 GMT'}
+    assert reloaded.get('http://host/b')['sha256'] == digest
+    reloaded.close()
+
+def test_index_is_saved_in_batches_and_at_flush(tmp_path, monkeypatch):
+    monkeypatch.setattr(download_cache, 'SAVE_EVERY', 3)
+    monkeypatch.setattr(download_cache, 'SAVE_SECONDS', 3600)
+    cache = download_cache.DownloadCache(str(tmp_path))
+
+    def saved_urls():
+        if not os.path.exists(cache.index_path):
+            return set()
+        with open(cache.index_path) as file:
+            return set(json.load(file)['urls'])
+
+    for n in range(4):
+        cache.store(f'http://host/{n}', content(n), {})
+    assert saved_urls() == {f'http://host/{n}' for n in range(3)}
+    cache.flush()
+    assert saved_urls() == {f'http://host/{n}' for n in range(4)}
+    cache.close()
+
+def test_flush_saves_last_used(tmp_path):
+    cache = download_cache.DownloadCache(str(tmp_path))
+    digest = cache.store('http://host/a', content(1), {})
+    cache.flush()
+    stored_at = cache.objects[digest]['last_used']
+
+    time.sleep(0.01)
+    cache.read(cache.get('http://host/a'))
+    cache.close()
+    with open(cache.index_path) as file:
+        assert json.load(file)['objects'][digest]['last_used'] > stored_at
+
+def test_eviction_drops_least_recently_used(tmp_path):
+    with download_cache.DownloadCache(str(tmp_path), max_bytes=250) as cache:
+        cache.store('http://host/a', content(1), {})
+        cache.store('http://host/b', content(2), {})
+        # reading a makes b the least recently used
+        time.sleep(0.01)
+        cache.read(cache.get('http://host/a'))
+        cache.store('http://host/c', content(3), {})
+        assert cache.get('http://host/b') is None
+        assert cache.get('http://host/a') and cache.get('http://host/c')
+        assert cache.size() == 200
+        assert not os.path.exists(cache.object_path(hashlib.sha256(content(2)).hexdigest()))
+
+def test_eviction_never_drops_the_download_just_stored(tmp_path):
+    with download_cache.DownloadCache(str(tmp_path), max_bytes=250) as cache:
+        cache.store('http://host/a', content(1), {})
+        cache.store('http://host/b', content(2), {})
+        # a download older than everything in the cache, and one larger than the whole cap
+        for url, data in [('http://host/c', content(3)), ('http://host/big', content(4, 1000))]:
+            for entry in cache.objects.values():
+                entry['last_used'] += 1000
+            digest = cache.store(url, data, {})
+            assert cache.get(url)['sha256'] == digest
+            assert os.path.exists(cache.object_path(digest))
+            assert cache.read(cache.get(url)) == data
+        assert list(cache.objects) == [digest]
@@ -0,0 +1,83 @@
+import json
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import image_array_store
+import image_processing
+
+COUNT = 11
+BATCH_SIZE = 4
+
+# every image is one colour of its own, so a row of the array tells which image it holds
+def colour(number):
+    return (number * 20, 255 - number * 20, number * 7)
+
+@pytest.fixture
+def store_path(tmp_path):
+    records = []
+    for number in range(COUNT):
+        # PNG, so the colours come back exactly
+        Image.new('RGB', image_processing.IMAGE_SIZE, colour(number)).save(tmp_path / f'image_{number}.png')
+        records.append({'file_name': f'image_{number}.png', 'caption': f'caption {number}', 'tags': ['space']})
+    path = str(tmp_path / 'images.npy')
+    assert image_array_store.export_images(records, str(tmp_path), path, shuffle_seed=3, threads=2) == COUNT
+    return path
+
+def number_of(record):
+    return int(record['key'].split('_')[1])
+
+def assert_rows_match(images, records):
+    assert len(images) == len(records)
+    for image, record in zip(images, records):
+        assert (image == colour(number_of(record))).all()
+        assert record['caption'] == f'caption {number_of(record)}'
+
+def test_array_and_caption_index_line_up(store_path):
+    images = np.load(store_path, mmap_mode='r')
+    assert images.shape == (COUNT, 512, 512, 3) and images.dtype == np.uint8
+    with open(image_array_store.index_path(store_path)) as file:
+        records = [json.loads(line) for line in file]
+    assert [record['row'] for record in records] == list(range(COUNT))
+    # shuffled at export, and still lined up
+    assert [number_of(record) for record in records] != list(range(COUNT))
+    assert_rows_match(images, records)
+
+    store = image_array_store.ImageArrayStore(store_path)
+    assert (store.image('image_5') == colour(5)).all()
+
+@pytest.mark.parametrize('shuffle', ['none', 'blocks'])
+def test_batches_are_views_of_the_file(store_path, shuffle):
+    store = image_array_store.ImageArrayStore(store_path)
+    batches = list(store.batches(BATCH_SIZE, shuffle, seed=1))
+    # the last batch holds what is left
+    assert sorted(len(images) for images, records in batches) == [COUNT % BATCH_SIZE, BATCH_SIZE, BATCH_SIZE]
+    assert sorted(record['row'] for images, records in batches for record in records) == list(range(COUNT))
+    for images, records in batches:
+        assert np.shares_memory(images, store.images)
+        assert not images.flags.writeable
+        assert_rows_match(images, records)
+        # a view holds consecutive rows
+        assert [record['row'] for record in records] == list(range(records[0]['row'], records[0]['row'] + len(records)))
+
+def test_block_order_follows_the_seed(store_path):
+    store = image_array_store.ImageArrayStore(store_path)
+
+    def first_rows(shuffle, seed=None):
+        return [records[0]['row'] for images, records in store.batches(BATCH_SIZE, shuffle, seed=seed)]
+    assert first_rows('blocks', 1) == first_rows('blocks', 1)
+    assert sorted(first_rows('blocks', 1)) == first_rows('none') == list(range(0, COUNT, BATCH_SIZE))
+
+def test_exact_shuffle_gathers_a_seeded_permutation(store_path):
+    store = image_array_store.ImageArrayStore(store_path)
+    rows = []
+    for images, records in store.batches(BATCH_SIZE, 'exact', seed=2):
+        # gathered into the reused buffer, not a view of the file
+        assert not np.shares_memory(images, store.images)
+        assert_rows_match(images, records)
+        rows.append([record['row'] for record in records])
+    assert [len(batch) for batch in rows] == [BATCH_SIZE, BATCH_SIZE, COUNT % BATCH_SIZE]
+    assert sorted(row for batch in rows for row in batch) == list(range(COUNT))
+    expected = np.random.default_rng(2).permutation(COUNT)
+    assert rows == [sorted(expected[start:start + BATCH_SIZE].tolist()) for start in range(0, COUNT, BATCH_SIZE)]
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import image_dedup
+
+def random_hashes(rng, count):
+    return rng.integers(0, 2 ** 63, count, dtype=np.uint64) * np.uint64(2) + rng.integers(0, 2, count, dtype=np.uint64)
+
+def flip_bits(rng, value, bits):
+    for bit in rng.choice(64, bits, replace=False):
+        value ^= 1 << int(bit)
+    return value
+
+@pytest.mark.parametrize('max_distance', [0, 1, 3, 8, 12])
+def test_index_finds_what_brute_force_finds(max_distance):
+    rng = np.random.default_rng(max_distance)
+    values = [int(value) for value in random_hashes(rng, 1500)]
+    # random 64-bit hashes are about 32 bits apart, so near copies of some of them are mixed in, at distances around the threshold
+    values += [flip_bits(rng, values[i], int(rng.integers(0, max_distance + 3))) for i in rng.choice(len(values), 500)]
+    index = image_dedup.HammingIndex(values, max_distance)
+    array = np.array(values, dtype=np.uint64)
+
+    found_any = False
+    for value in values[::7]:
+        distances, positions = index.search(value)
+        brute = image_dedup.hamming_many(value, array)
+        expected = np.flatnonzero(brute <= max_distance)
+        assert sorted(positions.tolist()) == expected.tolist()
+        assert all(distance == image_dedup.hamming(value, values[position]) for distance, position in zip(distances, positions))
+        found_any |= len(expected) > 1
+    assert found_any
+
+# What hash_images returns, with the one hash given as all three
+def images_frame(rows):
+    images = pd.DataFrame(rows, columns=['image_link', 'width', 'height', 'phash'])
+    return images.assign(ahash=images['phash'], dhash=images['phash'])[['image_link', 'width', 'height'] + image_dedup.HASHES]
+
+BASE = 0x0123456789abcdef
+OTHER = 0xfedcba9876543210
+
+IMAGES = images_frame([
+    ('a-small', 100, 100, BASE),
+    ('a-large', 400, 300, BASE ^ 0b111),
+    # near a-large but not a-small: joins the group through a-large
+    ('a-chained', 200, 200, BASE ^ 0b111 ^ (0b11111 << 20)),
+    ('b-first', 50, 50, OTHER),
+    ('b-second', 50, 50, OTHER ^ 1),
+    ('alone', 10, 10, 0x0f0f0f0f0f0f0f0f),
+])
+
+def test_each_group_keeps_its_largest_image():
+    images = image_dedup.group_duplicates(IMAGES, 'phash', max_distance=6)
+    by_link = images.set_index('image_link')
+    assert by_link['group'].tolist() == [0, 0, 0, 1, 1, 2]
+    assert by_link['kept_link'].to_dict() == {'a-small': 'a-large', 'a-large': 'a-large', 'a-chained': 'a-large',
+                                              # a tie keeps the first one
+                                              'b-first': 'b-first', 'b-second': 'b-first', 'alone': 'alone'}
+    assert by_link['kept'].tolist() == [False, True, False, True, False, True]
+    assert by_link['distance'].tolist() == [3, 0, 5, 0, 1, 0]
+
+def test_filtered_dataset_drops_exactly_the_rows_not_kept(tmp_path):
+    images = image_dedup.group_duplicates(IMAGES, 'phash', max_distance=6)
+    dataset = pd.DataFrame({'image_link': ['a-small', 'a-large', 'a-large', None, 'b-second', 'unhashed', 'unhashed', 'b-first', 'alone', 'a-chained', None],
+                            'prompt': range(11)})
+
+    every_row = image_dedup.filter_dataset(dataset, images, keep_rows='all')
+    assert every_row['prompt'].tolist() == [1, 2, 3, 5, 6, 7, 8, 10]
+    first_rows = image_dedup.filter_dataset(dataset, images, keep_rows='first')
+    # the rows without a link and the image that could not be hashed are left alone
+    assert first_rows['prompt'].tolist() == [1, 3, 5, 6, 7, 8, 10]
+
+    image_dedup.write_report(images, str(tmp_path / 'report.csv'))
+    report = pd.read_csv(tmp_path / 'report.csv')
+    assert set(report.loc[~report['kept'], 'image_link']) == set(dataset['image_link']) - set(every_row['image_link'])
+    assert report['phash'].tolist() == [f'{value:016x}' for value in IMAGES['phash']]
@@ -0,0 +1,89 @@
+import json
+import os
+from urllib.request import urlopen
+
+import pytest
+
+import download_cache
+import image_downloader
+from benchmarks import stand_in_server
+
+@pytest.fixture
+def server():
+    with stand_in_server.serve(latency=0, slow_seconds=1) as url:
+        yield url
+
+@pytest.fixture
+def session():
+    with image_downloader.make_session(4) as session:
+        yield session
+
+def stats(server):
+    with urlopen(server + '/stats') as response:
+        return json.load(response)
+
+def test_download(server, session):
+    result = image_downloader.fetch(session, server + '/image/a.jpg')
+    assert result.error is None
+    assert (result.status, result.attempts, result.source) == (200, 1, 'network')
+    assert result.content.startswith(b'\xff\xd8')
+
+def test_busy_answer_is_retried(server, session):
+    result = image_downloader.fetch(session, server + '/flaky/a.jpg', retries=2, backoff=0)
+    assert result.error is None
+    assert (result.status, result.attempts) == (200, 2)
+
+def test_retries_run_out(server, session):
+    result = image_downloader.fetch(session, server + '/flaky/a.jpg', retries=0, backoff=0)
+    assert (result.content, result.status, result.attempts, result.error) == (None, 503, 1, 'HTTP 503')
+
+def test_not_found_is_not_retried(server, session):
+    result = image_downloader.fetch(session, server + '/missing/a.jpg', retries=3, backoff=0)
+    assert (result.status, result.attempts, result.error) == (404, 1, 'HTTP 404')
+    assert stats(server)['missing'] == 1
+
+def test_timeout_is_retried(server, session):
+    result = image_downloader.fetch(session, server + '/slow/a.jpg', timeout=(1, 0.2), retries=1, backoff=0)
+    assert result.content is None
+    assert result.attempts == 2
+    assert result.error.startswith(('ReadTimeout', 'ConnectionError'))
+
+def test_not_a_url(session):
+    assert image_downloader.fetch(session, 0).error == 'not an http(s) URL'
+
+def test_cached_download_is_not_requested_again(server, session, tmp_path):
+    url = server + '/image/a.jpg'
+    with download_cache.DownloadCache(str(tmp_path)) as cache:
+        first = image_downloader.fetch(session, url, cache=cache)
+        second = image_downloader.fetch(session, url, cache=cache)
+    assert (first.source, second.source) == ('network', 'cache')
+    assert second.content == first.content
+    assert stats(server)['image'] == 1
+
+def test_revalidation_answered_304(server, session, tmp_path):
+    url = server + '/image/a.jpg'
+    with download_cache.DownloadCache(str(tmp_path), revalidate=True) as cache:
+        first = image_downloader.fetch(session, url, cache=cache)
+        second = image_downloader.fetch(session, url, cache=cache)
+    assert second.status == 304
+    assert second.source == 'revalidated'
+    assert second.content == first.content
+
+def test_304_with_the_cached_file_gone_is_downloaded_again(server, session, tmp_path):
+    url = server + '/image/a.jpg'
+    with download_cache.DownloadCache(str(tmp_path), revalidate=True) as cache:
+        first = image_downloader.fetch(session, url, cache=cache)
+        os.remove(cache.object_path(cache.get(url)['sha256']))
+        # no retries to spend: the full download has to happen within the attempt that got the 304
+        second = image_downloader.fetch(session, url, retries=0, cache=cache)
+    assert second.error is None
+    assert (second.status, second.attempts, second.source) == (200, 1, 'network')
+    assert second.content == first.content
+    assert os.path.exists(cache.object_path(cache.get(url)['sha256']))
+
+def test_download_all(server):
+    urls = [server + '/image/a.jpg', server + '/missing/b.jpg', 'not a url', server + '/flaky/c.jpg']
+    results = dict(image_downloader.download_all(urls, workers=2, retries=1, backoff=0))
+    assert sorted(results) == [0, 1, 2, 3]
+    assert [results[i].url for i in range(4)] == urls
+    assert [results[i].error for i in range(4)] == [None, 'HTTP 404', 'not an http(s) URL', None]
@@ -0,0 +1,39 @@
+from io import BytesIO
+
+from PIL import Image
+
+import image_processing
+
+def jpeg(size=(640, 480)):
+    buffer = BytesIO()
+    Image.new('RGB', size, (40, 80, 120)).save(buffer, format='JPEG')
+    return buffer.getvalue()
+
+def test_image_is_resized_and_saved(tmp_path):
+    path = str(tmp_path / 'a.jpg')
+    result = image_processing.process_image('a', jpeg(), [path])
+    assert result.error is None
+    assert (result.source_size, result.source_mode) == ((640, 480), 'RGB')
+    with Image.open(path) as img:
+        assert img.size == image_processing.IMAGE_SIZE
+
+def test_failures_are_returned_with_their_stage(tmp_path):
+    not_an_image = image_processing.process_image('a', b'not an image', None)
+    assert not_an_image.error.startswith('not an image: ')
+    assert not_an_image.source_size is None
+
+    unsaved = image_processing.process_image('b', jpeg(), [str(tmp_path / 'missing' / 'b.jpg')])
+    assert unsaved.error.startswith('save failed: ')
+    assert unsaved.source_size == (640, 480)
+    assert unsaved.save_seconds >= 0 and unsaved.data is None
+
+def test_failed_images_do_not_stop_the_pool(tmp_path):
+    items = [('good', jpeg(), [str(tmp_path / 'good.jpg')], image_processing.IMAGE_SIZE),
+             # the header is whole, the image data is cut short
+             ('truncated', jpeg()[:400], [str(tmp_path / 'truncated.jpg')], image_processing.IMAGE_SIZE),
+             ('unsaved', jpeg(), [str(tmp_path / 'missing' / 'unsaved.jpg')], image_processing.IMAGE_SIZE),
+             ('also good', jpeg((300, 900)), [str(tmp_path / 'also_good.jpg')], image_processing.IMAGE_SIZE)]
+    results = {result.key: result for result in image_processing.process_all(items, workers=2)}
+    assert results['good'].error is None and results['also good'].error is None
+    assert results['truncated'].error is not None
+    assert results['unsaved'].error.startswith('save failed: ')
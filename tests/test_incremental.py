@@ -0,0 +1,84 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import incremental_regeneration
+import prompt_generator_functions as pgf
+from benchmarks.synthetic_catalog import synthetic_catalog
+
+ROWS = 3000
+
+def read(path):
+    return pgf.preprocess_exoplanet_data(pgf.read_catalog(str(path)))
+
+# What a run with --incremental writes: the output and, once it is written, the manifest. Returns how many planets were generated
+def incremental_run(catalog_path, output_path, manifest_path):
+    dataset, manifest, changed = incremental_regeneration.generate_prompts_incremental(pgf.incremental_pipeline(), read(catalog_path), str(output_path), str(manifest_path), unique_prompts=True)
+    pgf.write_dataset(dataset, str(output_path))
+    incremental_regeneration.save_manifest(str(manifest_path), manifest)
+    return changed
+
+def full_run(catalog_path, output_path):
+    pgf.write_dataset(pgf.generate_prompts(read(catalog_path), unique_prompts=True), str(output_path))
+
+def blank_rows(catalog, rows):
+    return pd.DataFrame(np.nan, index=range(rows), columns=catalog.columns)
+
+@pytest.fixture
+def catalogs(tmp_path):
+    catalog = synthetic_catalog(ROWS, seed=1)
+    # the real catalog ends in blank rows, which all share the pl_name 0
+    catalog = pd.concat([catalog, blank_rows(catalog, 5)], ignore_index=True)
+    first_path = tmp_path / 'catalog.csv'
+    catalog.to_csv(first_path, index=False)
+
+    rng = np.random.default_rng(2)
+    updated = catalog.copy()
+    # the first row is dropped by preprocessing, so it is left alone
+    changed = rng.choice(np.arange(1, ROWS), 60, replace=False)
+    updated.loc[changed[:20], 'pl_eqt'] += 15
+    updated.loc[changed[20:40], 'st_spectype'] = 'K3 III'
+    updated.loc[changed[40:], 'pl_bmasse'] += 1
+    # a column the pipeline does not read changes without the row being generated again
+    updated.loc[rng.choice(ROWS, 30, replace=False), 'disc_year'] = 2025
+    updated = updated.drop(rng.choice(np.setdiff1d(np.arange(1, ROWS), changed), 40, replace=False))
+
+    added = synthetic_catalog(80, seed=3)
+    added['pl_name'] = 'NEW-' + added['pl_name']
+    updated = pd.concat([updated.iloc[:1000], added.iloc[:50], updated.iloc[1000:], added.iloc[50:], blank_rows(catalog, 2)], ignore_index=True)
+    updated['Unnamed: 0'] = np.arange(len(updated), dtype='float64')
+    updated_path = tmp_path / 'updated_catalog.csv'
+    updated.to_csv(updated_path, index=False)
+    return first_path, updated_path
+
+def test_first_incremental_run_matches_a_full_run(catalogs, tmp_path):
+    first_path, updated_path = catalogs
+    assert incremental_run(first_path, tmp_path / 'incremental.csv', tmp_path / 'manifest.json') == ROWS + 4
+    full_run(first_path, tmp_path / 'full.csv')
+    assert (tmp_path / 'incremental.csv').read_bytes() == (tmp_path / 'full.csv').read_bytes()
+
+def test_incremental_update_matches_a_full_rebuild(catalogs, tmp_path):
+    first_path, updated_path = catalogs
+    incremental_run(first_path, tmp_path / 'incremental.csv', tmp_path / 'manifest.json')
+
+    # the 60 changed planets, the 80 new ones and the 2 new blank rows
+    assert incremental_run(updated_path, tmp_path / 'incremental.csv', tmp_path / 'manifest.json') == 142
+    full_run(updated_path, tmp_path / 'full.csv')
+    assert (tmp_path / 'incremental.csv').read_bytes() == (tmp_path / 'full.csv').read_bytes()
+
+def test_unchanged_rerun_generates_nothing(catalogs, tmp_path):
+    first_path, updated_path = catalogs
+    incremental_run(first_path, tmp_path / 'incremental.csv', tmp_path / 'manifest.json')
+    before = (tmp_path / 'incremental.csv').read_bytes()
+
+    assert incremental_run(first_path, tmp_path / 'incremental.csv', tmp_path / 'manifest.json') == 0
+    assert (tmp_path / 'incremental.csv').read_bytes() == before
+
+def test_manifest_without_dtypes_generates_everything_again(catalogs, tmp_path):
+    first_path, updated_path = catalogs
+    incremental_run(first_path, tmp_path / 'incremental.csv', tmp_path / 'manifest.json')
+    manifest = incremental_regeneration.load_manifest(str(tmp_path / 'manifest.json'))
+    del manifest['dtypes']
+    incremental_regeneration.save_manifest(str(tmp_path / 'manifest.json'), manifest)
+
+    assert incremental_run(first_path, tmp_path / 'incremental.csv', tmp_path / 'manifest.json') == ROWS + 4
@@ -0,0 +1,93 @@
+import json
+import math
+import os
+from urllib.request import urlopen
+
+import pytest
+
+import nasa_search
+from benchmarks import stand_in_server
+
+PAGE_SIZE = 50
+PAGES = math.ceil(stand_in_server.SEARCH_HITS / PAGE_SIZE)
+
+@pytest.fixture
+def server():
+    with stand_in_server.serve(latency=0) as url:
+        yield url
+
+def stats(server):
+    with urlopen(server + '/stats') as response:
+        return json.load(response).get('search', 0)
+
+def search(server, queries, cache=None, max_pages=10):
+    return nasa_search.search_all(queries, max_pages=max_pages, page_size=PAGE_SIZE, api_url=server, cache=cache, workers=4, backoff=0)
+
+def cached_collection(cache, server, query, page):
+    return cache.get(nasa_search.page_url(server, query, page, PAGE_SIZE))['collection']
+
+def test_every_page_is_fetched_until_the_next_links_end(server, tmp_path):
+    cache = nasa_search.ResponseCache(str(tmp_path))
+    results = search(server, ['exoplanet'], cache)
+
+    assert results.total_hits == {'exoplanet': stand_in_server.SEARCH_HITS}
+    assert (results.api_calls, results.cached_pages) == (PAGES, 0)
+    assert stats(server) == PAGES
+    # the pages before the last one link to the next, the last one does not
+    assert all(cached_collection(cache, server, 'exoplanet', page)['links'][0]['rel'] == 'next' for page in range(1, PAGES))
+    assert 'links' not in cached_collection(cache, server, 'exoplanet', PAGES)
+    expected = [item['data'][0]['nasa_id'] for item in stand_in_server.search_items(server, 'exoplanet', 0, stand_in_server.SEARCH_HITS)]
+    assert results.queries['exoplanet'] == expected
+
+def test_max_pages_caps_the_requests(server):
+    results = search(server, ['exoplanet'], max_pages=2)
+    assert results.api_calls == 2
+    assert len(results.queries['exoplanet']) == 2 * PAGE_SIZE
+
+def test_results_found_by_several_queries_are_kept_once(server):
+    results = search(server, ['exoplanet', 'nebula'])
+    first, second = results.queries['exoplanet'], results.queries['nebula']
+    # the stand-in draws both queries from one pool of ids, smaller than their results put together
+    assert set(first) & set(second)
+    assert list(results.items) == list(dict.fromkeys(first + second))
+    assert all(nasa_search.nasa_id(item) == key for key, item in results.items.items())
+
+def test_repeat_run_is_answered_from_the_cache(server, tmp_path):
+    search(server, ['exoplanet', 'nebula'], nasa_search.ResponseCache(str(tmp_path)))
+    requests = stats(server)
+
+    results = search(server, ['exoplanet', 'nebula'], nasa_search.ResponseCache(str(tmp_path)))
+    assert (results.api_calls, results.cached_pages) == (0, 2 * PAGES)
+    assert stats(server) == requests
+
+def test_expired_responses_are_requested_again(server, tmp_path):
+    search(server, ['exoplanet'], nasa_search.ResponseCache(str(tmp_path), ttl=3600))
+    # the first page was fetched two hours ago
+    cache = nasa_search.ResponseCache(str(tmp_path), ttl=3600)
+    path = cache.path(nasa_search.page_url(server, 'exoplanet', 1, PAGE_SIZE))
+    with open(path) as file:
+        entry = json.load(file)
+    entry['fetched_at'] -= 2 * 3600
+    with open(path, 'w') as file:
+        json.dump(entry, file)
+    requests = stats(server)
+
+    results = search(server, ['exoplanet'], cache)
+    assert (results.api_calls, results.cached_pages) == (1, PAGES - 1)
+    assert stats(server) == requests + 1
+
+def test_offline_uses_the_cache_whatever_its_age(server, tmp_path):
+    search(server, ['exoplanet'], nasa_search.ResponseCache(str(tmp_path)))
+    requests = stats(server)
+
+    results = search(server, ['exoplanet'], nasa_search.ResponseCache(str(tmp_path), ttl=0, offline=True))
+    assert (results.api_calls, results.cached_pages) == (0, PAGES)
+    assert len(results.queries['exoplanet']) == stand_in_server.SEARCH_HITS
+    assert stats(server) == requests
+
+def test_offline_without_a_cached_page_fails(server, tmp_path):
+    cache = nasa_search.ResponseCache(str(tmp_path), offline=True)
+    with pytest.raises(RuntimeError, match='not in the search cache'):
+        search(server, ['exoplanet'], cache)
+    assert stats(server) == 0
+    assert os.listdir(tmp_path) == []
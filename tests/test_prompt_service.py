@@ -0,0 +1,148 @@
+import http.client
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+from urllib.request import urlopen
+
+import pytest
+
+import prompt_service
+
+PLANET = {'pl_name': 'New b', 'pl_bmasse': 5.2, 'pl_rade': 1.7, 'pl_eqt': 320, 'st_spectype': 'G2 V', 'st_teff': 5700, 'st_mass': 1}
+PUBLISHED = {'Kepler-22 b': [{'pl_name': 'Kepler-22 b', **{col: f'{col} of Kepler-22 b' for col in prompt_service.PROMPT_COLUMNS}}]}
+
+@pytest.fixture
+def service():
+    return prompt_service.PromptService(cache_size=10, published=PUBLISHED)
+
+@pytest.fixture
+def url(service):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), prompt_service.make_handler(service))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_address[1]}'
+    server.shutdown()
+    server.server_close()
+
+# The status and JSON body of a request, error statuses included
+def request(url, data=None):
+    try:
+        with urlopen(url, data=None if data is None else json.dumps(data).encode()) as response:
+            return response.status, json.load(response)
+    except HTTPError as error:
+        return error.code, json.load(error)
+
+def test_post_prompts(url, service):
+    status, answer = request(url + '/prompts', PLANET)
+    assert status == 200
+    assert answer['pl_name'] == 'New b'
+    assert set(prompt_service.PROMPT_COLUMNS) <= set(answer)
+    assert all(isinstance(answer[col], str) and answer[col] for col in prompt_service.PROMPT_COLUMNS)
+    assert service.counts['cache_misses'] == 1
+
+def test_repeated_planet_is_a_cache_hit(url, service):
+    first = request(url + '/prompts', PLANET)[1]
+    # the same values under another name, and a batch holding it twice
+    status, answers = request(url + '/prompts', [{**PLANET, 'pl_name': 'Other b'}, PLANET])
+    assert status == 200
+    assert [answer['pl_name'] for answer in answers] == ['Other b', 'New b']
+    assert {col: answers[1][col] for col in prompt_service.PROMPT_COLUMNS} == {col: first[col] for col in prompt_service.PROMPT_COLUMNS}
+    assert service.counts['cache_hits'] == 2
+    assert service.counts['cache_misses'] == 1
+    assert service.counts['generated_batches'] == 1
+
+def test_bad_requests(url):
+    assert request(url + '/prompts', {'pl_bmasse': 'heavy'}) == (400, {'error': 'pl_bmasse must be a number'})
+    assert request(url + '/prompts', {'pl_radj': 1})[0] == 400
+    with pytest.raises(HTTPError) as error:
+        urlopen(url + '/prompts', data=b'{not json')
+    assert error.value.code == 400
+
+def test_non_finite_numbers_are_rejected(url):
+    # json.dumps writes NaN and Infinity, which json.loads reads back
+    assert request(url + '/prompts', {'pl_eqt': float('nan')}) == (400, {'error': 'pl_eqt must be a finite number'})
+    assert request(url + '/prompts', {'pl_rade': float('-inf')})[0] == 400
+    # finite in JSON, too large for the float32 the catalog holds st_mass in
+    assert request(url + '/prompts', {'st_mass': 1e300}) == (400, {'error': 'st_mass must be a finite number'})
+    assert request(url + '/prompts', {'pl_bmasse': 10 ** 400})[0] == 400
+
+def test_bad_content_length_is_a_400(url):
+    address = urlsplit(url)
+    for length in ['many', '-1']:
+        connection = http.client.HTTPConnection(address.hostname, address.port)
+        connection.putrequest('POST', '/prompts')
+        connection.putheader('Content-Length', length)
+        connection.endheaders()
+        response = connection.getresponse()
+        assert response.status == 400
+        assert json.load(response)['error'].startswith('invalid Content-Length')
+        connection.close()
+
+def test_unexpected_errors_are_a_500(url, service, monkeypatch):
+    monkeypatch.setattr(service, 'generate', lambda keys: 1 / 0)
+    status, answer = request(url + '/prompts', PLANET)
+    assert status == 500
+    assert answer == {'error': 'internal error: ZeroDivisionError: division by zero'}
+    deadline = time.monotonic() + 5
+    while 'POST /prompts' not in service.metrics()['endpoints'] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert service.metrics()['endpoints']['POST /prompts']['requests'] == 1
+
+def test_planet_lookup(url):
+    assert request(url + '/planets/Kepler-22%20b') == (200, PUBLISHED['Kepler-22 b'])
+    assert request(url + '/planets/Nowhere%20b')[0] == 404
+
+def test_unknown_endpoints_are_404(url):
+    assert request(url + '/nowhere')[0] == 404
+    assert request(url + '/nowhere', {})[0] == 404
+
+def test_metrics_time_every_route(url, service):
+    request(url + '/prompts', PLANET)
+    request(url + '/planets/Nowhere%20b')
+    request(url + '/nowhere')
+    request(url + '/nowhere', {})
+    status, metrics = request(url + '/metrics')
+    assert status == 200
+    assert metrics['cache_entries'] == 1
+
+    # a request is timed once its answer is sent, so the client can be a moment ahead of its metrics
+    endpoints = {'POST /prompts', 'GET /planets', 'GET other', 'POST other', 'GET /metrics'}
+    deadline = time.monotonic() + 5
+    while set(service.metrics()['endpoints']) != endpoints and time.monotonic() < deadline:
+        time.sleep(0.01)
+    metrics = service.metrics()
+    assert set(metrics['endpoints']) == endpoints
+    assert all(endpoint['requests'] == 1 for endpoint in metrics['endpoints'].values())
+
+def test_concurrent_misses_generate_once(service, monkeypatch):
+    calls = []
+    generate = service.generate
+
+    def slow_generate(keys):
+        calls.append(list(keys))
+        time.sleep(0.3)
+        return generate(keys)
+    monkeypatch.setattr(service, 'generate', slow_generate)
+
+    planets = [prompt_service.normalize_planet(PLANET)]
+    with ThreadPoolExecutor(max_workers=5) as executor:
+        answers = list(executor.map(lambda _: service.prompts(planets), range(5)))
+    assert len(calls) == 1
+    assert all(answer == answers[0] for answer in answers)
+    assert service.counts['cache_misses'] == 1
+    assert service.counts['in_flight_waits'] + service.counts['cache_hits'] == 4
+
+def test_failed_generation_is_tried_again(service, monkeypatch):
+    generate = service.generate
+    monkeypatch.setattr(service, 'generate', lambda keys: 1 / 0)
+    planets = [prompt_service.normalize_planet(PLANET)]
+    with pytest.raises(ZeroDivisionError):
+        service.prompts(planets)
+    assert service.in_flight == {}
+
+    monkeypatch.setattr(service, 'generate', generate)
+    assert service.prompts(planets)[0]['pl_name'] == 'New b'